@@ -4,14 +4,12 @@ import pytesseract
 from pytesseract import Output
 import string
 import numpy as np
-import nltk
 from ns import get_ns_text
 from island import isolateText
-
-# Uncomment the line below on first use to
-# Download a dictionary used in the postprocesssing stage 
-# nltk.download('words')
-english_vocab = set(w.lower() for w in nltk.corpus.words.words())
+from metrics import stage, tesseract_pass, timed_stage
+from tracing import annotate
+# Dictionary used in the postprocessing stage, loaded from NLTK on first use
+from vocab import english_vocab
 
 
 def preprocessing(img, thresh_value):
@@ -39,8 +37,10 @@ def get_cgt_text(img, thresh_value):
     thresh_value_ value of thresholding to be applied 
     data: extracted text is returned
     """
-    thresh = preprocessing(img, thresh_value)
-    data = pytesseract.image_to_string(thresh, lang='eng', config='--psm 6')
+    with stage('preprocess', f'cgt{thresh_value}'):
+        thresh = preprocessing(img, thresh_value)
+    with tesseract_pass(f'cgt{thresh_value}', '--psm 6'):
+        data = pytesseract.image_to_string(thresh, lang='eng', config='--psm 6')
     allowed = string.ascii_uppercase+string.ascii_lowercase + """?'."!"""
     lines = data.split("\n")
     res = []
@@ -70,7 +70,8 @@ def get_pdf_text(img):
     text: extracted text is returned
     """
     gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) 
-    d = pytesseract.image_to_data(gray, output_type=Output.DICT)
+    with tesseract_pass('pdf'):
+        d = pytesseract.image_to_data(gray, output_type=Output.DICT)
     text = ''
     for word in d['text']:
         text = text + word + ' '
@@ -84,8 +85,10 @@ def get_island_text(img):
     img: image inputed by the user 
     data: extracted text is returned 
     """
-    island_img = isolateText(img)
-    data = pytesseract.image_to_string(island_img, lang='eng', config='--psm 6')
+    with stage('preprocess', 'island'):
+        island_img = isolateText(img)
+    with tesseract_pass('island', '--psm 6'):
+        data = pytesseract.image_to_string(island_img, lang='eng', config='--psm 6')
     allowed = string.ascii_uppercase+string.ascii_lowercase + """?'."!"""
     lines = data.split("\n")
     res = []
@@ -115,6 +118,7 @@ def get_score(text):
     under_limit_word: number of words under 2 characters
     """
     words = text.split()
+    vocab = english_vocab()
     en_count = 0.0
     under_limit_word = 0
     i = 0
@@ -125,7 +129,7 @@ def get_score(text):
             i = i + 1
             continue
         word = word.lower()
-        if word in english_vocab:
+        if word in vocab:
             en_count += 1
         if len(word) <= 2:
             under_limit_word += 1
@@ -143,6 +147,12 @@ def hasNumbers(inputString):
     """
     return any(char.isdigit() for char in inputString)
     
+def chosen(variant, text):
+    """Record which filter's text get_text picked (see tracing.annotate)"""
+    annotate(ocr_variant=variant)
+    return text
+
+@timed_stage('get_text')
 def get_text(img):
     """
     Method that takes an input image and 
@@ -167,20 +177,21 @@ def get_text(img):
     #print('island_text: {} \n score: {} \n under limit words: {}'.format(island_text, island_text_score,i))
 
     if island_text_score >= cgt_text_20_score and island_text_score >= cgt_text_100_score and island_text_score >= pdf_text_score and island_text_score != 0:
-        return island_text
+        return chosen('island', island_text)
 
     if cgt_text_20_score == cgt_text_100_score == 0 or (pdf_text_score < 0.3 and cgt_text_100_score < 0.3):
-        ns_text = get_ns_text(img)
-        return ns_text
+        with stage('get_text', 'ns'):
+            ns_text = get_ns_text(img)
+        return chosen('ns', ns_text)
 
     if cgt_text_20_score >= cgt_text_100_score and cgt_text_20_score > pdf_text_score and x < z:
-        return cgt_text_20
+        return chosen('cgt_20', cgt_text_20)
     elif cgt_text_100_score > cgt_text_20_score and cgt_text_100_score > pdf_text_score:
-        return cgt_text_100
+        return chosen('cgt_100', cgt_text_100)
     elif pdf_text_score > cgt_text_100_score and pdf_text_score > cgt_text_20_score and len(pdf_text) >= len(cgt_text_20):
-        return pdf_text
+        return chosen('pdf', pdf_text)
     elif cgt_text_20_score > pdf_text_score and x > z and len(pdf_text) >= len(cgt_text_20):
-        return pdf_text
+        return chosen('pdf', pdf_text)
     else:
-        return cgt_text_20
+        return chosen('cgt_20', cgt_text_20)
 
@@ -0,0 +1,318 @@
+"""
+Admission control for the OCR endpoints
+Every OCR computation runs in a lane (interactive camera scans, cheap
+extract-* calls, batch items). Lanes share a fixed number of worker slots;
+each lane also has its own concurrency limit and a bounded wait queue.
+
+- A free slot goes to the highest-priority lane with a waiter (ties in
+  arrival order), so batch traffic only gets what interactive leaves over
+- A full queue, or an estimated wait (queued work ahead x observed
+  service time) longer than the lane's deadline, raises AdmissionRejected
+  straight away with a Retry-After estimate (HTTP 429); a request that was
+  queued still gives up after the lane's max_wait
+- stats() reports queue depth, running count and wait-time percentiles per lane
+"""
+
+import asyncio
+import itertools
+import math
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+
+from metrics import ADMISSION_WAIT_SECONDS
+
+
+SLOTS = int(os.environ.get('OCR_ADMISSION_SLOTS', 0)) or os.cpu_count() or 4
+QUEUE_FACTOR = int(os.environ.get('OCR_ADMISSION_QUEUE_FACTOR', 4))
+
+# Lane -> priority (lower runs first), share of the slots, longest estimated
+# wait a request is queued for (s), max queue wait (s)
+LANES = {
+    'interactive': {'priority': 0, 'share': 1.0, 'deadline': 10, 'max_wait': 30},
+    'extract': {'priority': 0, 'share': 0.5, 'deadline': 10, 'max_wait': 30},
+    'batch': {'priority': 1, 'share': 0.5, 'deadline': 300, 'max_wait': 300},
+}
+
+# Which lane each coalescing route name runs in
+ROUTE_LANES = {
+    'analyze': 'interactive',
+    'analyze-step': 'interactive',
+    'generic': 'interactive',
+    'extract-nutrition': 'extract',
+    'extract-ingredients': 'extract',
+    'batch': 'batch',
+}
+
+WAIT_SAMPLES = 1000
+
+
+class AdmissionRejected(Exception):
+    """Lane saturated; retry_after is a whole number of seconds for the Retry-After header"""
+
+    def __init__(self, lane, reason, retry_after):
+        super().__init__(f"{lane} lane {reason}, retry in {retry_after}s")
+        self.lane = lane
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class Lane:
+    def __init__(self, name, priority, max_concurrent, max_queue, max_wait, deadline=None):
+        self.name = name
+        self.priority = priority
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.deadline = deadline or max_wait
+        self.running = 0
+        self.waiters = deque()
+        self.admitted = 0
+        self.rejected = 0
+        self.timed_out = 0
+        self.waits = deque(maxlen=WAIT_SAMPLES)
+        self.service_time = 1.0  # EWMA seconds, seeds the Retry-After estimate
+
+    def retry_after(self):
+        rounds = (len(self.waiters) + 1) / self.max_concurrent
+        return max(1, math.ceil(rounds * self.service_time))
+
+    def stats(self):
+        waits = sorted(self.waits)
+
+        def pct(p):
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 1) if waits else 0.0
+
+        return {
+            'priority': self.priority,
+            'running': self.running,
+            'queued': len(self.waiters),
+            'max_concurrent': self.max_concurrent,
+            'max_queue': self.max_queue,
+            'admitted': self.admitted,
+            'rejected': self.rejected,
+            'timed_out': self.timed_out,
+            'wait_ms': {'p50': pct(0.5), 'p95': pct(0.95), 'max': pct(1.0)},
+            'service_ms': round(self.service_time * 1000, 1)
+        }
+
+
+class Waiter:
+    """One queued acquire; woken by whichever thread hands it a slot"""
+
+    def __init__(self, seq, loop=None):
+        self.seq = seq
+        self.granted = False
+        self.enqueued = time.perf_counter()
+        self.loop = loop
+        if loop is None:
+            self.event = threading.Event()
+        else:
+            self.future = loop.create_future()
+
+    def wake(self):
+        if self.loop is None:
+            self.event.set()
+        else:
+            self.loop.call_soon_threadsafe(self._resolve)
+
+    def _resolve(self):
+        if not self.future.done():
+            self.future.set_result(True)
+
+
+class Ticket:
+    """A granted slot; release() is idempotent so it can also be tied to response close"""
+
+    def __init__(self, controller, lane, extra=False):
+        self.controller = controller
+        self.lane = lane
+        # Extra slot for a request's own fan-out: not a request, so not in the lane's stats
+        self.extra = extra
+        self.started = time.perf_counter()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.controller._release(self)
+
+
+class AdmissionController:
+    """Shared slot pool with per-lane limits, bounded queues and priority hand-off"""
+
+    def __init__(self, slots=None, lanes=None, queue_factor=None):
+        self.slots = slots or SLOTS
+        queue_factor = queue_factor or QUEUE_FACTOR
+        self.lanes = {}
+        for name, spec in (lanes or LANES).items():
+            max_concurrent = max(1, int(self.slots * spec['share']))
+            self.lanes[name] = Lane(
+                name, spec['priority'], max_concurrent,
+                spec.get('max_queue', self.slots * queue_factor), spec['max_wait'],
+                spec.get('deadline')
+            )
+        self.running = 0
+        self._lock = threading.Lock()
+        self._seq = itertools.count()
+
+    def _can_start(self, lane):
+        return self.running < self.slots and lane.running < lane.max_concurrent
+
+    def _start(self, lane, waited):
+        self.running += 1
+        lane.running += 1
+        lane.admitted += 1
+        lane.waits.append(waited)
+        ADMISSION_WAIT_SECONDS.observe(waited, lane=lane.name)
+
+    def _enqueue(self, lane, loop=None):
+        """Grant immediately or queue; returns a Ticket or a Waiter. Caller holds the lock."""
+        if self._can_start(lane) and not self._waiting_ahead(lane):
+            self._start(lane, 0.0)
+            return Ticket(self, lane)
+        if len(lane.waiters) >= lane.max_queue:
+            lane.rejected += 1
+            raise AdmissionRejected(lane.name, 'queue full', lane.retry_after())
+        if self._estimated_wait(lane) > lane.deadline:
+            lane.rejected += 1
+            raise AdmissionRejected(lane.name, 'wait would exceed deadline', lane.retry_after())
+        waiter = Waiter(next(self._seq), loop)
+        lane.waiters.append(waiter)
+        return waiter
+
+    def _estimated_wait(self, lane):
+        """
+        Seconds a new waiter in lane would queue: the work queued in lanes it
+        cannot overtake, plus itself, served max_concurrent at a time
+        """
+        ahead = sum(len(other.waiters) for other in self.lanes.values() if other.priority <= lane.priority)
+        return (ahead + 1) / min(lane.max_concurrent, self.slots) * lane.service_time
+
+    def _waiting_ahead(self, lane):
+        """Queued work of equal or higher priority that could use a slot gets it first"""
+        return any(
+            other.waiters and other.priority <= lane.priority and other.running < other.max_concurrent
+            for other in self.lanes.values()
+        )
+
+    def _dispatch(self):
+        """Hand free slots to waiters: best priority first, then oldest. Caller holds the lock."""
+        while self.running < self.slots:
+            eligible = [
+                lane for lane in self.lanes.values()
+                if lane.waiters and lane.running < lane.max_concurrent
+            ]
+            if not eligible:
+                return
+            lane = min(eligible, key=lambda l: (l.priority, l.waiters[0].seq))
+            waiter = lane.waiters.popleft()
+            waiter.granted = True
+            self._start(lane, time.perf_counter() - waiter.enqueued)
+            waiter.wake()
+
+    def _abandon(self, lane, waiter):
+        """Timed-out or cancelled waiter: leave the queue, or give back a slot granted meanwhile"""
+        with self._lock:
+            if waiter.granted:
+                return Ticket(self, lane)
+            lane.waiters.remove(waiter)
+            lane.timed_out += 1
+        return None
+
+    def _release(self, ticket):
+        lane = ticket.lane
+        with self._lock:
+            self.running -= 1
+            lane.running -= 1
+            if not ticket.extra:
+                elapsed = time.perf_counter() - ticket.started
+                lane.service_time = 0.8 * lane.service_time + 0.2 * elapsed
+            self._dispatch()
+
+    def try_acquire(self, lane_name):
+        """
+        An extra slot for work an admitted request fans out, if one is free
+        now and nobody is queued for it, else None; never waits
+        """
+        lane = self.lanes[lane_name]
+        with self._lock:
+            if self._can_start(lane) and not self._waiting_ahead(lane):
+                self.running += 1
+                lane.running += 1
+                return Ticket(self, lane, extra=True)
+        return None
+
+    def acquire(self, lane_name):
+        """Block until a slot is granted; raises AdmissionRejected when saturated"""
+        lane = self.lanes[lane_name]
+        with self._lock:
+            waiter = self._enqueue(lane)
+        if isinstance(waiter, Ticket):
+            return waiter
+
+        if waiter.event.wait(lane.max_wait):
+            return Ticket(self, lane)
+        ticket = self._abandon(lane, waiter)
+        if ticket is None:
+            raise AdmissionRejected(lane.name, 'wait timed out', lane.retry_after())
+        return ticket
+
+    async def acquire_async(self, lane_name):
+        """acquire() for asyncio servers: waits on a future instead of a thread"""
+        lane = self.lanes[lane_name]
+        with self._lock:
+            waiter = self._enqueue(lane, asyncio.get_running_loop())
+        if isinstance(waiter, Ticket):
+            return waiter
+
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), lane.max_wait)
+            return Ticket(self, lane)
+        except asyncio.TimeoutError:
+            ticket = self._abandon(lane, waiter)
+            if ticket is None:
+                raise AdmissionRejected(lane.name, 'wait timed out', lane.retry_after())
+            return ticket
+        except asyncio.CancelledError:
+            ticket = self._abandon(lane, waiter)
+            if ticket is not None:
+                ticket.release()
+            raise
+
+    @contextmanager
+    def admit(self, lane_name):
+        ticket = self.acquire(lane_name)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    @asynccontextmanager
+    async def admit_async(self, lane_name):
+        ticket = await self.acquire_async(lane_name)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'slots': self.slots,
+                'running': self.running,
+                'queued': sum(len(lane.waiters) for lane in self.lanes.values()),
+                'lanes': {name: lane.stats() for name, lane in self.lanes.items()}
+            }
+
+
+def rejection_body(error):
+    """JSON body for a 429; send error.retry_after as the Retry-After header"""
+    return {
+        'error': str(error),
+        'lane': error.lane,
+        'retry_after': error.retry_after,
+        'success': False
+    }
@@ -3,12 +3,25 @@ Flask API wrapper for Enhanced OCR Pipeline
 Provides REST API endpoints for FoodConnect React frontend
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
 import cv2
 import numpy as np
-from enhanced_ocr_pipeline import FoodPackageOCR
+from enhanced_ocr_pipeline import FoodPackageOCR, INGREDIENT_OUTPUTS, NUTRITION_OUTPUTS, parse_outputs
+from batch_analysis import BatchTooLarge, collect_batch_items, run_batch, spool
+from singleflight import SingleFlight, content_key
+from admission import AdmissionController, AdmissionRejected, ROUTE_LANES, rejection_body
+from responses import compact_analysis, render
+from pipeline_profiles import get_profile
+from keyword_matcher import MATCHER
+import metrics
+import tracing
+import profiler
+import slow_capture
+from metrics import stage
 import base64
+import json
+import time
 from io import BytesIO
 from PIL import Image
 import re
@@ -19,6 +32,81 @@ CORS(app)  # Enable CORS for React frontend
 # Initialize OCR
 ocr = FoodPackageOCR()
 
+# Identical concurrent uploads share one OCR run
+flight = SingleFlight()
+
+# Per-lane concurrency limits and bounded queues in front of the OCR work
+admission = AdmissionController()
+
+# Prometheus /metrics: per-route request time/CPU/Tesseract passes, stage histograms
+metrics.instrument_flask(app)
+metrics.register_coalescing(flight, 'api_server')
+metrics.register_admission(admission, 'api_server')
+# Per-request spans: Server-Timing header, optional OTLP export (OCR_TRACE_EXPORT)
+tracing.instrument_flask(app)
+# Admin-only sampling profiler: GET /api/admin/profile (needs OCR_ADMIN_TOKEN)
+profiler.instrument_flask(app)
+# Opt-in capture of slow requests for replay (OCR_SLOW_CAPTURE_MS)
+slow_capture.instrument_flask(app)
+
+
+def warmup():
+    """
+    Exercise the pipeline once so a process forked afterwards inherits
+    warm state: OpenCV kernels, compiled regexes, the NLTK vocabulary,
+    the Tesseract version probe
+    """
+    from vocab import english_vocab
+    english_vocab()
+    blank = np.full((64, 64, 3), 255, dtype=np.uint8)
+    ocr.preprocess_for_text_clarity(blank)
+    analysis_from_ocr(ocr.nlp_postprocess('Energy 0 kcal\nIngredients: water'))
+    detect_fssai('')
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+    except Exception as e:
+        print(f"Tesseract warmup skipped: {e}")
+
+
+def coalesced(route, img_bytes, build, lane=None, params=()):
+    """
+    Run build(decoded image) once for all concurrent uploads of the same bytes to route
+    (and the same params). Only the leader takes an admission slot - coalesced
+    followers cost nothing. The lane is part of the key: an interactive request
+    never waits behind a batch-lane leader queued for a batch slot.
+    """
+    lane = lane or ROUTE_LANES[route]
+    def run():
+        with admission.admit(lane):
+            return build(decode_image(img_bytes))
+    
+    return flight.do(content_key(route, img_bytes, lane, *params), run)
+
+
+def admission_rejected(error):
+    """429 with Retry-After for a saturated lane"""
+    response = jsonify(rejection_body(error))
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+
+def profile_params(profile):
+    """Coalescing key params for a pipeline profile (None = default recipe)"""
+    return (profile.name,) if profile is not None else ()
+
+
+def decode_image(img_bytes):
+    """Decode uploaded image bytes into a BGR numpy array"""
+    with stage('decode'):
+        img = Image.open(BytesIO(img_bytes))
+        img_array = np.array(img)
+        
+        if len(img_array.shape) == 3 and img_array.shape[2] == 3:
+            img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+    
+    return img_array
+
 
 @app.route('/api/ocr/health', methods=['GET'])
 def health_check():
@@ -26,10 +114,17 @@ def health_check():
     return jsonify({
         'status': 'healthy',
         'service': 'Enhanced OCR Pipeline',
-        'version': '1.0.0'
+        'version': '1.0.0',
+        'coalesced_requests': flight.coalesced
     })
 
 
+@app.route('/api/ocr/stats', methods=['GET'])
+def ocr_stats():
+    """Request coalescing counters, admission queue depth and wait times"""
+    return jsonify({'coalescing': flight.stats(), 'admission': admission.stats()})
+
+
 @app.route('/api/ocr/analyze', methods=['POST'])
 def analyze_food_package():
     """
@@ -37,36 +132,130 @@ def analyze_food_package():
     
     Returns:
     - OCR data + FSSAI detection + Safety score + Nutritional analysis
+    
+    ?fields=a,b.c keeps only those fields, ?compact=1 returns the slim schema;
+    the body is gzip/brotli-compressed when the client accepts it.
+    ?profile=fast|balanced|accurate picks a pipeline profile (see
+    pipeline_profiles.py); its measured cost is returned under 'profile'.
     """
     try:
         # Handle file upload
         if 'image' in request.files:
-            file = request.files['image']
-            img_bytes = file.read()
-            img = Image.open(BytesIO(img_bytes))
-            img_array = np.array(img)
-            
-            if len(img_array.shape) == 3 and img_array.shape[2] == 3:
-                img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+            img_bytes = request.files['image'].read()
         else:
             return jsonify({'error': 'No image provided'}), 400
         
-        # Process OCR
-        ocr_result = ocr.process_food_package(img_array)
+        try:
+            profile = get_profile(request.values.get('profile'))
+        except ValueError as e:
+            return jsonify({'error': str(e), 'success': False}), 400
         
-        # Enhanced analysis
-        analysis = {
+        payload = coalesced(
+            'analyze', img_bytes, lambda img_array: build_analysis(img_array, profile),
+            params=profile_params(profile)
+        )
+        body, headers = render(
+            payload, request.values, request.headers.get('Accept-Encoding', ''), compact_analysis
+        )
+        return Response(body, status=200, headers=headers)
+    
+    except AdmissionRejected as e:
+        return admission_rejected(e)
+    except Exception as e:
+        return jsonify({'error': str(e), 'success': False}), 500
+
+
+def build_analysis(img_array, profile=None):
+    """Full analysis payload for one decoded image (shared by single and batch routes)"""
+    # Process OCR
+    return analysis_from_ocr(ocr.process_food_package(img_array, profile=profile))
+
+
+def analysis_from_ocr(ocr_result):
+    """Add FSSAI, nutrition and safety analysis to structured OCR output"""
+    # Enhanced analysis
+    with stage('scoring'):
+        return {
             **ocr_result,
             'fssai': detect_fssai(ocr_result['raw_text']),
             'nutrition_analysis': analyze_nutrition(ocr_result['nutrition_facts']),
             'safety_score': calculate_safety_score(ocr_result),
             'success': True
         }
+
+
+@app.route('/api/ocr/analyze-batch', methods=['POST'])
+def analyze_batch():
+    """
+    Analyze many food package images in one request
+    
+    Accepts any number of 'images' files (zip archives are expanded) and
+    streams one NDJSON line per image in completion order, followed by a
+    summary line. A failing image is reported on its own line and does
+    not fail the batch. ?profile= applies one pipeline profile to every image.
+    """
+    uploads = []
+    try:
+        files = request.files.getlist('images') + request.files.getlist('image')
+        if not files:
+            return jsonify({'error': 'No images provided', 'success': False}), 400
+        
+        try:
+            profile = get_profile(request.values.get('profile'))
+        except ValueError as e:
+            return jsonify({'error': str(e), 'success': False}), 400
         
-        return jsonify(analysis), 200
+        # Flask closes the uploads when this view returns, before the batch has run
+        uploads = [(f.filename, spool(f.stream)) for f in files]
+        try:
+            items, errors = collect_batch_items(uploads)
+        except BatchTooLarge as e:
+            close_uploads(uploads)
+            return jsonify({'error': str(e), 'success': False}), 413
+        if not items and not errors:
+            close_uploads(uploads)
+            return jsonify({'error': 'No images found in upload', 'success': False}), 400
     
     except Exception as e:
+        close_uploads(uploads)
         return jsonify({'error': str(e), 'success': False}), 500
+    
+    def generate():
+        succeeded = 0
+        for error in errors:
+            yield json.dumps({'index': None, 'success': False, **error}) + '\n'
+        def analyze_item(img_bytes):
+            return coalesced(
+                'analyze', img_bytes, lambda img_array: build_analysis(img_array, profile),
+                lane='batch', params=profile_params(profile)
+            )
+        
+        try:
+            for item in run_batch(items, analyze_item):
+                succeeded += item['success']
+                yield json.dumps(item) + '\n'
+        finally:
+            close_uploads(uploads)
+        yield json.dumps({'summary': {
+            'total': len(items) + len(errors),
+            'succeeded': succeeded,
+            'failed': len(items) + len(errors) - succeeded
+        }}) + '\n'
+    
+    response = Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    # Also when the client goes away before the stream starts (generate() never runs)
+    response.call_on_close(lambda: close_uploads(uploads))
+    return response
+
+
+def close_uploads(uploads):
+    """Close the spooled copies of a batch's uploads"""
+    for _, stream in uploads:
+        stream.close()
 
 
 def detect_fssai(raw_text):
@@ -141,7 +330,7 @@ def calculate_safety_score(ocr_result):
     
     # Processing penalties
     ingredients_text = ' '.join(ocr_result.get('ingredients', [])).lower()
-    if any(word in ingredients_text for word in ['emulsifier', 'artificial', 'preservative']):
+    if MATCHER.scan(ingredients_text).has('ultra_processed'):
         penalty = 10
         score -= penalty
         penalties.append(f'Ultra-processed - {penalty} points')
@@ -165,67 +354,43 @@ def analyze_step_by_step():
     """
     Analyze food package with step-by-step results
     Returns intermediate results from each step
+    
+    Streaming mode (?stream=sse or Accept: text/event-stream, or
+    ?stream=ndjson) emits each step as soon as it completes, plus
+    best-so-far text and partial nutrition facts after every OCR pass.
+    ?profile= picks a pipeline profile, e.g. 'fast' for a camera preview.
     """
     try:
         # Handle image input (same as above)
         if 'image' in request.files:
-            file = request.files['image']
-            img_bytes = file.read()
-            img = Image.open(BytesIO(img_bytes))
-            img_array = np.array(img)
-            
-            if len(img_array.shape) == 3 and img_array.shape[2] == 3:
-                img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+            img_bytes = request.files['image'].read()
         else:
             return jsonify({'error': 'No image provided'}), 400
         
-        # Step 1: Image Intake
-        step1_result = {
-            'step': 1,
-            'name': 'Image Intake',
-            'status': 'completed',
-            'image_shape': img_array.shape,
-            'message': 'Image accepted as-is'
-        }
+        try:
+            profile = get_profile(request.values.get('profile'))
+        except ValueError as e:
+            return jsonify({'error': str(e), 'success': False}), 400
         
-        # Step 2: Image Understanding
-        preprocessed = ocr.preprocess_for_text_clarity(img_array)
-        step2_result = {
-            'step': 2,
-            'name': 'Image Understanding',
-            'status': 'completed',
-            'techniques_applied': list(preprocessed.keys()),
-            'message': 'Image preprocessed for text clarity'
-        }
-        
-        # Step 3: OCR Extraction
-        raw_text = ocr.extract_raw_text(preprocessed)
-        step3_result = {
-            'step': 3,
-            'name': 'OCR Extraction',
-            'status': 'completed',
-            'text_length': len(raw_text),
-            'lines_extracted': len(raw_text.split('\n')),
-            'raw_text_preview': raw_text[:200] + '...' if len(raw_text) > 200 else raw_text
-        }
+        stream_format = get_stream_format()
+        if stream_format:
+            # The slot is held for the life of the stream, released when the response closes
+            ticket = admission.acquire(ROUTE_LANES['analyze-step'])
+            try:
+                response = stream_events(analyze_step_events(decode_image(img_bytes), profile=profile), stream_format)
+            except Exception:
+                ticket.release()
+                raise
+            response.call_on_close(ticket.release)
+            return response
         
-        # NLP Post-processing
-        structured_data = ocr.nlp_postprocess(raw_text)
-        nlp_result = {
-            'step': 4,
-            'name': 'NLP Post-processing',
-            'status': 'completed',
-            'nutrition_facts_count': len(structured_data['nutrition_facts']),
-            'ingredients_count': len(structured_data['ingredients']),
-            'allergens_count': len(structured_data['allergens'])
-        }
-        
-        return jsonify({
-            'steps': [step1_result, step2_result, step3_result, nlp_result],
-            'final_result': structured_data,
-            'success': True
-        }), 200
+        return jsonify(coalesced(
+            'analyze-step', img_bytes, lambda img_array: build_step_analysis(img_array, profile),
+            params=profile_params(profile)
+        )), 200
     
+    except AdmissionRejected as e:
+        return admission_rejected(e)
     except Exception as e:
         return jsonify({
             'error': str(e),
@@ -233,29 +398,206 @@ def analyze_step_by_step():
         }), 500
 
 
+def build_step_analysis(img_array, profile=None):
+    """Non-streaming step-by-step payload: every step plus the final result"""
+    steps = []
+    final_result = None
+    for event, payload in analyze_step_events(img_array, partials=False, profile=profile):
+        if event == 'step':
+            steps.append(payload)
+        elif event == 'result':
+            final_result = payload
+    
+    return {
+        'steps': steps,
+        'final_result': final_result,
+        'success': True
+    }
+
+
+def get_stream_format():
+    """Return 'sse', 'ndjson' or None depending on what the client asked for"""
+    stream = request.args.get('stream', '').lower()
+    if stream in ('sse', 'ndjson'):
+        return stream
+    if stream in ('1', 'true') or 'text/event-stream' in request.headers.get('Accept', ''):
+        return 'sse'
+    if 'application/x-ndjson' in request.headers.get('Accept', ''):
+        return 'ndjson'
+    return None
+
+
+def stream_events(events, stream_format):
+    """Wrap an (event, payload) generator in a streaming SSE/NDJSON response"""
+    def generate():
+        try:
+            for event, payload in events:
+                if stream_format == 'sse':
+                    yield f"event: {event}\ndata: {json.dumps(payload)}\n\n"
+                else:
+                    yield json.dumps({'event': event, 'data': payload}) + '\n'
+        except Exception as e:
+            error = {'error': str(e), 'success': False}
+            if stream_format == 'sse':
+                yield f"event: error\ndata: {json.dumps(error)}\n\n"
+            else:
+                yield json.dumps({'event': 'error', 'data': error}) + '\n'
+    
+    mimetype = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+def elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 2)
+
+
+def analyze_step_events(img_array, partials=True, profile=None):
+    """
+    Run the step-by-step pipeline, yielding (event, payload) tuples:
+    - 'step': a completed step object (same shape as the steps array)
+    - 'partial': progress after each OCR pass, with the best-so-far text
+      and nutrition facts parsed from it whenever the best pass changes
+      (skipped when partials=False)
+    - 'result': the final structured data
+    
+    Every step carries its duration_ms; a final 'Timing' step lists the
+    request's trace spans (decode, each variant, each Tesseract pass, ...)
+    and, with a pipeline profile, the profile's measured cost.
+    """
+    # Step 1: Image Intake
+    started = time.perf_counter()
+    yield 'step', {
+        'step': 1,
+        'name': 'Image Intake',
+        'status': 'completed',
+        'image_shape': img_array.shape,
+        'message': 'Image accepted as-is',
+        'duration_ms': elapsed_ms(started)
+    }
+    
+    # Step 2: Image Understanding
+    started = time.perf_counter()
+    run = profile_passes = None
+    if profile is not None:
+        run, preprocessed, profile_passes = ocr.start_profile(img_array, profile)
+    else:
+        preprocessed = ocr.preprocess_for_text_clarity(img_array)
+    yield 'step', {
+        'step': 2,
+        'name': 'Image Understanding',
+        'status': 'completed',
+        'techniques_applied': list(preprocessed.keys()),
+        'message': 'Image preprocessed for text clarity',
+        'duration_ms': elapsed_ms(started)
+    }
+    
+    # Step 3: OCR Extraction, reporting the best text after every pass.
+    # Only time spent inside the passes counts - not time the client
+    # takes to read the partial events in between.
+    raw_text = ''
+    best_score = None
+    passes = 0
+    ocr_ms = 0.0
+    ocr_passes = ocr.iter_ocr_passes(preprocessed, passes=profile_passes, run=run)
+    while True:
+        started = time.perf_counter()
+        item = next(ocr_passes, None)
+        ocr_ms += elapsed_ms(started)
+        if item is None:
+            break
+        method, config, text = item
+        passes += 1
+        score = ocr._score_text_quality(text)
+        improved = best_score is None or score > best_score
+        if improved:
+            best_score = score
+            raw_text = text
+        if not partials:
+            continue
+        partial = {'pass': passes, 'method': method, 'config': config}
+        if improved:
+            partial.update({
+                'best_method': method,
+                'best_config': config,
+                'best_text': raw_text,
+                'nutrition_facts': ocr.nlp_postprocess(raw_text)['nutrition_facts']
+            })
+        yield 'partial', partial
+    
+    yield 'step', {
+        'step': 3,
+        'name': 'OCR Extraction',
+        'status': 'completed',
+        'text_length': len(raw_text),
+        'lines_extracted': len(raw_text.split('\n')),
+        'raw_text_preview': raw_text[:200] + '...' if len(raw_text) > 200 else raw_text,
+        'duration_ms': round(ocr_ms, 2)
+    }
+    
+    # NLP Post-processing (and the nutrition table, if the text's values disagree)
+    started = time.perf_counter()
+    structured_data = ocr.finish(img_array, raw_text, run=run)
+    yield 'step', {
+        'step': 4,
+        'name': 'NLP Post-processing',
+        'status': 'completed',
+        'nutrition_facts_count': len(structured_data['nutrition_facts']),
+        'ingredients_count': len(structured_data['ingredients']),
+        'allergens_count': len(structured_data['allergens']),
+        'duration_ms': elapsed_ms(started)
+    }
+    
+    # Timing breakdown: every traced span of this request so far
+    trace = tracing.current_trace()
+    profile_report = run.report() if run is not None else None
+    yield 'step', {
+        'step': 5,
+        'name': 'Timing',
+        'status': 'completed',
+        'spans': trace.summary() if trace else [],
+        'total_ms': round(trace.root.duration_ms, 2) if trace else None,
+        **({'profile': profile_report} if profile_report else {})
+    }
+    if profile_report:
+        structured_data['profile'] = profile_report
+    
+    yield 'result', structured_data
+
+
 @app.route('/api/ocr/extract-nutrition', methods=['POST'])
 def extract_nutrition_only():
-    """Extract only nutrition facts from image"""
+    """
+    Extract only nutrition facts from image
+    
+    Runs just the table-oriented preprocessing/OCR passes and the nutrition
+    parsers. ?outputs= (or an 'outputs' form field) picks other fields,
+    e.g. outputs=nutrition_facts; ?profile= runs a pipeline profile's
+    passes among those
+    """
     try:
         if 'image' in request.files:
-            file = request.files['image']
-            img_bytes = file.read()
-            img = Image.open(BytesIO(img_bytes))
-            img_array = np.array(img)
-            
-            if len(img_array.shape) == 3 and img_array.shape[2] == 3:
-                img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+            img_bytes = request.files['image'].read()
         else:
             return jsonify({'error': 'No image provided'}), 400
         
-        result = ocr.process_food_package(img_array)
+        try:
+            outputs = parse_outputs(request.values.get('outputs'), NUTRITION_OUTPUTS)
+            profile = get_profile(request.values.get('profile'))
+        except ValueError as e:
+            return jsonify({'error': str(e), 'success': False}), 400
         
-        return jsonify({
-            'nutrition_facts': result['nutrition_facts'],
-            'serving_size': result['serving_size'],
-            'success': True
-        }), 200
+        payload = coalesced(
+            'extract-nutrition', img_bytes, lambda img_array: extract_nutrition_payload(img_array, outputs, profile),
+            params=outputs + profile_params(profile)
+        )
+        return jsonify(payload), 200
     
+    except AdmissionRejected as e:
+        return admission_rejected(e)
     except Exception as e:
         return jsonify({
             'error': str(e),
@@ -263,29 +605,44 @@ def extract_nutrition_only():
         }), 500
 
 
+def extract_nutrition_payload(img_array, outputs=NUTRITION_OUTPUTS, profile=None):
+    """Nutrition-only payload for one decoded image"""
+    result = ocr.process_food_package(img_array, outputs, profile)
+    
+    return {
+        **{key: result[key] for key in outputs + ('profile',) if key in result},
+        'success': True
+    }
+
+
 @app.route('/api/ocr/extract-ingredients', methods=['POST'])
 def extract_ingredients_only():
-    """Extract only ingredients from image"""
+    """
+    Extract only ingredients from image
+    
+    Runs just the paragraph-oriented preprocessing/OCR passes and the
+    ingredient/allergen parsers. ?outputs= picks other fields.
+    """
     try:
         if 'image' in request.files:
-            file = request.files['image']
-            img_bytes = file.read()
-            img = Image.open(BytesIO(img_bytes))
-            img_array = np.array(img)
-            
-            if len(img_array.shape) == 3 and img_array.shape[2] == 3:
-                img_array = cv2.cvtColor(img_array, cv2.COLOR_RGB2BGR)
+            img_bytes = request.files['image'].read()
         else:
             return jsonify({'error': 'No image provided'}), 400
         
-        result = ocr.process_food_package(img_array)
+        try:
+            outputs = parse_outputs(request.values.get('outputs'), INGREDIENT_OUTPUTS)
+            profile = get_profile(request.values.get('profile'))
+        except ValueError as e:
+            return jsonify({'error': str(e), 'success': False}), 400
         
-        return jsonify({
-            'ingredients': result['ingredients'],
-            'allergens': result['allergens'],
-            'success': True
-        }), 200
+        payload = coalesced(
+            'extract-ingredients', img_bytes, lambda img_array: extract_ingredients_payload(img_array, outputs, profile),
+            params=outputs + profile_params(profile)
+        )
+        return jsonify(payload), 200
     
+    except AdmissionRejected as e:
+        return admission_rejected(e)
     except Exception as e:
         return jsonify({
             'error': str(e),
@@ -293,17 +650,32 @@ def extract_ingredients_only():
         }), 500
 
 
+def extract_ingredients_payload(img_array, outputs=INGREDIENT_OUTPUTS, profile=None):
+    """Ingredients-only payload for one decoded image"""
+    result = ocr.process_food_package(img_array, outputs, profile)
+    
+    return {
+        **{key: result[key] for key in outputs + ('profile',) if key in result},
+        'success': True
+    }
+
+
 if __name__ == '__main__':
     print("=" * 70)
     print("Enhanced OCR API Server")
     print("=" * 70)
     print("\nAvailable Endpoints:")
     print("  GET  /api/ocr/health              - Health check")
+    print("  GET  /metrics                     - Prometheus metrics")
     print("  POST /api/ocr/analyze             - Full analysis")
-    print("  POST /api/ocr/analyze-step        - Step-by-step analysis")
-    print("  POST /api/ocr/extract-nutrition   - Nutrition facts only")
-    print("  POST /api/ocr/extract-ingredients - Ingredients only")
+    print("  POST /api/ocr/analyze-batch       - Many images (or a zip), NDJSON results")
+    print("  POST /api/ocr/analyze-step        - Step-by-step analysis (?stream=sse|ndjson)")
+    print("  POST /api/ocr/extract-nutrition   - Nutrition facts only (?outputs=...)")
+    print("  POST /api/ocr/extract-ingredients - Ingredients only (?outputs=...)")
     print("\nStarting server on http://localhost:5000")
     print("=" * 70)
-    
+
+    # Serve health checks right away; the vocabulary loads in the background
+    import threading
+    threading.Thread(target=warmup, name='warmup', daemon=True).start()
     app.run(debug=True, host='0.0.0.0', port=5000)
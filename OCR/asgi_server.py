@@ -0,0 +1,503 @@
+"""
+ASGI server mode for the OCR APIs (Starlette under uvicorn)
+Serves the same routes and response shapes as the Flask apps
+(api_server.py, test_ocr_simple.py and simple_api.py's health check), but:
+- OCR work runs in a sized process pool instead of the request thread
+- cheap endpoints (health, chat, barcode, alternatives) answer straight
+  from the event loop, so they stay responsive while OCR is busy
+
+Run:
+    python asgi_server.py
+    OCR_PROCESSES=4 uvicorn asgi_server:app --host 0.0.0.0 --port 5002
+
+With OCR_SHM_TRANSPORT=1, /api/ocr/analyze decodes the upload once, hands
+the image and its preprocessing variants to workers through shared memory
+(see shm_transport.py) and OCRs the variants in parallel, one per admission
+slot the request holds or finds idle.
+"""
+
+import asyncio
+import importlib
+import json
+import multiprocessing
+import os
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+
+from starlette.applications import Starlette
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.middleware.cors import CORSMiddleware
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+import ocr_worker
+from batch_analysis import BatchTooLarge, collect_batch_items, run_batch
+from singleflight import SingleFlight, content_key
+from enhanced_ocr_pipeline import INGREDIENT_OUTPUTS, NUTRITION_OUTPUTS, parse_outputs
+from admission import AdmissionController, AdmissionRejected, ROUTE_LANES, rejection_body
+from responses import compact_analysis, compact_generic, render
+from pipeline_profiles import get_profile
+import metrics
+import profiler
+import tracing
+import slow_capture
+
+# One OCR process per core by default; each runs Tesseract passes serially
+OCR_PROCESSES = int(os.getenv('OCR_PROCESSES', str(os.cpu_count() or 2)))
+
+# Shared-memory handoff of decoded images/variants to the workers
+SHM_TRANSPORT = os.getenv('OCR_SHM_TRANSPORT', '0') == '1'
+# Segments older than this are treated as leaked by a failed request
+SHM_MAX_AGE = float(os.getenv('OCR_SHM_MAX_AGE', '300'))
+
+pool = None
+
+# Identical concurrent uploads attach to one in-flight computation
+flight = SingleFlight()
+
+# One slot per pool process; interactive scans are handed slots before batch items
+admission = AdmissionController(slots=OCR_PROCESSES)
+
+metrics.register_coalescing(flight, 'asgi')
+metrics.register_admission(admission, 'asgi')
+
+
+async def reap_shared_segments():
+    """Periodically unlink shared segments that outlived their request"""
+    from shm_transport import registry
+    while True:
+        await asyncio.sleep(30)
+        leaks = registry.reap_leaks(SHM_MAX_AGE)
+        if leaks:
+            print(f"[shm] reaped {len(leaks)} leaked segment(s): {[l['label'] for l in leaks]}")
+
+
+@asynccontextmanager
+async def lifespan(app):
+    global pool
+    # spawn (not fork): the event loop already has threads running
+    pool = ProcessPoolExecutor(
+        max_workers=OCR_PROCESSES,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=ocr_worker.init_worker
+    )
+    # Start (and warm) the workers now without waiting for them: the server
+    # answers health checks at once, and the first OCR request finds them ready
+    for _ in range(OCR_PROCESSES):
+        pool.submit(int)
+    # Chat runs here, not in the pool: import its module and discover the
+    # Gemini model off the loop
+    test_ocr_simple = await import_off_loop('test_ocr_simple')
+    asyncio.get_running_loop().run_in_executor(None, test_ocr_simple.gemini_model)
+    reaper = asyncio.create_task(reap_shared_segments()) if SHM_TRANSPORT else None
+    yield
+    if reaper:
+        reaper.cancel()
+    pool.shutdown(cancel_futures=True)
+
+
+async def import_off_loop(name):
+    """
+    Import a module in a worker thread: test_ocr_simple brings in NLTK
+    and a Flask app, which must not stall requests already on the loop
+    """
+    return await run_in_threadpool(importlib.import_module, name)
+
+
+async def run_ocr(fn, *args):
+    """Run an ocr_worker function in the process pool without blocking the loop"""
+    loop = asyncio.get_running_loop()
+    active = profiler.current_request.get()
+    if active is None:
+        result, samples, spans = await loop.run_in_executor(pool, ocr_worker.instrumented, fn, *args)
+    else:
+        result, samples, spans, stacks = await loop.run_in_executor(
+            pool, ocr_worker.profiled, active.profile.interval, fn, *args)
+        profiler.sampler.add_samples(active, stacks)
+    metrics.registry.merge(samples)
+    tracing.adopt(spans)
+    return result
+
+
+async def admitted(route, coro_fn, *args, lane=None):
+    """Await coro_fn(*args) once the route's lane grants a slot"""
+    async with admission.admit_async(lane or ROUTE_LANES[route]):
+        return await coro_fn(*args)
+
+
+def admitted_batch_item(img_bytes, profile=None, profiled=None):
+    """
+    Batch item run from a helper thread: wait for a batch-lane slot, then use
+    the pool. `profiled` is the batch request's profiler.ActiveRequest, if any
+    (the batch threads don't inherit the request's context)
+    """
+    with admission.admit(ROUTE_LANES['batch']):
+        if profiled is None:
+            result, samples, _ = pool.submit(ocr_worker.instrumented, ocr_worker.analyze, img_bytes, profile).result()
+        else:
+            result, samples, _, stacks = pool.submit(
+                ocr_worker.profiled, profiled.profile.interval, ocr_worker.analyze, img_bytes, profile).result()
+            profiler.sampler.add_samples(profiled, stacks)
+    metrics.registry.merge(samples)
+    return result
+
+
+def admission_rejected(error):
+    """429 with Retry-After for a saturated lane"""
+    return JSONResponse(
+        rejection_body(error), status_code=429,
+        headers={'Retry-After': str(error.retry_after)}
+    )
+
+
+async def read_image(request):
+    """Return the bytes of the 'image' upload, or None if missing"""
+    form = await request.form()
+    upload = form.get('image')
+    if upload is None or isinstance(upload, str):
+        return None
+    img_bytes = await upload.read()
+    if slow_capture.THRESHOLD_MS:
+        # Picked up by slow_capture.ASGIMiddleware if the request turns out slow
+        request.state.capture_image = img_bytes
+        request.state.capture_params = {**form, **request.query_params}
+    return img_bytes
+
+
+async def request_profile(request):
+    """Pipeline profile named by the 'profile' query/form parameter (ValueError if unknown)"""
+    form = await request.form()
+    return get_profile(request.query_params.get('profile') or form.get('profile'))
+
+
+async def shaped_response(request, payload, compact_schema, status_code=200):
+    """fields=/compact= selection, orjson encoding and gzip/brotli (see responses.py)"""
+    form = await request.form()
+    params = {**form, **request.query_params}
+    body, headers = render(payload, params, request.headers.get('accept-encoding', ''), compact_schema)
+    return Response(body, status_code=status_code, headers=headers)
+
+
+# ==================== api_server.py routes ====================
+async def ocr_health(request):
+    return JSONResponse({
+        'status': 'healthy',
+        'service': 'Enhanced OCR Pipeline',
+        'version': '1.0.0',
+        'coalesced_requests': flight.coalesced
+    })
+
+
+def ocr_route(route, worker_fn, default_outputs=None, compact_schema=None):
+    """
+    Build an api_server-style upload endpoint that runs worker_fn in the pool.
+    With default_outputs, the 'outputs' query/form parameter is parsed and
+    passed to worker_fn after the image bytes, followed by the 'profile'
+    parameter's pipeline profile name when one applies. With compact_schema,
+    the response goes through responses.render (fields=, compact=, compression).
+    """
+    async def endpoint(request):
+        try:
+            img_bytes = await read_image(request)
+            if img_bytes is None:
+                return JSONResponse({'error': 'No image provided'}, status_code=400)
+            
+            args = (img_bytes,)
+            if default_outputs is not None:
+                form = await request.form()
+                value = request.query_params.get('outputs') or form.get('outputs')
+                try:
+                    args += (parse_outputs(value, default_outputs),)
+                except ValueError as e:
+                    return JSONResponse({'error': str(e), 'success': False}, status_code=400)
+            try:
+                profile = await request_profile(request)
+            except ValueError as e:
+                return JSONResponse({'error': str(e), 'success': False}, status_code=400)
+            if profile is not None:
+                args += (profile.name,)
+            
+            key = content_key(route, *args)
+            payload = await flight.do_async(key, admitted, route, run_ocr, worker_fn, *args)
+            if compact_schema is not None:
+                return await shaped_response(request, payload, compact_schema)
+            return JSONResponse(payload)
+        except AdmissionRejected as e:
+            return admission_rejected(e)
+        except Exception as e:
+            return JSONResponse({'error': str(e), 'success': False}, status_code=500)
+    return endpoint
+
+
+pooled_analyze = ocr_route('analyze', ocr_worker.analyze, compact_schema=compact_analysis)
+
+
+async def analyze_shared(request):
+    """/api/ocr/analyze over shared memory, with the OCR variants fanned out across the pool"""
+    try:
+        try:
+            profile = await request_profile(request)
+        except ValueError as e:
+            return JSONResponse({'error': str(e), 'success': False}, status_code=400)
+        if profile is not None:
+            # A profile's few passes (and its budget) run in one worker
+            return await pooled_analyze(request)
+        
+        img_bytes = await read_image(request)
+        if img_bytes is None:
+            return JSONResponse({'error': 'No image provided'}, status_code=400)
+        
+        key = content_key('analyze', img_bytes)
+        payload = await flight.do_async(key, admitted, 'analyze', analyze_over_shm, img_bytes)
+        return await shaped_response(request, payload, compact_analysis)
+    except AdmissionRejected as e:
+        return admission_rejected(e)
+    except Exception as e:
+        return JSONResponse({'error': str(e), 'success': False}, status_code=500)
+
+
+async def analyze_over_shm(img_bytes):
+    """
+    Share the decoded image, preprocess once, then OCR the variants in
+    parallel - as many at once as the admission slots this request holds
+    """
+    from shm_transport import registry
+    api_server = await import_off_loop('api_server')
+    
+    img_array = await run_in_threadpool(api_server.decode_image, img_bytes)
+    with registry.scope():
+        image_handle = registry.share(img_array, 'decoded')
+        del img_array
+        
+        variants = await run_ocr(ocr_worker.preprocess_shared, image_handle)
+        for method, handle in variants.items():
+            registry.adopt(handle, method)
+        
+        # One pool task per admission slot held: the request's own slot, plus
+        # whichever slots are idle right now (taken without queueing)
+        extra = []
+        while len(extra) < len(variants) - 1:
+            ticket = admission.try_acquire(ROUTE_LANES['analyze'])
+            if ticket is None:
+                break
+            extra.append(ticket)
+        width = asyncio.Semaphore(1 + len(extra))
+        
+        async def ocr_variant(method, handle):
+            async with width:
+                return await run_ocr(ocr_worker.ocr_variant_shared, method, handle)
+        
+        try:
+            # Keep variant order so ties resolve exactly like the serial pipeline
+            results = await asyncio.gather(*(
+                ocr_variant(method, handle) for method, handle in variants.items()
+            ))
+        finally:
+            for ticket in extra:
+                ticket.release()
+        for handle in variants.values():
+            registry.release(handle)
+        
+        # The decoded image stays shared for finish(): it may read the nutrition table
+        all_texts = [passes for variant_passes in results for passes in variant_passes]
+        return await run_ocr(ocr_worker.finish_analysis, all_texts, image_handle)
+
+
+async def analyze_batch(request):
+    form = None
+    try:
+        form = await request.form()
+        uploads = [u for u in form.getlist('images') + form.getlist('image') if not isinstance(u, str)]
+        if not uploads:
+            await form.close()
+            return JSONResponse({'error': 'No images provided', 'success': False}, status_code=400)
+        try:
+            profile = await request_profile(request)
+        except ValueError as e:
+            await form.close()
+            return JSONResponse({'error': str(e), 'success': False}, status_code=400)
+        analyze_item = partial(admitted_batch_item, profile=profile.name if profile else None,
+                               profiled=profiler.current_request.get())
+        
+        try:
+            # Only sizes and zip directories are read here; the batch threads read each image
+            items, errors = await run_in_threadpool(collect_batch_items, [(u.filename, u.file) for u in uploads])
+        except BatchTooLarge as e:
+            await form.close()
+            return JSONResponse({'error': str(e), 'success': False}, status_code=413)
+        if not items and not errors:
+            await form.close()
+            return JSONResponse({'error': 'No images found in upload', 'success': False}, status_code=400)
+    
+    except Exception as e:
+        if form is not None:
+            await form.close()
+        return JSONResponse({'error': str(e), 'success': False}, status_code=500)
+    
+    async def generate():
+        succeeded = 0
+        for error in errors:
+            yield json.dumps({'index': None, 'success': False, **error}) + '\n'
+        # run_batch blocks on as_completed, so drive it from a helper thread;
+        # items wait for batch-lane slots on the batch threads, not in the pool queue
+        async for item in iterate_in_threadpool(run_batch(items, analyze_item)):
+            succeeded += item['success']
+            yield json.dumps(item) + '\n'
+        yield json.dumps({'summary': {
+            'total': len(items) + len(errors),
+            'succeeded': succeeded,
+            'failed': len(items) + len(errors) - succeeded
+        }}) + '\n'
+    
+    return ClosingStreamingResponse(
+        generate(),
+        form.close,
+        media_type='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+class ClosingStreamingResponse(StreamingResponse):
+    """
+    StreamingResponse that awaits on_close() however it ends: streamed,
+    failed, or the client gone before the first chunk (where neither the
+    generator's finally nor a background task would run)
+    """
+    
+    def __init__(self, content, on_close, **kwargs):
+        super().__init__(content, **kwargs)
+        self.on_close = on_close
+    
+    async def __call__(self, scope, receive, send):
+        try:
+            await super().__call__(scope, receive, send)
+        finally:
+            await self.on_close()
+
+
+async def ocr_stats(request):
+    from shm_transport import registry
+    return JSONResponse({
+        'coalescing': flight.stats(),
+        'admission': admission.stats(),
+        'shared_memory': registry.stats()
+    })
+
+
+async def metrics_endpoint(request):
+    """Prometheus metrics: this process's gauges plus samples merged from the pool workers"""
+    return Response(metrics.registry.render(), media_type=metrics.CONTENT_TYPE)
+
+
+# ==================== test_ocr_simple.py routes ====================
+async def analyze_generic(request):
+    try:
+        img_bytes = await read_image(request)
+        if img_bytes is None:
+            return JSONResponse({'error': 'No image provided'}, status_code=400)
+        try:
+            profile = await request_profile(request)
+        except ValueError as e:
+            return JSONResponse({'error': str(e), 'success': False}, status_code=400)
+        args = (img_bytes,) + ((profile.name,) if profile else ())
+        key = content_key('generic', *args)
+        payload, status = await flight.do_async(key, admitted, 'generic', run_ocr, ocr_worker.analyze_generic, *args)
+        return await shaped_response(request, payload, compact_generic, status)
+    except AdmissionRejected as e:
+        return admission_rejected(e)
+    except Exception as e:
+        tb = traceback.format_exc()
+        print('[OCR ERROR]', tb)
+        return JSONResponse({'success': False, 'error': str(e), 'traceback': tb}, status_code=500)
+
+
+async def scan_barcode(request):
+    try:
+        test_ocr_simple = await import_off_loop('test_ocr_simple')
+        data = await request.json()
+        return JSONResponse(test_ocr_simple.lookup_barcode(data.get('barcode', '')))
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def get_alternatives(request):
+    try:
+        test_ocr_simple = await import_off_loop('test_ocr_simple')
+        return JSONResponse({'alternatives': test_ocr_simple.get_alternative_products()})
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def track_affiliate_click(request):
+    try:
+        data = await request.json()
+        # Track affiliate clicks for revenue analytics
+        print(f"Affiliate click tracked: {data}")
+        return JSONResponse({'success': True})
+    except Exception as e:
+        return JSONResponse({'error': str(e)}, status_code=500)
+
+
+async def chat(request):
+    test_ocr_simple = await import_off_loop('test_ocr_simple')
+    # Gemini is a blocking network call: keep it off the event loop
+    payload, status = await run_in_threadpool(test_ocr_simple.chat_reply, await request.json())
+    return JSONResponse(payload, status_code=status)
+
+
+# ==================== simple_api.py routes ====================
+async def api_health(request):
+    return JSONResponse({
+        'status': 'healthy',
+        'service': 'FoodConnect OCR API',
+        'version': '1.0.0'
+    })
+
+
+routes = [
+    Route('/api/ocr/health', ocr_health, methods=['GET']),
+    Route('/api/ocr/stats', ocr_stats, methods=['GET']),
+    Route('/metrics', metrics_endpoint, methods=['GET']),
+    Route('/api/ocr/analyze', analyze_shared if SHM_TRANSPORT else pooled_analyze, methods=['POST']),
+    Route('/api/ocr/analyze-batch', analyze_batch, methods=['POST']),
+    Route('/api/ocr/analyze-step', ocr_route('analyze-step', ocr_worker.analyze_steps), methods=['POST']),
+    Route('/api/ocr/extract-nutrition', ocr_route('extract-nutrition', ocr_worker.extract_nutrition, NUTRITION_OUTPUTS), methods=['POST']),
+    Route('/api/ocr/extract-ingredients', ocr_route('extract-ingredients', ocr_worker.extract_ingredients, INGREDIENT_OUTPUTS), methods=['POST']),
+    Route('/api/analyze/generic', analyze_generic, methods=['POST']),
+    Route('/api/generic/analyze', analyze_generic, methods=['POST']),
+    Route('/api/barcode/scan', scan_barcode, methods=['POST']),
+    Route('/api/blinkit/alternatives', get_alternatives, methods=['POST']),
+    Route('/api/analytics/affiliate-click', track_affiliate_click, methods=['POST']),
+    Route('/api/chat', chat, methods=['POST']),
+    Route('/api/health', api_health, methods=['GET']),
+    # Admin-only sampling profiler (needs OCR_ADMIN_TOKEN); samples pool workers
+    Route('/api/admin/profile', profiler.asgi_endpoint, methods=['GET']),
+]
+
+app = Starlette(
+    routes=routes,
+    lifespan=lifespan,
+    middleware=[
+        Middleware(CORSMiddleware, allow_origins=['*'], allow_methods=['*'], allow_headers=['*']),
+        Middleware(tracing.ASGIMiddleware),
+        Middleware(slow_capture.ASGIMiddleware),
+        Middleware(profiler.ASGIMiddleware)
+    ]
+)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    
+    port = int(os.getenv('PORT', '5002'))
+    print("=" * 70)
+    print("OCR API Server (ASGI mode)")
+    print("=" * 70)
+    print(f"OCR process pool: {OCR_PROCESSES} workers")
+    print(f"Starting server on http://localhost:{port}")
+    print("=" * 70)
+    
+    uvicorn.run(app, host='0.0.0.0', port=port)
@@ -0,0 +1,208 @@
+"""
+Batch analysis helpers for the OCR API
+Schedules many package images across a worker pool and yields each
+result as soon as it finishes, so one slow or broken image never holds
+up (or fails) the rest of the batch.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import metrics
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.webp', '.tif', '.tiff')
+
+# Limits so a single upload cannot exhaust the server
+MAX_BATCH_ITEMS = int(os.getenv('OCR_BATCH_MAX_ITEMS', '500'))
+MAX_IMAGE_BYTES = int(os.getenv('OCR_BATCH_MAX_IMAGE_BYTES', str(25 * 1024 * 1024)))
+# Total image bytes per request, zip members counted decompressed
+MAX_BATCH_BYTES = int(os.getenv('OCR_BATCH_MAX_BYTES', str(256 * 1024 * 1024)))
+# Spooled uploads move from memory to a temporary file past this size
+SPOOL_BYTES = 1024 * 1024
+
+# Tesseract runs as a subprocess and OpenCV releases the GIL, so a thread
+# pool keeps every core busy without pickling images between processes
+BATCH_WORKERS = int(os.getenv('OCR_BATCH_WORKERS', str(os.cpu_count() or 2)))
+
+_executor = None
+
+
+def get_executor():
+    """Shared worker pool, created on first batch request"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=BATCH_WORKERS, thread_name_prefix='ocr-batch')
+    return _executor
+
+
+class BatchTooLarge(ValueError):
+    """The upload holds more images or image bytes than one batch may"""
+
+
+class UploadedImage:
+    """An uploaded image file, read when a worker picks it up"""
+
+    def __init__(self, stream, size):
+        self.stream = stream
+        self.size = size
+
+    def read(self):
+        self.stream.seek(0)
+        return self.stream.read(self.size)
+
+
+class ArchiveMember:
+    """An image inside an uploaded zip archive, decompressed when a worker picks it up"""
+
+    def __init__(self, archive, info):
+        self.archive = archive
+        self.info = info
+
+    def read(self):
+        # Read at most the declared size, so a forged header cannot exceed the batch byte limit
+        with self.archive.open(self.info) as member:
+            data = member.read(self.info.file_size + 1)
+        if len(data) > self.info.file_size:
+            raise ValueError('Image larger than its zip entry declares')
+        return data
+
+
+def spool(stream):
+    """Copy of an upload stream that outlives the request (on disk past SPOOL_BYTES)"""
+    copy = tempfile.SpooledTemporaryFile(max_size=SPOOL_BYTES)
+    shutil.copyfileobj(stream, copy)
+    copy.seek(0)
+    return copy
+
+
+def stream_size(stream):
+    """Bytes in a seekable upload stream, without reading it"""
+    stream.seek(0, os.SEEK_END)
+    size = stream.tell()
+    stream.seek(0)
+    return size
+
+
+def collect_batch_items(uploads):
+    """
+    Turn uploaded files into a list of (filename, image) items
+    
+    Nothing is read or decompressed here: sizes come from the upload
+    streams and the zip directories, and each image is read by the worker
+    that analyzes it, so at most one image per worker is in memory.
+    
+    Args:
+        uploads: iterable of (filename, stream) for each uploaded file
+                 (seekable binary streams that stay open for the batch);
+                 zip archives are expanded into their image members
+    
+    Returns:
+        (items, errors) - each item's image has a read() method returning
+        its bytes; errors are per-file problems found while listing
+    
+    Raises:
+        BatchTooLarge: more than MAX_BATCH_ITEMS images or MAX_BATCH_BYTES
+        image bytes, found before any image is read
+    """
+    items = []
+    errors = []
+    total_bytes = 0
+    
+    def add(filename, image, size):
+        nonlocal total_bytes
+        if len(items) >= MAX_BATCH_ITEMS:
+            raise BatchTooLarge(f'Too many images, limit is {MAX_BATCH_ITEMS}')
+        total_bytes += size
+        if total_bytes > MAX_BATCH_BYTES:
+            raise BatchTooLarge(f'Images too large in total, limit is {MAX_BATCH_BYTES} bytes')
+        items.append((filename, image))
+    
+    for filename, stream in uploads:
+        filename = filename or f'upload-{len(items)}'
+        
+        if filename.lower().endswith('.zip') or zipfile.is_zipfile(stream):
+            try:
+                stream.seek(0)
+                archive = zipfile.ZipFile(stream)
+                for info in archive.infolist():
+                    if info.is_dir() or not info.filename.lower().endswith(IMAGE_EXTENSIONS):
+                        continue
+                    if info.file_size > MAX_IMAGE_BYTES:
+                        errors.append({'filename': info.filename, 'error': 'Image too large'})
+                        continue
+                    add(info.filename, ArchiveMember(archive, info), info.file_size)
+            except zipfile.BadZipFile as e:
+                errors.append({'filename': filename, 'error': f'Invalid zip archive: {e}'})
+            continue
+        
+        size = stream_size(stream)
+        if size > MAX_IMAGE_BYTES:
+            errors.append({'filename': filename, 'error': 'Image too large'})
+        else:
+            add(filename, UploadedImage(stream, size), size)
+    
+    return items, errors
+
+
+def timed_call(analyze, image, scope=None):
+    """
+    Read image, run analyze(img_bytes) and return (result, elapsed_ms);
+    the thread's CPU and Tesseract passes count towards scope (the batch request)
+    """
+    start = time.perf_counter()
+    with metrics.charge(scope):
+        result = analyze(image.read())
+    return result, (time.perf_counter() - start) * 1000
+
+
+def run_batch(items, analyze, executor=None):
+    """
+    Analyze every item on the worker pool
+    
+    Args:
+        items: list of (filename, image) from collect_batch_items; each
+               image is read on the worker that analyzes it
+        analyze: callable taking image bytes and returning a JSON-able dict
+        executor: thread pool to schedule on (defaults to the shared batch
+                  pool); images are read from the request's upload streams, so
+                  they cannot be sent to a process pool
+    
+    Yields:
+        One dict per item in completion order; failures are reported
+        per item with success=False instead of aborting the batch
+    """
+    executor = executor or get_executor()
+    scope = metrics.current_request()
+    
+    futures = {
+        executor.submit(timed_call, analyze, image, scope): (index, filename)
+        for index, (filename, image) in enumerate(items)
+    }
+    
+    try:
+        for future in as_completed(futures):
+            index, filename = futures[future]
+            try:
+                result, elapsed_ms = future.result()
+                yield {
+                    'index': index,
+                    'filename': filename,
+                    'success': True,
+                    'elapsed_ms': round(elapsed_ms, 1),
+                    'result': result
+                }
+            except Exception as e:
+                yield {
+                    'index': index,
+                    'filename': filename,
+                    'success': False,
+                    'error': str(e)
+                }
+    finally:
+        # Client went away: drop the items that have not started yet
+        for future in futures:
+            future.cancel()
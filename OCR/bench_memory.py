@@ -0,0 +1,115 @@
+"""
+Benchmark: peak memory of the enhanced pipeline, all variants at once vs streamed
+Runs process_food_package in a fresh process per mode and reports the peak
+RSS growth over the warmed-up process, plus the peak of traced (numpy)
+allocations, also in grayscale-image-sized buffers.
+
+- dict: preprocess_for_text_clarity builds all six variants, then every
+  OCR pass runs with all of them alive
+- streaming: iter_preprocessed builds each variant just before its passes
+  and drops it right after (OCR_STREAMING_PREPROCESS, the default)
+
+Both modes also hold the decoded BGR input and accept_image's copy of it
+(three grayscale buffers each). Tesseract runs in its own process, so its
+memory is not part of these figures.
+
+Usage:
+    python bench_memory.py                               # test-14 upscaled to 12 MP
+    python bench_memory.py --megapixels 24 --concurrency 4
+    python bench_memory.py --image test_images/test-1.jpg --megapixels 0   # as-is
+"""
+
+import argparse
+import multiprocessing
+import os
+import threading
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+OCR_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_IMAGE = os.path.join(OCR_DIR, 'test_images', 'test-14.jpeg')
+MODES = ('dict', 'streaming')
+
+
+def rss_mb():
+    """Resident set size of this process in MB"""
+    with open('/proc/self/statm') as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+def load_image(path, megapixels):
+    """The test image, resized to about `megapixels` (0 = as-is)"""
+    import cv2
+    img = cv2.imread(path)
+    if img is None:
+        raise ValueError(f"Could not read {path}")
+    if megapixels:
+        scale = (megapixels * 1e6 / (img.shape[0] * img.shape[1])) ** 0.5
+        img = cv2.resize(img, (round(img.shape[1] * scale), round(img.shape[0] * scale)), interpolation=cv2.INTER_CUBIC)
+    return img
+
+
+def measure(mode, path, megapixels, concurrency):
+    """Worker: run `concurrency` concurrent requests in one mode and report peak memory"""
+    import numpy as np
+    from benchmark import peak_rss_mb
+    from enhanced_ocr_pipeline import FoodPackageOCR
+
+    ocr = FoodPackageOCR(streaming=(mode == 'streaming'))
+    ocr.process_food_package(np.full((64, 64, 3), 255, dtype=np.uint8))  # imports, Tesseract probe
+    img = load_image(path, megapixels)
+
+    baseline_rss = rss_mb()
+    tracemalloc.start()
+    started = time.perf_counter()
+    threads = [threading.Thread(target=ocr.process_food_package, args=(img,)) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    _, traced_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    gray_mb = img.shape[0] * img.shape[1] / (1024 * 1024)
+    peak_rss = peak_rss_mb()
+    return {
+        'mode': mode,
+        'shape': img.shape,
+        'gray_mb': gray_mb,
+        'seconds': elapsed,
+        # ru_maxrss is a high-water mark: only growth beyond the warm baseline is this run's
+        'rss_growth_mb': max(peak_rss - baseline_rss, 0.0) if peak_rss is not None else None,
+        'traced_peak_mb': traced_peak / (1024 * 1024)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Peak memory of dict vs streaming preprocessing')
+    parser.add_argument('--image', default=DEFAULT_IMAGE)
+    parser.add_argument('--megapixels', type=float, default=12, help='Resize the image to this size (0 = as-is)')
+    parser.add_argument('--concurrency', type=int, default=1, help='Concurrent requests per process')
+    parser.add_argument('--modes', default=','.join(MODES))
+    args = parser.parse_args()
+
+    results = []
+    for mode in args.modes.split(','):
+        # A fresh process per mode, so one mode's high-water mark cannot hide the other's
+        with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context('spawn')) as pool:
+            results.append(pool.submit(measure, mode, args.image, args.megapixels, args.concurrency).result())
+
+    shape = results[0]['shape']
+    print(f"\n{shape[1]}x{shape[0]} image ({shape[0] * shape[1] / 1e6:.1f} MP, "
+          f"{results[0]['gray_mb']:.1f} MB per grayscale buffer), {args.concurrency} concurrent request(s)")
+    print(f"{'mode':<12}{'seconds':>10}{'RSS growth MB':>16}{'traced peak MB':>17}{'buffers/request':>18}")
+    print("-" * 73)
+    for r in results:
+        rss = f"{r['rss_growth_mb']:.1f}" if r['rss_growth_mb'] is not None else '-'
+        buffers = r['traced_peak_mb'] / r['gray_mb'] / args.concurrency
+        print(f"{r['mode']:<12}{r['seconds']:>10.2f}{rss:>16}{r['traced_peak_mb']:>17.1f}{buffers:>18.1f}")
+
+
+if __name__ == '__main__':
+    main()
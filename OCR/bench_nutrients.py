@@ -0,0 +1,135 @@
+"""
+Micro-benchmark: nutrient extraction on long OCR texts
+Compares the single-pass nutrient_rules scanner with the per-nutrient
+re.search loops the parsers used before (kept here as the baseline): the
+enhanced pipeline's, which lowercased the whole text again per nutrient,
+and parse_with_validation's.
+
+Texts are a nutrition panel buried in OCR noise (the other label text,
+misread lines) at growing sizes, with the panel near the end - where a
+real back-of-pack OCR dump tends to put it.
+
+Usage:
+    python bench_nutrients.py
+    python bench_nutrients.py --sizes 2,20,200 --repeat 200
+"""
+
+import argparse
+import random
+import re
+import time
+
+from nutrient_rules import NutrientScanner
+
+PANEL = """NUTRITION INFORMATION (Approx) per 100 g
+Energy 1046 kJ / 250 kcal
+Protein 5.2 g
+Carbohydrate 52.6 g
+Total Sugars 15 g
+Added Sugars 10 g
+Total Fat 12.5 g
+Saturated Fat 6 g
+Trans Fat 0.1 g
+Sodium 400 mg
+Dietary Fibre 3 g
+"""
+
+NOISE_WORDS = (
+    'ingredients', 'wheat', 'flour', 'palmolein', 'oil', 'iodised', 'salt', 'best', 'before', 'months',
+    'packed', 'by', 'mrp', 'rs', 'incl', 'of', 'all', 'taxes', 'fssai', 'lic', 'no', 'store', 'in', 'a',
+    'cool', 'dry', 'place', 'net', 'qty', 'batch', 'customer', 'care', 'www', 'com', '|', '~', '=>'
+)
+
+# ==================== baselines ====================
+ENHANCED_PATTERNS = {
+    'energy': r'(?:energy|calories?)\s*[:=]?\s*(\d+\.?\d*)\s*(kcal|kj|cal)',
+    'protein': r'protein\s*[:=]?\s*(\d+\.?\d*)\s*g',
+    'carbohydrate': r'carbohydrate\s*[:=]?\s*(\d+\.?\d*)\s*g',
+    'fat': r'(?:total\s+)?fat\s*[:=]?\s*(\d+\.?\d*)\s*g',
+    'sodium': r'sodium\s*[:=]?\s*(\d+\.?\d*)\s*(mg|g)',
+    'sugar': r'sugar\s*[:=]?\s*(\d+\.?\d*)\s*g',
+    'fiber': r'fiber\s*[:=]?\s*(\d+\.?\d*)\s*g',
+}
+
+VALIDATION_PATTERNS = {
+    'energy_kcal': r'(?:energy|ener)\b[^\d\n]{0,12}([0-9][0-9,\.]{0,6})\s*(kcal|cal)?',
+    'protein_g': r'(?:protein|prt)\b[^\d\n]{0,12}([0-9][0-9,\.]{0,6})\s*(g)?',
+    'carbohydrate_g': r'carbohydrate\b[^\d\n]{0,12}([0-9][0-9,\.]{0,6})\s*(g)?',
+    'total_fat_g': r'(?:total\s+fat|totalfat|fat\s*total)\b[^\d\n]{0,12}([0-9][0-9,\.]{0,6})\s*(g)?',
+    'saturated_fat_g': r'saturated\b[^a-z]{0,5}fat\b[^\d\n]{0,12}([0-9][0-9,\.]{0,6})\s*(g)?',
+    'trans_fat_g': r'trans\b[^a-z]{0,5}fat\b[^\d\n]{0,12}([0-9][0-9,\.]{0,6})\s*(g)?',
+    'sodium_mg': r'sodium\b[^\d\n]{0,12}([0-9][0-9,\.]{0,8})\s*(mg|g)?',
+    'added_sugar_g': r'added\s*sugar[s]?\b[^\d\n]{0,12}([0-9][0-9,\.]{0,6})\s*(g)?',
+    'total_sugar_g': r'total\s*sugar[s]?\b[^\d\n]{0,12}([0-9][0-9,\.]{0,6})\s*(g)?'
+}
+
+
+def legacy_enhanced(text):
+    found = {}
+    for nutrient, pattern in ENHANCED_PATTERNS.items():
+        matches = re.findall(pattern, text.lower(), re.IGNORECASE)
+        if matches:
+            found[nutrient] = matches[0]
+    return found
+
+
+def legacy_validation(text):
+    text = text.lower()
+    found = {}
+    for key, pattern in VALIDATION_PATTERNS.items():
+        match = re.search(pattern, text, flags=re.IGNORECASE)
+        if match:
+            found[key] = match.group(1)
+    return found
+
+
+def make_text(kilobytes, seed=0):
+    """About `kilobytes` of OCR noise with the nutrition panel near the end"""
+    rng = random.Random(seed)
+    words = []
+    size = 0
+    target = max(kilobytes * 1024 - len(PANEL), 0)
+    while size < target:
+        word = rng.choice(NOISE_WORDS)
+        if rng.random() < 0.1:
+            word += '\n'
+        words.append(word)
+        size += len(word) + 1
+    cut = int(len(words) * 0.9)
+    return ' '.join(words[:cut]) + '\n' + PANEL + ' '.join(words[cut:])
+
+
+def time_per_call(fn, text, repeat):
+    fn(text)
+    started = time.perf_counter()
+    for _ in range(repeat):
+        fn(text)
+    return (time.perf_counter() - started) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Nutrient extraction: single-pass scanner vs per-nutrient regexes')
+    parser.add_argument('--sizes', default='1,10,100', help='Text sizes in KB')
+    parser.add_argument('--repeat', type=int, default=100)
+    args = parser.parse_args()
+
+    scanner = NutrientScanner()
+    contenders = (
+        ('enhanced (7 x lower+findall)', legacy_enhanced),
+        ('validation (9 x search)', legacy_validation),
+        ('nutrient_rules scanner', scanner.scan),
+    )
+
+    print(f"{'text':>8}  {'parser':<30}{'us/call':>12}{'found':>8}")
+    print("-" * 60)
+    for kilobytes in (int(s) for s in args.sizes.split(',')):
+        text = make_text(kilobytes)
+        repeat = max(1, args.repeat // kilobytes)
+        for name, fn in contenders:
+            seconds = time_per_call(fn, text, repeat)
+            print(f"{kilobytes:>6}KB  {name:<30}{seconds * 1e6:>12.1f}{len(fn(text)):>8}")
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,174 @@
+"""
+Benchmark: how long the OCR modules take to import and the servers to come up
+Two measurements, each in fresh processes so nothing is already cached:
+
+- import: wall time of `import <module>` per module (best of --repeat), plus
+  the heaviest imports underneath it from `python -X importtime`
+- serve: per server, the time from launch to the first healthy /metrics
+  answer, then the latency of the first OCR request sent right after
+
+NLTK's word list, Gemini model discovery and (in test_ocr_simple) the OCR
+stack load on first use or on a background warmup thread, so they no
+longer count towards time-to-healthy. The first-scan column shows what a
+request arriving right at startup still pays.
+
+Usage:
+    python bench_startup.py
+    python bench_startup.py --servers flask,asgi --repeat 5 --output startup.json
+    python bench_startup.py --modules vocab,test_ocr_simple --skip-servers
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+from load_test import OCR_DIR, SERVERS, is_ok, multipart_body, send, start_server, stop_server
+
+MODULES = ('vocab', 'OCR', 'enhanced_ocr_pipeline', 'api_server', 'test_ocr_simple', 'asgi_server')
+DEFAULT_IMAGE = os.path.join(OCR_DIR, 'test_images', 'test-3.jpg')
+
+
+# ==================== imports ====================
+def import_seconds(module):
+    """Wall time of importing `module` in a fresh interpreter"""
+    code = (
+        'import time; started = time.perf_counter(); '
+        f'import {module}; '
+        'print(time.perf_counter() - started)'
+    )
+    proc = subprocess.run([sys.executable, '-c', code], cwd=OCR_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed: {proc.stderr.strip().splitlines()[-1:]}")
+    return float(proc.stdout.strip().splitlines()[-1])
+
+
+def import_log(code):
+    """(package, cumulative seconds) for the top-level imports `python -X importtime -c code` reports"""
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                          cwd=OCR_DIR, capture_output=True, text=True)
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Top-level packages only: their cumulative time already covers submodules
+        name = name.rstrip()
+        if '.' in name.strip():
+            continue
+        entries.append((name.strip(), int(cumulative) / 1e6))
+    return entries
+
+
+def heaviest_imports(module, top):
+    """The `top` packages with the largest cumulative import time under `module`"""
+    # Whatever the interpreter imports at startup (site, sitecustomize) is not the module's cost
+    startup = {name for name, _ in import_log('pass')}
+    entries = [e for e in import_log(f'import {module}') if e[0] != module and e[0] not in startup]
+    return sorted(entries, key=lambda e: e[1], reverse=True)[:top]
+
+
+def bench_imports(modules, repeat, top):
+    results = []
+    for module in modules:
+        try:
+            seconds = min(import_seconds(module) for _ in range(repeat))
+        except RuntimeError as e:
+            print(f"  {e}")
+            continue
+        results.append({
+            'module': module,
+            'import_seconds': round(seconds, 3),
+            'heaviest': [{'package': name, 'seconds': round(s, 3)} for name, s in heaviest_imports(module, top)]
+        })
+    return results
+
+
+# ==================== servers ====================
+def bench_server(name, port, image, timeout):
+    """Seconds from launch to a healthy /metrics, then the first OCR request's latency"""
+    base_url = f'http://localhost:{port}'
+    started = time.perf_counter()
+    proc = start_server(name, port)
+    try:
+        ready = None
+        while time.perf_counter() - started < timeout:
+            _, _, status = send(base_url, ('/metrics', 'GET', '/metrics', None, None), timeout=2)
+            if is_ok(status):
+                ready = time.perf_counter() - started
+                break
+            if proc.poll() is not None:
+                break
+            time.sleep(0.05)
+        if ready is None:
+            return {'server': name, 'ready_seconds': None, 'first_scan_seconds': None, 'first_scan_status': None}
+
+        with open(image, 'rb') as f:
+            body, content_type = multipart_body([('image', os.path.basename(image), f.read())])
+        path = SERVERS[name]['scan']
+        _, latency, status = send(base_url, (path, 'POST', path, body, content_type))
+        return {
+            'server': name,
+            'ready_seconds': round(ready, 3),
+            'first_scan_seconds': round(latency, 3),
+            'first_scan_status': status
+        }
+    finally:
+        stop_server(proc)
+
+
+# ==================== report ====================
+def print_report(report):
+    if report['imports']:
+        print(f"\n{'module':<24}{'import s':>10}  heaviest imports")
+        print("-" * 78)
+        for r in report['imports']:
+            heaviest = ', '.join(f"{h['package']} {h['seconds']:.2f}" for h in r['heaviest'])
+            print(f"{r['module']:<24}{r['import_seconds']:>10.3f}  {heaviest}")
+    if report['servers']:
+        print(f"\n{'server':<12}{'ready s':>10}{'first scan s':>15}{'status':>10}")
+        print("-" * 47)
+        for r in report['servers']:
+            ready = f"{r['ready_seconds']:.2f}" if r['ready_seconds'] is not None else 'failed'
+            scan = f"{r['first_scan_seconds']:.2f}" if r['first_scan_seconds'] is not None else '-'
+            print(f"{r['server']:<12}{ready:>10}{scan:>15}{str(r['first_scan_status'] or '-'):>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Import time and time-to-healthy of the OCR servers')
+    parser.add_argument('--modules', default=','.join(MODULES))
+    parser.add_argument('--servers', default='flask,api,asgi', help=f"Comma-separated: {', '.join(SERVERS)}")
+    parser.add_argument('--repeat', type=int, default=3, help='Imports per module; the fastest counts')
+    parser.add_argument('--top', type=int, default=3, help='Heaviest imports listed per module')
+    parser.add_argument('--image', default=DEFAULT_IMAGE, help='Image for the first OCR request')
+    parser.add_argument('--timeout', type=float, default=120)
+    parser.add_argument('--skip-imports', action='store_true')
+    parser.add_argument('--skip-servers', action='store_true')
+    parser.add_argument('--output', help='Write the report as JSON')
+    args = parser.parse_args()
+
+    servers = [s for s in args.servers.split(',') if s]
+    unknown = [s for s in servers if s not in SERVERS]
+    if unknown:
+        parser.error(f"Unknown server(s): {', '.join(unknown)}")
+
+    report = {'python': sys.version.split()[0], 'imports': [], 'servers': []}
+    if not args.skip_imports:
+        print(f"Timing imports ({args.repeat} fresh interpreters per module)...")
+        report['imports'] = bench_imports([m for m in args.modules.split(',') if m], args.repeat, args.top)
+    if not args.skip_servers:
+        for name in servers:
+            print(f"Starting {name}...")
+            report['servers'].append(bench_server(name, SERVERS[name]['port'], args.image, args.timeout))
+
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nReport written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
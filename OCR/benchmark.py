@@ -0,0 +1,425 @@
+"""
+Image-level benchmark over test_images with golden results
+Runs every test image through one pipeline and reports, per image and in
+total: latency per stage (from the request trace), Tesseract passes, peak
+RSS and field-level accuracy against the golden <image>_result.json files
+(nutrients, ingredients, allergens, serving size, FSSAI number).
+
+A run can be saved as a baseline and later runs compared against it, so a
+speed change that costs extraction quality fails loudly (exit status 1).
+
+Usage:
+    python benchmark.py                                  # analyze pipeline, all images
+    python benchmark.py --pipeline generic --repeat 3
+    python benchmark.py --save-baseline bench_baseline.json
+    python benchmark.py --baseline bench_baseline.json --max-slowdown 1.2
+    python benchmark.py --isolate                        # one process per image: true per-image peak RSS
+    python benchmark.py --profile fast                   # a pipeline profile (see pipeline_profiles.py)
+    python benchmark.py --write-golden                   # draft goldens for images without one (review them!)
+
+Golden files follow the existing test-N_result.json layout; an optional
+"fssai" key holds the expected license number (null = none on the label).
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+OCR_DIR = os.path.dirname(os.path.abspath(__file__))
+IMAGES_DIR = os.path.join(OCR_DIR, 'test_images')
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+GOLDEN_SUFFIX = '_result.json'
+
+# Nutrient name spellings across the pipelines and goldens -> one canonical key
+NUTRIENT_ALIASES = {
+    'calories': 'energy',
+    'carbohydrates': 'carbohydrate',
+    'total_carbohydrate': 'carbohydrate',
+    'dietary_fiber': 'fiber',
+    'dietary_fibre': 'fiber',
+    'fibre': 'fiber',
+    'total_fat': 'fat',
+    'sugars': 'sugar',
+    'total_sugar': 'sugar',
+    'total_sugars': 'sugar',
+    'salt': 'sodium',
+}
+UNIT_SUFFIX = re.compile(r'_(?:g|mg|mcg|kcal|kj)$')
+NUMBER = re.compile(r'\d+(?:\.\d+)?')
+VALUE_TOLERANCE = 0.01  # relative
+
+EXACT_FIELDS = ('serving_size', 'fssai')
+
+
+# ==================== pipelines ====================
+# Both run under OCR_DEFAULT_PROFILE when set (--profile), like a request without ?profile=
+def run_analyze(img_bytes):
+    """api_server /api/ocr/analyze: enhanced pipeline + FSSAI + scoring"""
+    import api_server
+    from pipeline_profiles import get_profile
+    result = api_server.build_analysis(api_server.decode_image(img_bytes), get_profile(None))
+    return {**result, 'fssai': (result.get('fssai') or {}).get('number')}
+
+
+def run_generic(img_bytes):
+    """test_ocr_simple /api/analyze/generic"""
+    import test_ocr_simple
+    from pipeline_profiles import get_profile
+    payload, _ = test_ocr_simple.analyze_image_bytes(img_bytes, get_profile(None))
+    result = payload.get('ocrData') or {}
+    return {**result, 'fssai': (payload.get('fssai') or {}).get('number')}
+
+
+PIPELINES = {
+    'analyze': run_analyze,
+    'generic': run_generic,
+}
+
+
+def warmup(pipeline):
+    import api_server
+    import test_ocr_simple
+    (test_ocr_simple if pipeline == 'generic' else api_server).warmup()
+
+
+def peak_rss_mb():
+    """High-water RSS of this process in MB (None where resource is unavailable)"""
+    try:
+        import resource
+    except ImportError:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def measure(pipeline, path, repeat):
+    """Run one image `repeat` times; latency figures are medians, output is from the last run"""
+    import metrics
+    import tracing
+
+    with open(path, 'rb') as f:
+        img_bytes = f.read()
+
+    totals, cpu, stage_runs = [], [], []
+    for _ in range(repeat):
+        trace = tracing.start_trace('benchmark', image=os.path.basename(path))
+        cpu_started = time.thread_time()
+        try:
+            with metrics.request_scope('benchmark') as scope:
+                output = PIPELINES[pipeline](img_bytes)
+        finally:
+            tracing.finish_trace(trace, export=False)
+        cpu.append((time.thread_time() - cpu_started) * 1000)
+        totals.append(trace.root.duration_ms)
+        stage_runs.append(stage_totals(trace))
+
+    stages = {
+        name: round(statistics.median(run.get(name, 0.0) for run in stage_runs), 2)
+        for name in stage_runs[-1]
+    }
+    return {
+        'image': os.path.basename(path),
+        'total_ms': round(statistics.median(totals), 2),
+        'cpu_ms': round(statistics.median(cpu), 2),
+        'stages_ms': stages,
+        'tesseract_passes': scope.tesseract_passes,
+        'ocr_variant': trace.find_attribute('ocr_variant'),
+        'peak_rss_mb': peak_rss_mb(),
+        'output': output
+    }
+
+
+def stage_totals(trace):
+    """Span time summed per stage (first name component), like the Server-Timing header"""
+    stages = {}
+    for entry in trace.summary():
+        name = entry['name'].split('.', 1)[0]
+        stages[name] = stages.get(name, 0.0) + entry['duration_ms']
+    return stages
+
+
+def measure_isolated(args):
+    """Pool entry point for --isolate: fresh process per image"""
+    pipeline, path, repeat = args
+    warmup(pipeline)
+    return measure(pipeline, path, repeat)
+
+
+# ==================== accuracy ====================
+def normalize_text(value):
+    return re.sub(r'\s+', ' ', re.sub(r'[^a-z0-9() ]', ' ', str(value).lower())).strip()
+
+
+def nutrient_key(name):
+    key = UNIT_SUFFIX.sub('', normalize_text(name).replace(' ', '_'))
+    return NUTRIENT_ALIASES.get(key, key)
+
+
+def nutrient_value(value):
+    match = NUMBER.search(str(value)) if value is not None else None
+    return float(match.group()) if match else None
+
+
+def nutrient_pairs(facts):
+    pairs = {}
+    for name, value in (facts or {}).items():
+        number = nutrient_value(value)
+        if number is not None:
+            pairs[nutrient_key(name)] = number
+    return pairs
+
+
+def fssai_number(value):
+    if isinstance(value, dict):
+        value = value.get('number')
+    return str(value) if value else None
+
+
+def field_counts(predicted, golden):
+    """{field: [true positives, false positives, false negatives]} for one image"""
+    counts = {}
+
+    got, want = nutrient_pairs(predicted.get('nutrition_facts')), nutrient_pairs(golden.get('nutrition_facts'))
+    matched = sum(
+        1 for key, value in want.items()
+        if key in got and abs(got[key] - value) <= VALUE_TOLERANCE * max(abs(value), 1)
+    )
+    counts['nutrients'] = [matched, len(got) - matched, len(want) - matched]
+
+    for field in ('ingredients', 'allergens'):
+        got = {normalize_text(item) for item in predicted.get(field) or []}
+        want = {normalize_text(item) for item in golden.get(field) or []}
+        counts[field] = [len(got & want), len(got - want), len(want - got)]
+
+    if 'serving_size' in golden:
+        want = golden['serving_size']
+        correct = (normalize_text(predicted.get('serving_size') or '') == normalize_text(want or ''))
+        counts['serving_size'] = [int(correct), int(not correct), 0]
+    if 'fssai' in golden:
+        correct = fssai_number(predicted.get('fssai')) == fssai_number(golden['fssai'])
+        counts['fssai'] = [int(correct), int(not correct), 0]
+    return counts
+
+
+def field_score(field, tp, fp, fn):
+    """F1 for list fields (empty vs empty is perfect), plain accuracy for exact fields"""
+    if field in EXACT_FIELDS:
+        return round(tp / (tp + fp), 4) if tp + fp else 1.0
+    if tp == fp == fn == 0:
+        return 1.0
+    return round(2 * tp / (2 * tp + fp + fn), 4)
+
+
+def load_golden(path):
+    golden_path = os.path.splitext(path)[0] + GOLDEN_SUFFIX
+    if not os.path.exists(golden_path):
+        return None
+    with open(golden_path) as f:
+        return json.load(f)
+
+
+def write_golden(path, output):
+    golden_path = os.path.splitext(path)[0] + GOLDEN_SUFFIX
+    golden = {
+        'raw_text': output.get('raw_text', ''),
+        'nutrition_facts': output.get('nutrition_facts', {}),
+        'ingredients': output.get('ingredients', []),
+        'allergens': output.get('allergens', []),
+        'serving_size': output.get('serving_size'),
+        'fssai': fssai_number(output.get('fssai'))
+    }
+    with open(golden_path, 'w') as f:
+        json.dump(golden, f, indent=2)
+    return golden_path
+
+
+# ==================== run / compare ====================
+def run(pipeline, images, repeat, isolate):
+    jobs = [(pipeline, path, repeat) for path in images]
+    if isolate:
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(max_workers=1, mp_context=context, max_tasks_per_child=1) as pool:
+            return list(pool.map(measure_isolated, jobs))
+    warmup(pipeline)
+    return [measure(*job) for job in jobs]
+
+
+def score(results, images):
+    """Attach per-image scores and return micro-averaged scores per field"""
+    totals = {}
+    for result, path in zip(results, images):
+        golden = load_golden(path)
+        if golden is None:
+            result['accuracy'] = None
+            continue
+        counts = field_counts(result['output'], golden)
+        result['accuracy'] = {field: field_score(field, *c) for field, c in counts.items()}
+        for field, c in counts.items():
+            total = totals.setdefault(field, [0, 0, 0])
+            for i in range(3):
+                total[i] += c[i]
+    return {field: field_score(field, *c) for field, c in totals.items()}
+
+
+def summarize(pipeline, results, accuracy):
+    stage_names = sorted({name for r in results for name in r['stages_ms']})
+    rss = [r['peak_rss_mb'] for r in results if r['peak_rss_mb'] is not None]
+    return {
+        'pipeline': pipeline,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'images': len(results),
+        'golden_images': sum(1 for r in results if r['accuracy'] is not None),
+        'total_ms': round(sum(r['total_ms'] for r in results), 1),
+        'median_ms': round(statistics.median(r['total_ms'] for r in results), 1),
+        'cpu_ms': round(sum(r['cpu_ms'] for r in results), 1),
+        'stages_ms': {name: round(sum(r['stages_ms'].get(name, 0.0) for r in results), 1) for name in stage_names},
+        'tesseract_passes': sum(r['tesseract_passes'] for r in results),
+        'peak_rss_mb': round(max(rss), 1) if rss else None,
+        'accuracy': accuracy,
+        'per_image': [{key: value for key, value in r.items() if key != 'output'} for r in results]
+    }
+
+
+def compare(report, baseline, max_accuracy_drop, max_slowdown):
+    """Print deltas against a baseline report; returns the list of regressions"""
+    regressions = []
+    print("\n" + "=" * 78)
+    print(f"COMPARED WITH BASELINE ({baseline.get('created_at', '?')}, pipeline {baseline.get('pipeline')})")
+    print("=" * 78)
+
+    before_names = {r['image'] for r in baseline.get('per_image', [])}
+    after_names = {r['image'] for r in report['per_image']}
+    if before_names != after_names:
+        print(f"  WARNING: image sets differ ({len(before_names)} in baseline, {len(after_names)} now); totals are not comparable")
+
+    ratio = report['total_ms'] / baseline['total_ms'] if baseline.get('total_ms') else None
+    if ratio is not None:
+        print(f"  total time             {baseline['total_ms']:>10.1f} -> {report['total_ms']:>10.1f} ms  ({ratio:.2f}x)")
+        if max_slowdown and ratio > max_slowdown:
+            regressions.append(f"total time {ratio:.2f}x baseline (limit {max_slowdown}x)")
+    print(f"  tesseract passes       {baseline['tesseract_passes']:>10} -> {report['tesseract_passes']:>10}")
+    if baseline.get('peak_rss_mb') and report.get('peak_rss_mb'):
+        print(f"  peak RSS               {baseline['peak_rss_mb']:>10.1f} -> {report['peak_rss_mb']:>10.1f} MB")
+    for name in sorted(set(baseline.get('stages_ms', {})) | set(report['stages_ms'])):
+        before, after = baseline.get('stages_ms', {}).get(name, 0.0), report['stages_ms'].get(name, 0.0)
+        print(f"  {name:<22} {before:>10.1f} -> {after:>10.1f} ms")
+
+    for field, before in baseline.get('accuracy', {}).items():
+        after = report['accuracy'].get(field)
+        marker = ''
+        if after is None or before - after > max_accuracy_drop:
+            marker = '  <-- REGRESSION'
+            regressions.append(f"{field} score {before} -> {after}")
+        print(f"  {field:<22} {before:>10.4f} -> {after if after is not None else float('nan'):>10.4f}{marker}")
+
+    before_images = {r['image']: r for r in baseline.get('per_image', [])}
+    for r in report['per_image']:
+        old = before_images.get(r['image'])
+        if not old or not old.get('accuracy') or not r.get('accuracy'):
+            continue
+        for field, before in old['accuracy'].items():
+            after = r['accuracy'].get(field)
+            if after is not None and before - after > max_accuracy_drop:
+                print(f"  {r['image']}: {field} {before} -> {after}")
+    return regressions
+
+
+def print_report(report):
+    print("\n" + "=" * 78)
+    print(f"OCR BENCHMARK - pipeline {report['pipeline']}, {report['images']} images "
+          f"({report['golden_images']} with golden results)")
+    print("=" * 78)
+    print(f"{'image':<16}{'total ms':>10}{'cpu ms':>10}{'passes':>8}{'RSS MB':>9}  "
+          f"{'nutr':>5}{'ingr':>6}{'allg':>6}{'fssai':>7}")
+    print("-" * 78)
+    for r in report['per_image']:
+        acc = r['accuracy'] or {}
+
+        def cell(field, width):
+            value = acc.get(field)
+            return f"{'-' if value is None else f'{value:.2f}':>{width}}"
+
+        rss = f"{r['peak_rss_mb']:.0f}" if r['peak_rss_mb'] is not None else '-'
+        print(f"{r['image']:<16}{r['total_ms']:>10.1f}{r['cpu_ms']:>10.1f}{r['tesseract_passes']:>8}{rss:>9}  "
+              f"{cell('nutrients', 5)}{cell('ingredients', 6)}{cell('allergens', 6)}{cell('fssai', 7)}")
+    print("-" * 78)
+    print(f"Total {report['total_ms']:.1f} ms (median {report['median_ms']:.1f} ms/image), "
+          f"CPU {report['cpu_ms']:.1f} ms, {report['tesseract_passes']} Tesseract passes, "
+          f"peak RSS {report['peak_rss_mb']} MB")
+    print("Stage totals: " + ', '.join(f"{name} {ms:.1f} ms" for name, ms in report['stages_ms'].items()))
+    print("Accuracy (micro F1 / exact-match rate): " + (', '.join(f"{field} {value:.3f}" for field, value in report['accuracy'].items()) or 'no golden results'))
+
+
+def list_images(names):
+    images = sorted(
+        (os.path.join(IMAGES_DIR, name) for name in os.listdir(IMAGES_DIR) if name.lower().endswith(IMAGE_EXTENSIONS)),
+        key=lambda path: [int(part) if part.isdigit() else part for part in re.split(r'(\d+)', os.path.basename(path))]
+    )
+    if names:
+        images = [path for path in images if os.path.basename(path) in names or os.path.splitext(os.path.basename(path))[0] in names]
+    return images
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the OCR pipeline over test_images against golden results')
+    parser.add_argument('images', nargs='*', help='Image names (default: all of test_images)')
+    parser.add_argument('--pipeline', choices=sorted(PIPELINES), default='analyze')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per image; latencies are medians')
+    parser.add_argument('--isolate', action='store_true', help='Run each image in a fresh process (per-image peak RSS)')
+    parser.add_argument('--json', dest='json_path', help='Write the full report here')
+    parser.add_argument('--save-baseline', help='Save this run as the baseline')
+    parser.add_argument('--baseline', help='Compare against a saved baseline')
+    parser.add_argument('--max-accuracy-drop', type=float, default=0.0, help='Allowed score drop per field vs baseline')
+    parser.add_argument('--max-slowdown', type=float, default=None, help='Allowed total-time ratio vs baseline')
+    parser.add_argument('--write-golden', action='store_true', help='Write draft goldens for images that have none')
+    parser.add_argument('--profile', help='Run under this pipeline profile (fast, balanced, accurate, ...)')
+    args = parser.parse_args()
+
+    if args.profile:
+        # Read when pipeline_profiles is first imported, here and in --isolate workers
+        os.environ['OCR_DEFAULT_PROFILE'] = args.profile
+        from pipeline_profiles import get_profile
+        try:
+            get_profile(args.profile)
+        except ValueError as e:
+            print(e)
+            return 1
+
+    images = list_images(args.images)
+    if not images:
+        print(f"No test images found in {IMAGES_DIR}")
+        return 1
+
+    results = run(args.pipeline, images, args.repeat, args.isolate)
+    if args.write_golden:
+        for result, path in zip(results, images):
+            if load_golden(path) is None:
+                print(f"Draft golden written: {write_golden(path, result['output'])}")
+
+    report = summarize(args.pipeline, results, score(results, images))
+    report['profile'] = args.profile
+    print_report(report)
+
+    for path in filter(None, (args.json_path, args.save_baseline)):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Report written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(report, json.load(f), args.max_accuracy_drop, args.max_slowdown)
+        if regressions:
+            print("\nREGRESSIONS:\n  " + "\n  ".join(regressions))
+            return 1
+        print("\nNo regressions against baseline")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
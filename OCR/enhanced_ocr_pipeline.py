@@ -6,6 +6,7 @@ Implements 3-step process:
 3. OCR Extraction with NLP Post-processing
 """
 
+import os
 import cv2
 import numpy as np
 import pytesseract
@@ -13,14 +14,88 @@ from pytesseract import Output
 import re
 from typing import Dict, List, Tuple
 import string
+from metrics import stage, tesseract_pass, timed_stage
+from tracing import annotate
+from vocab import english_vocab
+from nutrient_rules import NutrientScanner, format_amount
+from keyword_matcher import KEYWORDS, MATCHER
+from table_parser import read_table
+from nutrient_solver import solve, solve_printed
 
-try:
-    import nltk
-    from nltk.corpus import words as nltk_words
-    # nltk.download('words', quiet=True)
-    ENGLISH_VOCAB = set(w.lower() for w in nltk_words.words())
-except:
-    ENGLISH_VOCAB = set()
+
+# Structured outputs a caller can ask process_food_package() for
+OUTPUTS = ('raw_text', 'nutrition_facts', 'serving_size', 'ingredients', 'allergens')
+
+# Preprocessing variants and Tesseract PSM modes each output actually needs.
+# Tables read best as a uniform block / single column on binarised images;
+# the ingredients paragraph as a block or with automatic segmentation.
+# None of them needs the slow non-local-means 'denoised' variant.
+STAGE_PLANS = {
+    'nutrition_facts': (('contrast_enhanced', 'adaptive_thresh', 'otsu'), ('--psm 6', '--psm 4')),
+    'serving_size': (('contrast_enhanced', 'otsu'), ('--psm 6',)),
+    'ingredients': (('contrast_enhanced', 'sharpened', 'otsu'), ('--psm 6', '--psm 3')),
+    'allergens': (('contrast_enhanced', 'sharpened'), ('--psm 6', '--psm 3')),
+}
+
+# Build, OCR and release the preprocessing variants one at a time instead of
+# holding all six full-size images through every pass (see iter_preprocessed)
+STREAMING_PREPROCESS = os.getenv('OCR_STREAMING_PREPROCESS', '1') == '1'
+
+# Read nutrition_facts from word boxes (table_parser). For outputs=nutrition_facts the
+# table is read before the text passes, and when it yields at least TABLE_MIN_NUTRIENTS
+# values the nutrition text passes are skipped; everywhere else it is read only when the
+# text's nutrients fail the solver's checks (see finish)
+TABLE_PARSER = os.getenv('OCR_TABLE_PARSER', '1') == '1'
+TABLE_MIN_NUTRIENTS = int(os.getenv('OCR_TABLE_MIN_NUTRIENTS', '3'))
+TABLE_CONFIG = '--psm 6'
+# When no decimal placement of the table's values is consistent, its region alone
+# is OCRed again at this scale
+TABLE_REOCR_SCALE = float(os.getenv('OCR_TABLE_REOCR_SCALE', '2'))
+
+NUTRITION_OUTPUTS = ('nutrition_facts', 'serving_size')
+INGREDIENT_OUTPUTS = ('ingredients', 'allergens')
+
+PREPROCESS_METHODS = (
+    'contrast_enhanced', 'sharpened', 'adaptive_thresh', 'otsu', 'morphological', 'denoised'
+)
+PSM_CONFIGS = (
+    '--psm 6',  # Assume uniform block of text
+    '--psm 4',  # Assume single column of text
+    '--psm 3',  # Fully automatic page segmentation
+)
+
+# nutrient_rules name -> nutrition_facts key; values are reported as printed ("250 kcal")
+NUTRITION_KEYS = {
+    'energy': 'energy',
+    'protein': 'protein',
+    'carbohydrate': 'carbohydrate',
+    'total_fat': 'fat',
+    'sodium': 'sodium',
+    'total_sugar': 'sugar',
+    'fiber': 'fiber',
+}
+NUTRITION_SCANNER = NutrientScanner(NUTRITION_KEYS, require_unit=True, normalize=False)
+# Reported with their unit ("250 kcal", "120 mg"); the gram nutrients are bare numbers ("7.1")
+UNIT_NUTRIENTS = frozenset({'energy', 'sodium'})
+# Table cells often carry no unit (it is in the label or header): normalized to the canonical unit
+TABLE_SCANNER = NutrientScanner(NUTRITION_KEYS)
+
+
+def nutrition_fact(nutrient, value, unit):
+    """nutrition_facts value in the API's format"""
+    return f"{format_amount(value)} {unit}" if nutrient in UNIT_NUTRIENTS else format_amount(value)
+
+
+def parse_outputs(value, default):
+    """
+    Parse an 'outputs' request parameter ("nutrition_facts,serving_size")
+    Returns default when empty; raises ValueError on unknown names.
+    """
+    outputs = tuple(o.strip() for o in (value or '').split(',') if o.strip())
+    unknown = [o for o in outputs if o not in OUTPUTS]
+    if unknown:
+        raise ValueError(f"Unknown outputs: {', '.join(unknown)} (valid: {', '.join(OUTPUTS)})")
+    return outputs or default
 
 
 class FoodPackageOCR:
@@ -28,18 +103,14 @@ class FoodPackageOCR:
     Complete OCR pipeline for food package analysis
     """
     
-    def __init__(self):
-        self.nutrition_keywords = [
-            'energy', 'protein', 'carbohydrate', 'fat', 'sodium', 'sugar',
-            'fiber', 'calcium', 'iron', 'vitamin', 'calories', 'kcal', 'kj',
-            'serving', 'cholesterol', 'saturated', 'trans', 'dietary'
-        ]
-        self.ingredient_keywords = [
-            'ingredients', 'contains', 'allergen', 'may contain'
-        ]
+    def __init__(self, streaming=STREAMING_PREPROCESS):
+        # process_food_package: stream the variants (bounded memory) or build them all first
+        self.streaming = streaming
+        self.nutrition_keywords = list(KEYWORDS['nutrition'])
+        self.ingredient_keywords = list(KEYWORDS['ingredient'])
         
     # ==================== STEP 1: IMAGE INTAKE ====================
-    def accept_image(self, image_input) -> np.ndarray:
+    def accept_image(self, image_input, copy=True) -> np.ndarray:
         """
         Step 1: Accept image as-is
         - No assumptions about brand, format, orientation
@@ -48,6 +119,8 @@ class FoodPackageOCR:
         
         Args:
             image_input: Can be file path, numpy array, or PIL Image
+            copy: Copy a numpy array input (callers that never write to the
+                image can skip the extra full-size buffer)
             
         Returns:
             np.ndarray: Standardized image array
@@ -55,7 +128,7 @@ class FoodPackageOCR:
         if isinstance(image_input, str):
             img = cv2.imread(image_input)
         elif isinstance(image_input, np.ndarray):
-            img = image_input.copy()
+            img = image_input.copy() if copy else image_input
         else:
             # Assume PIL Image
             img = np.array(image_input)
@@ -67,7 +140,7 @@ class FoodPackageOCR:
         return img
     
     # ==================== STEP 2: IMAGE UNDERSTANDING ====================
-    def preprocess_for_text_clarity(self, img: np.ndarray) -> Dict[str, np.ndarray]:
+    def preprocess_for_text_clarity(self, img: np.ndarray, methods=None, denoise='full') -> Dict[str, np.ndarray]:
         """
         Step 2: Image Understanding - Maximize text clarity before OCR
         
@@ -77,104 +150,237 @@ class FoodPackageOCR:
         - Ignore logos & pictures
         - Focus on dense text blocks (tables, paragraphs)
         
+        Args:
+            methods: Only build these variants (default: all of PREPROCESS_METHODS)
+            denoise: 'full' (non-local means) or 'fast' (median blur) for the
+                'denoised' variant, see pipeline_profiles.DENOISE_TIERS
+        
         Returns:
             Dict of preprocessed images with different techniques
         """
-        preprocessed = {}
+        return dict(self.iter_preprocessed(img, methods, denoise))
+    
+    def iter_preprocessed(self, img: np.ndarray, methods=None, denoise='full'):
+        """
+        Build the preprocessing variants one at a time, in PREPROCESS_METHODS
+        order. Each variant is yielded as soon as it is built and dropped
+        before the next one is made, so a consumer that also lets go of it
+        (iter_ocr_passes does) holds about two image-sized buffers - the
+        grayscale source and the current variant - instead of seven.
+        
+        Yields:
+            (method, preprocessed image)
+        """
+        wanted = set(PREPROCESS_METHODS if methods is None else methods)
         
         # Convert to grayscale
-        gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+        with stage('preprocess', 'grayscale'):
+            gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
         
         # 1. Contrast Enhancement
-        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
-        preprocessed['contrast_enhanced'] = clahe.apply(gray)
+        if 'contrast_enhanced' in wanted:
+            with stage('preprocess', 'contrast_enhanced'):
+                clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8,8))
+                variant = clahe.apply(gray)
+            yield 'contrast_enhanced', variant
+            del variant
         
         # 2. Sharpening for text
-        kernel_sharpen = np.array([[-1,-1,-1],
-                                   [-1, 9,-1],
-                                   [-1,-1,-1]])
-        sharpened = cv2.filter2D(gray, -1, kernel_sharpen)
-        preprocessed['sharpened'] = sharpened
+        if 'sharpened' in wanted:
+            with stage('preprocess', 'sharpened'):
+                kernel_sharpen = np.array([[-1,-1,-1],
+                                           [-1, 9,-1],
+                                           [-1,-1,-1]])
+                variant = cv2.filter2D(gray, -1, kernel_sharpen)
+            yield 'sharpened', variant
+            del variant
         
         # 3. Adaptive thresholding for varying lighting
-        adaptive = cv2.adaptiveThreshold(
-            gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
-            cv2.THRESH_BINARY, 11, 2
-        )
-        preprocessed['adaptive_thresh'] = adaptive
-        
-        # 4. Otsu's thresholding for bimodal images
-        blur = cv2.GaussianBlur(gray, (3,3), 0)
-        _, otsu = cv2.threshold(blur, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-        preprocessed['otsu'] = otsu
+        if 'adaptive_thresh' in wanted:
+            with stage('preprocess', 'adaptive_thresh'):
+                variant = cv2.adaptiveThreshold(
+                    gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, 
+                    cv2.THRESH_BINARY, 11, 2
+                )
+            yield 'adaptive_thresh', variant
+            del variant
+        
+        # 4. Otsu's thresholding for bimodal images (also the input of step 5)
+        if wanted & {'otsu', 'morphological'}:
+            with stage('preprocess', 'otsu'):
+                otsu = cv2.GaussianBlur(gray, (3,3), 0)
+                # Threshold the blurred copy in place: no third buffer
+                cv2.threshold(otsu, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=otsu)
+            if 'otsu' in wanted:
+                yield 'otsu', otsu
         
         # 5. Morphological operations to connect text
-        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2,2))
-        morph = cv2.morphologyEx(otsu, cv2.MORPH_CLOSE, kernel)
-        preprocessed['morphological'] = morph
+        if 'morphological' in wanted:
+            with stage('preprocess', 'morphological'):
+                kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (2,2))
+                variant = cv2.morphologyEx(otsu, cv2.MORPH_CLOSE, kernel)
+            del otsu
+            yield 'morphological', variant
+            del variant
+        elif 'otsu' in wanted:
+            del otsu
         
         # 6. Denoising while preserving edges
-        denoised = cv2.fastNlMeansDenoising(gray, None, 10, 7, 21)
-        preprocessed['denoised'] = denoised
-        
-        return preprocessed
+        if 'denoised' in wanted:
+            with stage('preprocess', 'denoised'):
+                if denoise == 'fast':
+                    variant = cv2.medianBlur(gray, 3)
+                else:
+                    variant = cv2.fastNlMeansDenoising(gray, None, 10, 7, 21)
+            del gray
+            yield 'denoised', variant
     
     # ==================== STEP 3: OCR EXTRACTION ====================
-    def extract_raw_text(self, preprocessed_images: Dict[str, np.ndarray]) -> str:
+    def extract_raw_text(self, preprocessed_images, configs=None, passes=None, run=None) -> str:
         """
         Step 3: OCR Extraction - Convert visible text to plain text
         
         Important characteristics:
         - Text is unordered
-        - Tables become lines
+        - Tables become lines (read_nutrition_table reads them from word boxes)
         - Some words may be slightly wrong
         - Units may be mixed
         
+        Args:
+            preprocessed_images: Dict of variants, or an iter_preprocessed()
+                generator to OCR them as they are built
+        
         Returns:
             Raw extracted text (unstructured)
         """
-        all_texts = []
+        all_texts = list(self.iter_ocr_passes(preprocessed_images, configs, passes, run))
+        return self.select_best_text(all_texts)
+    
+    def select_best_text(self, all_texts: List[Tuple[str, str, str]]) -> str:
+        """Pick the highest-quality text from (method, config, text) passes"""
+        # Select best text based on quality score
+        if not all_texts:
+            return ""
+        
+        with stage('select_text'):
+            best_text = max(all_texts, key=lambda x: self._score_text_quality(x[2]))
+        annotate(ocr_variant=f'{best_text[0]} {best_text[1]}')
+        return best_text[2]
+    
+    def iter_ocr_passes(self, preprocessed_images, configs=None, passes=None, run=None):
+        """
+        Run the OCR passes one at a time, yielding each result as soon as
+        Tesseract returns so callers can report progress between passes.
         
-        for method, img in preprocessed_images.items():
+        Args:
+            preprocessed_images: Dict of variants, or (method, image) pairs
+                such as iter_preprocessed(); each image is released once its
+                passes are done
+            configs: PSM modes to run on every variant (default: PSM_CONFIGS)
+            passes: Explicit (method, config) pairs to run instead of every
+                variant x configs, e.g. a pipeline profile's plan
+            run: pipeline_profiles.ProfileRun; no further passes start once
+                its time budget is spent
+        
+        Yields:
+            (method, config, text) for every pass that produced text
+        """
+        if isinstance(preprocessed_images, dict):
+            preprocessed_images = preprocessed_images.items()
+        for method, img in preprocessed_images:
+            method_configs = configs or PSM_CONFIGS
+            if passes is not None:
+                method_configs = [config for pass_method, config in passes if pass_method == method]
             try:
                 # Extract text with different PSM modes
-                configs = [
-                    '--psm 6',  # Assume uniform block of text
-                    '--psm 4',  # Assume single column of text
-                    '--psm 3',  # Fully automatic page segmentation
-                ]
-                
-                for config in configs:
-                    text = pytesseract.image_to_string(img, lang='eng', config=config)
+                for config in method_configs:
+                    if run is not None and not run.allow_pass():
+                        return
+                    with tesseract_pass(method, config):
+                        text = pytesseract.image_to_string(img, lang='eng', config=config)
                     if text.strip():
-                        all_texts.append((method, config, text))
+                        yield method, config, text
             except Exception as e:
                 continue
+            finally:
+                # Let a streamed variant go before the next one is built
+                del img
+    
+    def read_nutrition_table(self, img: np.ndarray, region=None, scanner=TABLE_SCANNER):
+        """
+        One image_to_data pass on the Otsu-binarised image, parsed by
+        table_parser into per-100 g values (None if Tesseract fails)
         
-        # Select best text based on quality score
-        if not all_texts:
-            return ""
-        
-        best_text = max(all_texts, key=lambda x: self._score_text_quality(x[2]))
-        return best_text[2]
+        Args:
+            region: (left, top, right, bottom) to crop to and upscale by
+                TABLE_REOCR_SCALE instead of reading the whole image
+            scanner: NutrientScanner for the cells (normalized: canonical units)
+        """
+        with stage('preprocess', 'table'):
+            binary = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+            if region is not None:
+                left, top, right, bottom = region
+                binary = cv2.resize(binary[top:bottom, left:right], None, fx=TABLE_REOCR_SCALE,
+                                    fy=TABLE_REOCR_SCALE, interpolation=cv2.INTER_CUBIC)
+            cv2.GaussianBlur(binary, (3,3), 0, dst=binary)
+            cv2.threshold(binary, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU, dst=binary)
+        try:
+            with tesseract_pass('table', TABLE_CONFIG):
+                data = pytesseract.image_to_data(binary, lang='eng', config=TABLE_CONFIG, output_type=Output.DICT)
+        except Exception:
+            return None
+        with stage('parse', 'table'):
+            return read_table(data, scanner)
+    
+    def read_solved_table(self, img: np.ndarray, scanner=TABLE_SCANNER):
+        """
+        (NutritionTable, nutrient_solver.Solution), or (None, None) if the
+        table yields fewer than TABLE_MIN_NUTRIENTS values. Decimal points are
+        placed across all nutrients at once; if no placement is consistent,
+        or two are equally so, the table region is OCRed again and the better
+        reading kept.
+        """
+        table = self.read_nutrition_table(img, scanner=scanner)
+        if table is None or len(table.values) < TABLE_MIN_NUTRIENTS:
+            return None, None
+        solution = solve(table.values)
+        region = table.region() if solution.needs_reocr else None
+        if region is not None:
+            retry = self.read_nutrition_table(img, region, scanner)
+            if retry is not None and len(retry.values) >= TABLE_MIN_NUTRIENTS:
+                retry_solution = solve(retry.values)
+                if (len(retry_solution.violations), retry_solution.ambiguous) < (len(solution.violations), solution.ambiguous):
+                    table, solution = retry, retry_solution
+        annotate(nutrition_table=table.basis, nutrition_consistent=solution.consistent)
+        return table, solution
+    
+    def _table_facts(self, img: np.ndarray) -> Dict[str, str]:
+        """nutrition_facts entries ("520 kcal") from the nutrition table (read_solved_table)"""
+        table, solution = self.read_solved_table(img)
+        if table is None:
+            return {}
+        return {
+            NUTRITION_KEYS[nutrient]: nutrition_fact(nutrient, value, table.values[nutrient].unit)
+            for nutrient, value in solution.values.items()
+        }
     
     def _score_text_quality(self, text: str) -> float:
         """Score text quality based on various metrics"""
         if not text.strip():
             return 0.0
         
+        text = text.lower()
         words = text.split()
         if not words:
             return 0.0
         
-        # Check for nutrition/ingredient keywords
-        keyword_score = sum(1 for word in words if any(
-            kw in word.lower() for kw in self.nutrition_keywords + self.ingredient_keywords
-        )) / len(words)
+        # Check for nutrition/ingredient keywords (words with one inside them)
+        keyword_score = MATCHER.words_containing(text, 'nutrition', 'ingredient') / len(words)
         
         # Check for valid English words
-        valid_words = sum(1 for word in words if word.lower() in ENGLISH_VOCAB) if ENGLISH_VOCAB else 0
-        vocab_score = valid_words / len(words) if ENGLISH_VOCAB else 0.5
+        vocab = english_vocab()
+        valid_words = sum(1 for word in words if word in vocab) if vocab else 0
+        vocab_score = valid_words / len(words) if vocab else 0.5
         
         # Check for numbers (nutrition facts have numbers)
         number_score = sum(1 for word in words if any(c.isdigit() for c in word)) / len(words)
@@ -182,7 +388,7 @@ class FoodPackageOCR:
         return keyword_score * 0.5 + vocab_score * 0.3 + number_score * 0.2
     
     # ==================== NLP POST-PROCESSING ====================
-    def nlp_postprocess(self, raw_text: str) -> Dict[str, any]:
+    def nlp_postprocess(self, raw_text: str, outputs=None) -> Dict[str, any]:
         """
         NLP-based post-processing to structure the raw OCR output
         
@@ -191,7 +397,14 @@ class FoodPackageOCR:
         - Ingredients list
         - Allergen information
         - Serving size
+        
+        Args:
+            outputs: Only run the parsers for these keys (default: all of OUTPUTS)
         """
+        return self._postprocess(raw_text, outputs)[0]
+    
+    def _postprocess(self, raw_text: str, outputs=None):
+        """nlp_postprocess result and the nutrient_solver Solution (None if nutrition_facts was not parsed)"""
         result = {
             'raw_text': raw_text,
             'nutrition_facts': {},
@@ -200,28 +413,64 @@ class FoodPackageOCR:
             'serving_size': None,
             'warnings': []
         }
+        wanted = set(OUTPUTS if outputs is None else outputs)
         
         lines = raw_text.split('\n')
         
-        # Extract nutrition facts
-        nutrition_patterns = {
-            'energy': r'(?:energy|calories?)\s*[:=]?\s*(\d+\.?\d*)\s*(kcal|kj|cal)',
-            'protein': r'protein\s*[:=]?\s*(\d+\.?\d*)\s*g',
-            'carbohydrate': r'carbohydrate\s*[:=]?\s*(\d+\.?\d*)\s*g',
-            'fat': r'(?:total\s+)?fat\s*[:=]?\s*(\d+\.?\d*)\s*g',
-            'sodium': r'sodium\s*[:=]?\s*(\d+\.?\d*)\s*(mg|g)',
-            'sugar': r'sugar\s*[:=]?\s*(\d+\.?\d*)\s*g',
-            'fiber': r'fiber\s*[:=]?\s*(\d+\.?\d*)\s*g',
-        }
+        solution = None
+        if 'nutrition_facts' in wanted:
+            with stage('parse', 'nutrition_facts'):
+                solution = self._parse_nutrition_facts(raw_text, result)
+        if 'ingredients' in wanted:
+            with stage('parse', 'ingredients'):
+                self._parse_ingredients(lines, result)
+        if 'allergens' in wanted:
+            with stage('parse', 'allergens'):
+                self._parse_allergens(raw_text, result)
+        if 'serving_size' in wanted:
+            with stage('parse', 'serving_size'):
+                self._parse_serving_size(raw_text, result)
+        
+        if outputs is not None:
+            result = {key: result[key] for key in ('warnings', *outputs)}
+        return result, solution
+    
+    def finish(self, img: np.ndarray, raw_text: str, outputs=None, table_facts=None, run=None) -> Dict[str, any]:
+        """
+        Structured data from the best OCR text; every route ends here, so the
+        solver and the table parser apply however the text was read
         
-        for nutrient, pattern in nutrition_patterns.items():
-            matches = re.findall(pattern, raw_text.lower(), re.IGNORECASE)
-            if matches:
-                if isinstance(matches[0], tuple):
-                    result['nutrition_facts'][nutrient] = f"{matches[0][0]} {matches[0][1]}"
-                else:
-                    result['nutrition_facts'][nutrient] = matches[0]
+        The text's nutrients are solved together (nutrient_solver). Only if
+        that reading fails the checks, or two readings tie, is the nutrition
+        table read from word boxes (one image_to_data pass, plus a region
+        re-OCR if the table is flagged too); its values replace the text's.
         
+        Args:
+            table_facts: nutrition_facts already read from the table (the
+                outputs=nutrition_facts pre-pass); it is not read again
+            run: pipeline_profiles.ProfileRun; no table pass once its
+                budget is spent
+        """
+        structured_data, solution = self._postprocess(raw_text, outputs)
+        if (table_facts is None and TABLE_PARSER and solution is not None and solution.needs_reocr
+                and not (run is not None and run.over_budget())):
+            table_facts = self._table_facts(img)
+        if table_facts:
+            # Table cells beat values read from flattened lines
+            structured_data['nutrition_facts'].update(table_facts)
+        return structured_data
+    
+    def _parse_nutrition_facts(self, raw_text: str, result: Dict[str, any]):
+        # Extract nutrition facts (one pass over the text for all nutrients), with
+        # decimal points placed across all of them at once
+        hits = NUTRITION_SCANNER.scan(raw_text)
+        solution = solve_printed(hits)
+        for nutrient, key in NUTRITION_KEYS.items():
+            if nutrient in hits:
+                result['nutrition_facts'][key] = nutrition_fact(nutrient, solution.values[nutrient], hits[nutrient].unit)
+        return solution
+    
+    def _parse_ingredients(self, lines: List[str], result: Dict[str, any]):
         # Extract ingredients
         ingredient_section = False
         ingredients_text = []
@@ -244,46 +493,119 @@ class FoodPackageOCR:
             full_text = ' '.join(ingredients_text)
             ingredients = re.split(r'[,;]', full_text)
             result['ingredients'] = [ing.strip() for ing in ingredients if ing.strip()]
-        
-        # Extract allergens
-        allergen_keywords = ['milk', 'egg', 'peanut', 'tree nut', 'soy', 'wheat', 
-                            'fish', 'shellfish', 'sesame', 'gluten']
-        
-        for keyword in allergen_keywords:
-            if re.search(rf'\b{keyword}s?\b', raw_text, re.IGNORECASE):
-                result['allergens'].append(keyword)
-        
+    
+    def _parse_allergens(self, raw_text: str, result: Dict[str, any]):
+        # Extract allergens (whole words, plural allowed) in one pass
+        result['allergens'].extend(MATCHER.whole_words(raw_text.lower(), 'allergen'))
+    
+    def _parse_serving_size(self, raw_text: str, result: Dict[str, any]):
         # Extract serving size
         serving_match = re.search(r'serving\s+size\s*[:=]?\s*([^\n]+)', raw_text, re.IGNORECASE)
         if serving_match:
             result['serving_size'] = serving_match.group(1).strip()
-        
-        return result
     
     # ==================== MAIN PIPELINE ====================
-    def process_food_package(self, image_input) -> Dict[str, any]:
+    def stage_plan(self, outputs=None) -> Tuple[Tuple[str, ...], Tuple[str, ...]]:
+        """
+        Preprocessing variants and PSM modes needed for the requested outputs
+        
+        raw_text (or no selection) needs every pass; otherwise the union of
+        the STAGE_PLANS entries, kept in pipeline order so best-text ties
+        resolve the same way as the full run.
+        """
+        if outputs is None or 'raw_text' in outputs:
+            return PREPROCESS_METHODS, PSM_CONFIGS
+        
+        unknown = set(outputs) - set(OUTPUTS)
+        if unknown:
+            raise ValueError(f"Unknown outputs: {', '.join(sorted(unknown))}")
+        
+        methods = set()
+        configs = set()
+        for output in outputs:
+            output_methods, output_configs = STAGE_PLANS[output]
+            methods.update(output_methods)
+            configs.update(output_configs)
+        return (
+            tuple(m for m in PREPROCESS_METHODS if m in methods),
+            tuple(c for c in PSM_CONFIGS if c in configs)
+        )
+    
+    @timed_stage('process_food_package')
+    def process_food_package(self, image_input, outputs=None, profile=None) -> Dict[str, any]:
         """
         Complete 3-step pipeline:
         1. Accept image as-is
         2. Preprocess for text clarity
         3. Extract and structure text with NLP
         
+        Args:
+            outputs: Subset of OUTPUTS to produce. Only the preprocessing
+                variants, OCR passes and parsers those outputs need are run,
+                and the result holds just those keys (plus 'warnings').
+                nutrition_facts is read from the table's word boxes first;
+                its text passes only run if that finds too little.
+            profile: pipeline_profiles.Profile whose passes, denoise tier,
+                scale target and budget replace the default recipe; its
+                measured cost is returned under 'profile'
+        
         Returns:
             Structured food package information
         """
-        # Step 1: Image Intake
-        img = self.accept_image(image_input)
-        
-        # Step 2: Image Understanding
-        preprocessed = self.preprocess_for_text_clarity(img)
+        # Step 1: Image Intake (read-only from here on, so no defensive copy)
+        img = self.accept_image(image_input, copy=False)
+        
+        if profile is not None:
+            # The profile's passes and budget are the whole cost: no table
+            # pre-pass, only finish()'s fallback while budget remains
+            run, preprocessed, passes = self.start_profile(img, profile, outputs, self.streaming)
+            raw_text = self.extract_raw_text(preprocessed, passes=passes, run=run)
+            structured_data = self.finish(img, raw_text, outputs, run=run)
+            structured_data['profile'] = run.report()
+            return structured_data
+        
+        # Nutrition table from word geometry first, when it can replace the
+        # passes run only for nutrition_facts
+        table_facts = None
+        text_outputs = outputs
+        if TABLE_PARSER and outputs is not None and 'nutrition_facts' in outputs:
+            table_facts = self._table_facts(img)
+            if table_facts:
+                text_outputs = tuple(o for o in outputs if o != 'nutrition_facts')
+        
+        methods, configs = self.stage_plan(text_outputs)
+        
+        # Step 2: Image Understanding (built lazily, pass by pass, when streaming)
+        if self.streaming:
+            preprocessed = self.iter_preprocessed(img, methods)
+        else:
+            preprocessed = self.preprocess_for_text_clarity(img, methods)
         
         # Step 3: OCR Extraction
-        raw_text = self.extract_raw_text(preprocessed)
+        raw_text = self.extract_raw_text(preprocessed, configs)
         
         # NLP Post-processing
-        structured_data = self.nlp_postprocess(raw_text)
+        return self.finish(img, raw_text, outputs, table_facts)
+    
+    def start_profile(self, img: np.ndarray, profile, outputs=None, streaming=False):
+        """
+        Scale and preprocess an image for a pipeline profile
         
-        return structured_data
+        Returns:
+            (ProfileRun, preprocessed images, passes to run); with streaming
+            the images are an iter_preprocessed() generator, not a dict
+        """
+        self.stage_plan(outputs)  # rejects unknown outputs
+        run = profile.start()
+        passes = profile.plan(outputs)
+        run.passes_planned = len(passes)
+        with stage('preprocess', 'scale'):
+            img = run.scale_image(img)
+        methods = tuple(m for m in PREPROCESS_METHODS if any(method == m for method, _ in passes))
+        if streaming:
+            return run, self.iter_preprocessed(img, methods, profile.denoise), passes
+        preprocessed = self.preprocess_for_text_clarity(img, methods, profile.denoise)
+        return run, preprocessed, passes
 
 
 # ==================== USAGE EXAMPLE ====================
@@ -0,0 +1,286 @@
+"""
+Fuzzy correction of OCR-mangled food words
+normalize_ingredient used to fix OCR errors from a hand-written dict
+('lodised' -> 'iodised', 'oill' -> 'oil'), one word-boundary regex per entry
+per ingredient, and parse_with_validation listed misspelt labels
+('soturated', 'satruated') next to the real ones. Both only knew the
+misreads someone had already seen.
+
+FuzzyIndex is a SymSpell-style deletion-neighbourhood index over a food
+vocabulary (ingredients, nutrients, additives, E-numbers): every string
+reachable from a vocabulary word by deleting a character maps back to
+that word, built once. A token is looked up by generating its own
+deletes - a few dictionary probes, no scan over the vocabulary - and
+checking the candidates' true edit distance (adjacent transpositions count
+as one edit, the common 'satruated' misread).
+
+A correction swaps one food word for another on a food-safety label, so
+it is only made when it cannot be a real word and the OCR error is small
+for the token's length:
+- the token is not in the much larger food lexicon (food_lexicon.txt,
+  with plurals) or the English word list: 'sucrose' is never 'sucralose',
+  'wafer' never 'water'
+- its OCR cost to the vocabulary word fits MAX_COST for its length. An
+  edit costs 1, or 0.5 when it is typical of OCR (a CONFUSABLE glyph:
+  'lodised'; a doubled letter: 'oill'), so four-letter tokens only take
+  one typical edit and two full edits need seven letters
+- exactly one vocabulary word has the lowest cost
+The food index is built on first use (about 10 ms) and shared by every
+parser in the process.
+"""
+
+import os
+import re
+import threading
+
+# Correction targets by category
+FOOD_VOCABULARY = {
+    'ingredient': (
+        'water', 'sugar', 'salt', 'iodised', 'oil', 'oils', 'vegetable', 'edible', 'refined',
+        'palm', 'palmolein', 'sunflower', 'groundnut', 'peanut', 'mustard', 'rice', 'bran',
+        'soybean', 'soya', 'cottonseed', 'coconut', 'olive', 'ghee', 'butter', 'milk', 'solids',
+        'skimmed', 'powder', 'cream', 'cheese', 'whey', 'lactose', 'casein', 'egg', 'eggs',
+        'wheat', 'flour', 'maida', 'atta', 'whole', 'semolina', 'corn', 'maize', 'starch',
+        'oats', 'barley', 'millet', 'gram', 'besan', 'lentil', 'potato', 'potatoes', 'onion',
+        'garlic', 'ginger', 'tomato', 'chilli', 'pepper', 'turmeric', 'cumin', 'coriander',
+        'cardamom', 'cinnamon', 'clove', 'fennel', 'mint', 'spices', 'condiments', 'herbs',
+        'cocoa', 'chocolate', 'vanilla', 'honey', 'jaggery', 'glucose', 'fructose', 'dextrose',
+        'maltodextrin', 'malt', 'syrup', 'invert', 'liquid', 'yeast', 'vinegar', 'lemon',
+        'juice', 'concentrate', 'fruit', 'pulp', 'date', 'dates', 'raisins', 'almonds',
+        'cashew', 'nuts', 'sesame', 'seeds', 'hydrogenated', 'shortening', 'margarine',
+        'gelatin', 'pectin', 'agar', 'dried', 'dehydrated', 'roasted', 'fried', 'extract',
+        'gluten', 'fish', 'shellfish', 'tree', 'nut'
+    ),
+    'nutrient': (
+        'energy', 'calories', 'kcal', 'protein', 'carbohydrate', 'carbohydrates', 'total',
+        'fat', 'fats', 'saturated', 'monounsaturated', 'polyunsaturated', 'trans', 'fatty',
+        'acids', 'cholesterol', 'sodium', 'potassium', 'calcium', 'iron', 'sugars', 'added',
+        'dietary', 'fibre', 'fiber', 'vitamin', 'minerals', 'serving', 'nutrition',
+        'nutritional', 'information', 'approx', 'per'
+    ),
+    'additive': (
+        'emulsifier', 'emulsifiers', 'stabiliser', 'stabilizer', 'thickener', 'preservative',
+        'preservatives', 'antioxidant', 'acidity', 'regulator', 'raising', 'agent', 'agents',
+        'colour', 'color', 'flavour', 'flavor', 'flavouring', 'artificial', 'natural',
+        'identical', 'permitted', 'class', 'sweetener', 'lecithin', 'citric', 'acid',
+        'ascorbic', 'sorbate', 'benzoate', 'monosodium', 'glutamate', 'bicarbonate',
+        'ammonium', 'carbonate', 'guar', 'gum', 'xanthan', 'carrageenan', 'tocopherol',
+        'caramel', 'anticaking', 'diglycerides', 'sorbitol', 'aspartame', 'sucralose',
+        'acesulfame', 'tartrazine', 'carmoisine', 'annatto', 'paprika', 'curcumin'
+    ),
+    'e_number': (
+        'e100', 'e110', 'e120', 'e122', 'e129', 'e133', 'e150a', 'e150c', 'e150d', 'e160a',
+        'e160b', 'e170', 'e200', 'e202', 'e211', 'e220', 'e223', 'e250', 'e260', 'e270',
+        'e282', 'e290', 'e296', 'e300', 'e322', 'e330', 'e331', 'e339', 'e340', 'e341',
+        'e407', 'e410', 'e412', 'e414', 'e415', 'e422', 'e440', 'e450', 'e451', 'e452',
+        'e466', 'e471', 'e472e', 'e476', 'e500', 'e501', 'e503', 'e508', 'e551', 'e621',
+        'e627', 'e631', 'e635', 'e950', 'e951', 'e955'
+    ),
+    # Other words common on labels ('lngredients' -> 'ingredients')
+    'label': (
+        'ingredients', 'contains', 'contain', 'traces', 'allergen', 'allergy', 'advice',
+        'net', 'qty', 'pack', 'packed', 'best', 'before', 'use', 'store', 'cool', 'dry',
+        'place', 'price', 'and', 'with', 'from', 'for', 'of', 'on', 'or', 'at', 'an', 'as', 'by',
+        'in', 'is', 'it', 'my', 'no', 'not', 'the', 'to'
+    ),
+}
+
+LEXICON_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'food_lexicon.txt')
+
+# Glyphs OCR confuses; substituting one for the other costs CONFUSABLE_COST
+CONFUSABLE = frozenset(frozenset(pair) for pair in (
+    ('l', 'i'), ('l', '1'), ('i', '1'), ('o', '0'), ('s', '5'), ('s', 'z'), ('b', '6'),
+    ('b', 'h'), ('g', '9'), ('g', 'q'), ('y', 'v'), ('u', 'v'), ('n', 'h'), ('c', 'e'),
+    ('e', 'o'), ('a', 'o'),
+))
+CONFUSABLE_COST = 0.5
+
+# (minimum token length, largest OCR cost corrected), longest first; shorter
+# tokens are never corrected
+MAX_COST = ((9, 2.0), (7, 1.0), (4, 0.5))
+
+# Words with a letter in them; numbers are never corrected
+TOKEN_RE = re.compile(r'[a-z0-9]*[a-z][a-z0-9]*')
+
+# Corrections remembered per index before the memo is reset
+CACHE_SIZE = 50000
+
+
+def deletes(word, distance):
+    """word and every string made from it by deleting up to `distance` characters"""
+    found = {word}
+    frontier = {word}
+    for _ in range(distance):
+        frontier = {w[:i] + w[i + 1:] for w in frontier for i in range(len(w))}
+        found |= frontier
+    return found
+
+
+def edit_distance(a, b, limit):
+    """
+    Optimal-string-alignment distance between a and b (insert, delete,
+    substitute, swap adjacent); limit + 1 as soon as it must exceed limit
+    """
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = None
+    row = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        before, previous, row = previous, row, [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            row[j] = min(previous[j] + 1, row[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], before[j - 2] + 1)
+        if min(row) > limit:
+            return limit + 1
+    return row[-1]
+
+
+def ocr_cost(token, word):
+    """
+    Edit distance from token to word (optimal string alignment) with
+    OCR-typical edits at half cost: CONFUSABLE substitutions, and a doubled
+    letter added or dropped ('oill' -> 'oil')
+    """
+    previous = None
+    row = [0.0]
+    for j in range(1, len(word) + 1):
+        row.append(row[-1] + _insert_cost(word, j))
+    for i in range(1, len(token) + 1):
+        delete = CONFUSABLE_COST if i > 1 and token[i - 1] == token[i - 2] else 1.0
+        before, previous, row = previous, row, [row[0] + delete] + [0.0] * len(word)
+        for j in range(1, len(word) + 1):
+            if token[i - 1] == word[j - 1]:
+                substitute = 0.0
+            elif frozenset((token[i - 1], word[j - 1])) in CONFUSABLE:
+                substitute = CONFUSABLE_COST
+            else:
+                substitute = 1.0
+            row[j] = min(previous[j] + delete, row[j - 1] + _insert_cost(word, j), previous[j - 1] + substitute)
+            if i > 1 and j > 1 and token[i - 1] == word[j - 2] and token[i - 2] == word[j - 1]:
+                row[j] = min(row[j], before[j - 2] + 1.0)
+    return row[-1]
+
+
+def _insert_cost(word, j):
+    """Cost of inserting word[j - 1]: half when it doubles the letter before it"""
+    return CONFUSABLE_COST if j > 1 and word[j - 1] == word[j - 2] else 1.0
+
+
+def max_cost(token):
+    """Largest OCR cost corrected for a token of this length (0: never corrected)"""
+    for length, cost in MAX_COST:
+        if len(token) >= length:
+            return cost
+    return 0.0
+
+
+def plurals(word):
+    """Regular plural forms of a lexicon word"""
+    if word.endswith(('s', 'x', 'z', 'ch', 'sh')):
+        return {word + 'es'}
+    if word.endswith('y') and word[-2:-1] not in ('a', 'e', 'i', 'o', 'u'):
+        return {word[:-1] + 'ies'}
+    if word.endswith('o'):
+        return {word + 's', word + 'es'}
+    return {word + 's'}
+
+
+def load_lexicon(path=LEXICON_PATH):
+    """Words of a lexicon file and their plurals"""
+    words = set()
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            word = line.split('#', 1)[0].strip().lower()
+            if word:
+                words.add(word)
+                words |= plurals(word)
+    return frozenset(words)
+
+
+class FuzzyIndex:
+    """
+    Deletion-neighbourhood index over a vocabulary
+    known: real words besides the vocabulary, never corrected
+    max_distance: most edits a correction may make
+    """
+
+    def __init__(self, vocabulary=FOOD_VOCABULARY, known=(), max_distance=2):
+        self.max_distance = max_distance
+        self.words = set()
+        for words in vocabulary.values():
+            self.words.update(words)
+        self.known = frozenset(known) | self.words
+        # delete -> the vocabulary words it came from
+        self._deletes = {}
+        for word in self.words:
+            for delete in deletes(word, max_distance):
+                self._deletes.setdefault(delete, []).append(word)
+        self._cache = {}
+
+    def lookup(self, token):
+        """
+        (vocabulary word, OCR cost) cheapest from token within max_distance
+        edits and the MAX_COST for its length, or None if none is, or several
+        are equally cheap
+        """
+        if token in self.words:
+            return token, 0.0
+        if token in self._cache:
+            return self._cache[token]
+        closest = []
+        best = max_cost(token)
+        seen = set()
+        for delete in deletes(token, self.max_distance):
+            for word in self._deletes.get(delete, ()):
+                if word in seen:
+                    continue
+                seen.add(word)
+                if edit_distance(token, word, self.max_distance) > self.max_distance:
+                    continue
+                cost = ocr_cost(token, word)
+                if cost < best or (cost == best and not closest):
+                    closest, best = [word], cost
+                elif cost == best:
+                    closest.append(word)
+        match = (closest[0], best) if len(closest) == 1 else None
+        if len(self._cache) >= CACHE_SIZE:
+            self._cache.clear()
+        self._cache[token] = match
+        return match
+
+    def correct(self, token, keep=()):
+        """
+        The vocabulary word token is a misread of, else token: also when it is
+        a real word (known, or in `keep`), too short for its error, or ambiguous
+        """
+        if token in self.known or token in keep or not max_cost(token):
+            return token
+        match = self.lookup(token)
+        return match[0] if match else token
+
+    def correct_text(self, text, keep=(), min_length=2):
+        """Lowercase text with every word of at least min_length characters corrected"""
+        known = self.known
+
+        def replace(match):
+            token = match.group()
+            if token in known or len(token) < min_length:
+                return token
+            return self.correct(token, keep)
+
+        return TOKEN_RE.sub(replace, text.lower())
+
+_lock = threading.Lock()
+_food_index = None
+
+
+def food_index():
+    """The FuzzyIndex over FOOD_VOCABULARY, guarded by the food lexicon, built on first use"""
+    global _food_index
+    if _food_index is None:
+        with _lock:
+            if _food_index is None:
+                _food_index = FuzzyIndex(known=load_lexicon())
+    return _food_index
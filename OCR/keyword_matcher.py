@@ -0,0 +1,175 @@
+"""
+Shared keyword matcher for label text
+Text-quality scoring, allergen detection and the additive / processing
+checks used to scan the same text once per keyword (or once per word per
+keyword). KEYWORDS lists every keyword by the purpose it serves; they are
+all compiled, once at import, into one automaton, and a single scan of a
+(lowercased) text yields every occurrence of every keyword - overlapping
+ones included - from which callers take the counts and spans they need.
+Callers that only need one answer (how many words hold a keyword, which
+allergens occur as whole words) use a per-purpose pattern compiled
+alongside it and never build the spans.
+
+The automaton is the keyword trie (Aho-Corasick's goto function) compiled
+into a regex and run at every text position, so the scan loops in the
+regex engine rather than in Python. Each position reports the longest
+keyword starting there; keywords that are prefixes of it ('sugar' in
+'sugars') are added from a precomputed table, which stands in for the
+output links.
+"""
+
+import re
+from bisect import bisect_right
+
+
+# purpose -> keywords (lowercase); a keyword may serve several purposes
+KEYWORDS = {
+    # OCR text that reads like a label: enhanced_ocr_pipeline._score_text_quality
+    'nutrition': (
+        'energy', 'protein', 'carbohydrate', 'fat', 'sodium', 'sugar',
+        'fiber', 'calcium', 'iron', 'vitamin', 'calories', 'kcal', 'kj',
+        'serving', 'cholesterol', 'saturated', 'trans', 'dietary'
+    ),
+    'ingredient': ('ingredients', 'contains', 'allergen', 'may contain'),
+    # Matched as whole words, plural allowed: nlp_postprocess, test_ocr_simple_fixed
+    'allergen': (
+        'milk', 'egg', 'peanut', 'tree nut', 'soy', 'wheat',
+        'fish', 'shellfish', 'sesame', 'gluten'
+    ),
+    # api_server.calculate_safety_score
+    'ultra_processed': ('emulsifier', 'artificial', 'preservative'),
+    # simple_api: ingredient risk, recommendations and Nutri-Score
+    'additive': ('artificial', 'preservative', 'color', 'flavor'),
+    'staple': ('sugar', 'salt', 'oil'),
+    'nutri_score': ('sugar', 'fat', 'protein', 'fiber', 'fibre'),
+}
+
+
+def trie_pattern(words, space=None):
+    """
+    Regex matching any of words, with shared prefixes factored out so most
+    positions are rejected on their first character. Optional tails are
+    greedy, so the longest word wins; `space` replaces ' ' (default: literal).
+    """
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def emit(node):
+        branches = [
+            (space if char == ' ' and space else re.escape(char)) + emit(child)
+            for char, child in sorted(node.items()) if char
+        ]
+        if not branches:
+            return ''
+        body = branches[0] if len(branches) == 1 else '(?:' + '|'.join(branches) + ')'
+        return f'(?:{body})?' if '' in node else body
+
+    return emit(trie)
+
+
+class KeywordHits:
+    """Every keyword occurrence in one text: (start, end, keyword) in text order"""
+
+    def __init__(self, matcher, text, spans):
+        self.matcher = matcher
+        self.text = text
+        self.spans = spans
+        self._found = None
+
+    def found(self, purpose=None):
+        """Keywords that occur at least once (only those serving `purpose`)"""
+        if self._found is None:
+            self._found = {keyword for _, _, keyword in self.spans}
+        if purpose is None:
+            return self._found
+        return self._found & self.matcher.purposes[purpose]
+
+    def has(self, purpose):
+        """True if any keyword serving `purpose` occurs"""
+        return bool(self.found(purpose))
+
+    def count(self, keyword):
+        return sum(1 for _, _, k in self.spans if k == keyword)
+
+    def within(self, start, end, purpose=None):
+        """Keywords occurring wholly inside text[start:end]"""
+        wanted = self.matcher.purposes[purpose] if purpose else None
+        i = bisect_right(self.spans, (start, -1, ''))
+        found = set()
+        for span_start, span_end, keyword in self.spans[i:]:
+            if span_start >= end:
+                break
+            if span_end <= end and (wanted is None or keyword in wanted):
+                found.add(keyword)
+        return found
+
+
+class KeywordMatcher:
+    """
+    All keywords compiled into one automaton; scan() finds every occurrence
+    in one pass. Per-purpose automatons, compiled alongside, serve the
+    callers that need a single count or answer rather than the spans.
+    """
+
+    def __init__(self, keywords=KEYWORDS):
+        self.keywords = {purpose: tuple(words) for purpose, words in keywords.items()}
+        self.purposes = {purpose: frozenset(words) for purpose, words in keywords.items()}
+        self._patterns = {}
+        self.pattern = self._compile('scan', None)
+        for purpose in self.keywords:
+            self._compile('scan', (purpose,))
+            self._compile('words', (purpose,))
+            self._compile('whole', (purpose,))
+
+    def _compile(self, kind, purposes):
+        """Pattern of `kind` over the keywords of `purposes` (all if None), compiled once"""
+        key = (kind, purposes)
+        if key not in self._patterns:
+            words = sorted({
+                word for purpose, words in self.keywords.items()
+                if purposes is None or purpose in purposes for word in words
+            })
+            if kind == 'scan':
+                # Zero-width, so matches starting inside an earlier match are found too;
+                # keyword -> the keywords that are prefixes of it (itself included)
+                prefixes = {w: tuple(sorted((p for p in words if w.startswith(p)), key=len)) for w in words}
+                self._patterns[key] = (re.compile(f'(?=({trie_pattern(words)}))'), prefixes)
+            elif kind == 'words':
+                # A whitespace-separated word with a keyword anywhere in it (one match per word)
+                words = [w for w in words if ' ' not in w]
+                self._patterns[key] = re.compile(r'\S*?(?:' + trie_pattern(words) + r')\S*')
+            else:
+                # Whole word, optional plural 's' (like r'\bmilks?\b')
+                self._patterns[key] = re.compile(r'\b(' + trie_pattern(words) + r')s?\b')
+        return self._patterns[key]
+
+    def scan(self, text, *purposes):
+        """KeywordHits for text (already lowercase), for all keywords or just those of `purposes`"""
+        pattern, prefixes = self._compile('scan', purposes or None)
+        spans = []
+        for match in pattern.finditer(text):
+            start = match.start()
+            for keyword in prefixes[match.group(1)]:
+                spans.append((start, start + len(keyword), keyword))
+        return KeywordHits(self, text, spans)
+
+    def words_containing(self, text, *purposes):
+        """Number of whitespace-separated words of text containing a keyword of `purposes`"""
+        return len(self._compile('words', purposes).findall(text))
+
+    def whole_words(self, text, purpose):
+        """Keywords of `purpose` occurring as whole words (plural allowed), in KEYWORDS order"""
+        wanted = self.purposes[purpose]
+        found = set()
+        for match in self._compile('whole', (purpose,)).finditer(text):
+            found.add(match.group(1))
+            if len(found) == len(wanted):
+                break
+        return [keyword for keyword in self.keywords[purpose] if keyword in found]
+
+
+MATCHER = KeywordMatcher()
@@ -0,0 +1,485 @@
+"""
+Load test for the OCR servers
+Starts each server locally, replays a mix of test_images against it and
+reports, per endpoint: throughput, p50/p95/p99 latency, error rate and
+the server's CPU time (per request from its /metrics, and the whole
+process tree's utilisation from /proc).
+
+Scenarios:
+- mixed: closed loop, OCR uploads interleaved with cheap JSON calls
+- camera-burst: bursts of camera scans (?profile=fast) arriving together,
+  idle in between - a store aisle full of phones
+- batch-ingest: steady arrivals of multi-image batch uploads - the
+  catalogue import job
+
+Closed-loop scenarios keep --concurrency requests in flight. Open-loop ones
+(bursts, --rate) send on a schedule regardless of how the server keeps up,
+and latency counts from the scheduled arrival, so time spent waiting for
+a free client slot is included rather than hidden.
+
+cpu/req is the CPU time of the thread serving the request (pool workers
+under asgi_server), so batch items analyzed on helper threads of the Flask
+servers are missing from it; the server CPU line covers every thread.
+
+Usage:
+    python load_test.py
+    python load_test.py --servers api,asgi --scenarios camera-burst,batch-ingest --output run.json
+    python load_test.py --scenarios mixed --images test-3 --requests 60 --concurrency 8
+    python load_test.py --scenarios batch-ingest --rate 0.5 --batch-size 8
+    python load_test.py --compare baseline.json --output run.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import re
+import signal
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import benchmark
+
+OCR_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Routes per request kind; None = the server has no such route.
+# cpu_routes maps an endpoint to its ocr_request_cpu_seconds route label.
+SERVERS = {
+    'flask': {
+        'command': [sys.executable, 'test_ocr_simple.py'],
+        'port': 5002,
+        'scan': '/api/analyze/generic',
+        'batch': None,
+        'cheap': ('POST', '/api/blinkit/alternatives'),
+        'cpu_routes': {},
+    },
+    'api': {
+        'command': [sys.executable, 'api_server.py'],
+        'port': 5000,
+        'scan': '/api/ocr/analyze',
+        'batch': '/api/ocr/analyze-batch',
+        'cheap': ('GET', '/api/ocr/health'),
+        'cpu_routes': {},
+    },
+    'asgi': {
+        'command': [sys.executable, 'asgi_server.py'],
+        'port': 5002,
+        'scan': '/api/analyze/generic',
+        'batch': '/api/ocr/analyze-batch',
+        'cheap': ('POST', '/api/blinkit/alternatives'),
+        # OCR runs in pool workers, which label samples with the worker function
+        'cpu_routes': {'/api/analyze/generic': 'analyze_generic', '/api/ocr/analyze-batch': 'analyze'},
+    },
+    'prefork': {
+        'command': [sys.executable, 'prefork_server.py', '--app', 'test_ocr_simple', '--port', '5002'],
+        'port': 5002,
+        'scan': '/api/analyze/generic',
+        'batch': None,
+        'cheap': ('POST', '/api/blinkit/alternatives'),
+        'cpu_routes': {},
+    },
+}
+
+# arrival: closed (back to back at --concurrency), burst or steady (open loop)
+SCENARIOS = {
+    'mixed': {
+        'description': 'OCR uploads interleaved with cheap JSON calls',
+        'mix': ('scan', 'cheap'),
+        'arrival': 'closed',
+        'requests': 40,
+    },
+    'camera-burst': {
+        'description': 'bursts of fast-profile camera scans arriving together',
+        'mix': ('scan',),
+        'arrival': 'burst',
+        'requests': 48,
+        'burst_size': 12,
+        'burst_interval': 6.0,
+        'profile': 'fast',
+    },
+    'batch-ingest': {
+        'description': 'steady arrivals of multi-image batch uploads',
+        'mix': ('batch',),
+        'arrival': 'steady',
+        'requests': 10,
+        'rate': 0.2,
+        'batch_size': 6,
+    },
+}
+
+
+# ==================== requests ====================
+def multipart_body(files):
+    """Encode a multipart/form-data body from (field, filename, data) tuples"""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for field, filename, data in files:
+        parts.append((
+            f'--{boundary}\r\n'
+            f'Content-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'
+        ).encode() + data + b'\r\n')
+    return b''.join(parts) + f'--{boundary}--\r\n'.encode(), f'multipart/form-data; boundary={boundary}'
+
+
+def batch_failures(body):
+    """Failed items reported by an NDJSON batch response's summary line"""
+    lines = body.decode('utf-8', 'replace').strip().splitlines()
+    try:
+        return json.loads(lines[-1])['summary']['failed']
+    except (IndexError, KeyError, ValueError):
+        return 1
+
+
+def send(base_url, request_spec, timeout=300, scheduled=None):
+    """
+    Send one request; returns (endpoint, latency_seconds, status). Latency
+    counts from `scheduled` when given (open loop), else from the send.
+    A batch response with failed items counts as status 'batch-error'.
+    """
+    endpoint, method, path, body, content_type = request_spec
+    headers = {'Content-Type': content_type} if content_type else {}
+    req = urllib.request.Request(base_url + path, data=body, headers=headers, method=method)
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=timeout) as resp:
+            payload = resp.read()
+            status = resp.status
+        if content_type and endpoint.endswith('-batch') and batch_failures(payload):
+            status = 'batch-error'
+    except urllib.error.HTTPError as e:
+        status = e.code
+    except (urllib.error.URLError, OSError):
+        status = 'connection-error'
+    return endpoint, time.perf_counter() - (scheduled if scheduled is not None else start), status
+
+
+def is_ok(status):
+    return isinstance(status, int) and 200 <= status < 300
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def build_requests(server, scenario, images, count, batch_size, profile):
+    """The scenario's request specs, cycling through the image mix"""
+    spec = SERVERS[server]
+    scan_path = spec['scan'] + (f'?profile={profile}' if profile else '')
+    specs = []
+    next_image = 0
+    for i in range(count):
+        for kind in scenario['mix']:
+            if kind == 'cheap':
+                method, path = spec['cheap']
+                body, content_type = (b'{}', 'application/json') if method == 'POST' else (None, None)
+                specs.append((path, method, path, body, content_type))
+                continue
+            if kind == 'batch':
+                files = []
+                for _ in range(batch_size):
+                    name, data = images[next_image % len(images)]
+                    files.append(('images', name, data))
+                    next_image += 1
+                path = spec['batch'] + (f'?profile={profile}' if profile else '')
+                specs.append((spec['batch'], 'POST', path, *multipart_body(files)))
+                continue
+            name, data = images[next_image % len(images)]
+            next_image += 1
+            specs.append((spec['scan'], 'POST', scan_path, *multipart_body([('image', name, data)])))
+    return specs
+
+
+def arrival_offsets(scenario, count, rate, burst_size, burst_interval, seed=0):
+    """Seconds from the start at which each request is sent (None = closed loop)"""
+    arrival = scenario['arrival']
+    if rate:
+        # Poisson arrivals at the requested rate
+        rng = random.Random(seed)
+        offsets, t = [], 0.0
+        for _ in range(count):
+            offsets.append(t)
+            t += rng.expovariate(rate)
+        return offsets
+    if arrival == 'burst':
+        return [(i // burst_size) * burst_interval for i in range(count)]
+    if arrival == 'steady':
+        return [i / scenario['rate'] for i in range(count)]
+    return None
+
+
+def run_load(base_url, specs, concurrency, offsets=None):
+    """Send every spec and return [(endpoint, latency_seconds, status)] plus wall seconds"""
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        if offsets is None:
+            results = list(pool.map(lambda spec: send(base_url, spec), specs))
+        else:
+            futures = []
+            for spec, offset in zip(specs, offsets):
+                scheduled = start + offset
+                delay = scheduled - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                futures.append(pool.submit(send, base_url, spec, 300, scheduled))
+            results = [f.result() for f in futures]
+    return results, time.perf_counter() - start
+
+
+# ==================== server CPU ====================
+CPU_SUM = re.compile(r'^ocr_request_cpu_seconds_sum\{route="([^"]*)"\} (\S+)$', re.M)
+CPU_COUNT = re.compile(r'^ocr_request_cpu_seconds_count\{route="([^"]*)"\} (\S+)$', re.M)
+
+
+def scrape_request_cpu(base_url):
+    """{route: (cpu_seconds_sum, count)} from the server's /metrics, {} if unavailable"""
+    try:
+        with urllib.request.urlopen(base_url + '/metrics', timeout=5) as resp:
+            text = resp.read().decode()
+    except (urllib.error.URLError, OSError):
+        return {}
+    counts = {route: float(value) for route, value in CPU_COUNT.findall(text)}
+    return {route: (float(value), counts.get(route, 0.0)) for route, value in CPU_SUM.findall(text)}
+
+
+def process_tree_cpu(pid):
+    """
+    CPU seconds used by pid and its descendants (including reaped children)
+    from /proc; None where /proc is unavailable
+    """
+    if not os.path.isdir('/proc'):
+        return None
+    ticks = os.sysconf('SC_CLK_TCK')
+    stats = {}
+    for entry in os.listdir('/proc'):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f'/proc/{entry}/stat') as f:
+                fields = f.read().rpartition(')')[2].split()
+        except OSError:
+            continue
+        # fields[0] is state: ppid, utime, stime, cutime, cstime are stat fields 4, 14-17
+        stats[int(entry)] = (int(fields[1]), sum(int(v) for v in fields[11:15]))
+    tree, frontier = set(), {pid}
+    while frontier:
+        tree |= frontier
+        frontier = {child for child, (ppid, _) in stats.items() if ppid in frontier} - tree
+    return sum(stats[p][1] for p in tree if p in stats) / ticks
+
+
+def summarize(server, results, wall, cpu_before, cpu_after, tree_cpu):
+    spec = SERVERS[server]
+    endpoints = {}
+    for endpoint in sorted({r[0] for r in results}):
+        rows = [r for r in results if r[0] == endpoint]
+        latencies = [r[1] for r in rows if is_ok(r[2])]
+        errors = [r[2] for r in rows if not is_ok(r[2])]
+        stats = {
+            'requests': len(rows),
+            'errors': len(errors),
+            'error_rate': round(len(errors) / len(rows), 4),
+            'error_statuses': {str(s): errors.count(s) for s in sorted(set(errors), key=str)},
+            'rps': round(len(latencies) / wall, 3),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 1) if latencies else None,
+            'p95_ms': round(percentile(latencies, 95) * 1000, 1) if latencies else None,
+            'p99_ms': round(percentile(latencies, 99) * 1000, 1) if latencies else None,
+            'cpu_ms_per_request': None,
+        }
+        label = spec['cpu_routes'].get(endpoint, endpoint)
+        if label in cpu_after:
+            cpu_sum = cpu_after[label][0] - cpu_before.get(label, (0.0, 0.0))[0]
+            count = cpu_after[label][1] - cpu_before.get(label, (0.0, 0.0))[1]
+            if count:
+                stats['cpu_ms_per_request'] = round(cpu_sum / count * 1000, 1)
+        endpoints[endpoint] = stats
+
+    cores = os.cpu_count() or 1
+    return {
+        'wall_seconds': round(wall, 2),
+        'server_cpu_seconds': round(tree_cpu, 2) if tree_cpu is not None else None,
+        # Share of all cores the server's processes kept busy during the run
+        'server_cpu_utilisation': round(tree_cpu / (wall * cores), 3) if tree_cpu is not None else None,
+        'endpoints': endpoints
+    }
+
+
+# ==================== servers ====================
+def wait_until_healthy(base_url, timeout=120):
+    """Wait until the server answers /metrics"""
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        _, _, status = send(base_url, ('/metrics', 'GET', '/metrics', None, None), timeout=2)
+        if is_ok(status):
+            return True
+        time.sleep(0.5)
+    return False
+
+
+def start_server(name, port):
+    env = dict(os.environ, PORT=str(port))
+    # New session so the Flask reloader child is stopped with its parent
+    return subprocess.Popen(SERVERS[name]['command'], cwd=OCR_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                            start_new_session=True)
+
+
+def stop_server(proc):
+    try:
+        os.killpg(proc.pid, signal.SIGTERM)
+        proc.wait(timeout=10)
+    except (ProcessLookupError, subprocess.TimeoutExpired):
+        os.killpg(proc.pid, signal.SIGKILL)
+
+
+def run_scenario(server, proc, base_url, name, images, args):
+    scenario = SCENARIOS[name]
+    count = args.requests or scenario['requests']
+    batch_size = args.batch_size or scenario.get('batch_size', 4)
+    profile = args.profile if args.profile is not None else scenario.get('profile', '')
+    specs = build_requests(server, scenario, images, count, batch_size, profile)
+    offsets = arrival_offsets(
+        scenario, len(specs), args.rate,
+        args.burst_size or scenario.get('burst_size', 1),
+        args.burst_interval or scenario.get('burst_interval', 0.0)
+    )
+
+    # Warm caches and lazy imports before measuring
+    for spec in specs[:args.warmup]:
+        send(base_url, spec)
+
+    cpu_before = scrape_request_cpu(base_url)
+    tree_before = process_tree_cpu(proc.pid)
+    results, wall = run_load(base_url, specs, args.concurrency, offsets)
+    tree_after = process_tree_cpu(proc.pid)
+    cpu_after = scrape_request_cpu(base_url)
+
+    tree_cpu = tree_after - tree_before if tree_before is not None and tree_after is not None else None
+    report = summarize(server, results, wall, cpu_before, cpu_after, tree_cpu)
+    report.update({
+        'arrival': 'poisson' if args.rate else scenario['arrival'],
+        'requests': len(specs),
+        'concurrency': args.concurrency,
+        'profile': profile or None,
+        'batch_size': batch_size if 'batch' in scenario['mix'] else None
+    })
+    return report
+
+
+# ==================== output ====================
+def print_report(runs):
+    print("\n" + "=" * 100)
+    print(f"{'server':<9}{'scenario':<14}{'endpoint':<28}{'req':>5}{'err%':>7}{'rps':>8}"
+          f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'cpu/req':>9}")
+    print("=" * 100)
+    for server, scenarios in runs.items():
+        for scenario, result in scenarios.items():
+            for path, s in result['endpoints'].items():
+                print(f"{server:<9}{scenario:<14}{path:<28}{s['requests']:>5}{s['error_rate'] * 100:>7.1f}"
+                      f"{s['rps']:>8}{str(s['p50_ms']):>9}{str(s['p95_ms']):>9}{str(s['p99_ms']):>9}"
+                      f"{str(s['cpu_ms_per_request']):>9}")
+            utilisation = result['server_cpu_utilisation']
+            print(f"{'':<23}server CPU {result['server_cpu_seconds']} s over {result['wall_seconds']} s"
+                  + (f" ({utilisation * 100:.0f}% of {os.cpu_count()} cores)" if utilisation is not None else ''))
+
+
+def print_comparison(runs, baseline):
+    """p95 and throughput of this run against a saved one, for endpoints in both"""
+    print("\n" + "=" * 78)
+    print(f"COMPARED WITH {baseline.get('created_at', '?')}")
+    print("=" * 78)
+    for server, scenarios in runs.items():
+        for scenario, result in scenarios.items():
+            old = baseline.get('runs', {}).get(server, {}).get(scenario)
+            if not old:
+                continue
+            for path, s in result['endpoints'].items():
+                o = old['endpoints'].get(path)
+                if not o or not o['p95_ms'] or not s['p95_ms'] or not o['rps']:
+                    continue
+                print(f"{server:<9}{scenario:<14}{path:<28}p95 {o['p95_ms']:>8} -> {s['p95_ms']:<8} "
+                      f"({s['p95_ms'] / o['p95_ms']:.2f}x)  rps {o['rps']} -> {s['rps']} "
+                      f"({s['rps'] / o['rps']:.2f}x)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Load test the OCR servers')
+    parser.add_argument('--servers', default='flask,asgi', help=f"Comma-separated: {', '.join(SERVERS)}")
+    parser.add_argument('--scenarios', default='mixed', help=f"Comma-separated: {', '.join(SCENARIOS)}")
+    parser.add_argument('--images', nargs='*', default=[], help='Image names to replay (default: all of test_images)')
+    parser.add_argument('--image', help='Replay just this image file')
+    parser.add_argument('--requests', type=int, help='Requests per scenario (default: per scenario)')
+    parser.add_argument('--concurrency', type=int, default=8, help='Client requests in flight at most')
+    parser.add_argument('--rate', type=float, help='Poisson arrivals per second instead of the scenario pattern')
+    parser.add_argument('--burst-size', type=int, help='camera-burst: scans per burst')
+    parser.add_argument('--burst-interval', type=float, help='camera-burst: seconds between bursts')
+    parser.add_argument('--batch-size', type=int, help='batch-ingest: images per upload')
+    parser.add_argument('--profile', help="Pipeline profile for OCR requests ('' = server default)")
+    parser.add_argument('--warmup', type=int, default=2, help='Unmeasured requests before each scenario')
+    parser.add_argument('--output', help='Write the results as JSON to this file')
+    parser.add_argument('--compare', help='Print deltas against a previous --output file')
+    args = parser.parse_args()
+
+    servers = args.servers.split(',')
+    scenarios = args.scenarios.split(',')
+    unknown = [s for s in servers if s not in SERVERS] + [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown server/scenario: {', '.join(unknown)}")
+
+    paths = [args.image] if args.image else benchmark.list_images(args.images)
+    if not paths:
+        parser.error('no images to replay')
+    images = []
+    for path in paths:
+        with open(path, 'rb') as f:
+            images.append((os.path.basename(path), f.read()))
+
+    runs = {}
+    for name in servers:
+        # Several servers share port 5002; run them one at a time
+        port = SERVERS[name]['port']
+        base_url = f'http://127.0.0.1:{port}'
+        proc = start_server(name, port)
+        try:
+            if not wait_until_healthy(base_url):
+                print(f"✗ {name}: server did not become healthy")
+                continue
+            for scenario in scenarios:
+                if 'batch' in SCENARIOS[scenario]['mix'] and not SERVERS[name]['batch']:
+                    print(f"- {name}: no batch route, skipping {scenario}")
+                    continue
+                print(f"▶ {name}: {scenario} ({SCENARIOS[scenario]['description']}), {len(images)} images")
+                runs.setdefault(name, {})[scenario] = run_scenario(name, proc, base_url, scenario, images, args)
+        finally:
+            stop_server(proc)
+
+    print_report(runs)
+
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(runs, json.load(f))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump({
+                'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+                'host': {'cpu_count': os.cpu_count(), 'platform': platform.platform(), 'python': platform.python_version()},
+                'images': [name for name, _ in images],
+                'args': vars(args),
+                'runs': runs
+            }, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
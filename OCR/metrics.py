@@ -0,0 +1,433 @@
+"""
+Prometheus metrics for the OCR servers
+A small in-process registry (counters, histograms, callback gauges) that
+renders the Prometheus text format on /metrics. Recording a sample is a
+perf_counter() read, a bisect and a locked add, so instrumentation stays
+on in production.
+
+What is measured:
+- ocr_stage_seconds{stage, variant}: decode, every preprocessing variant,
+  text selection, parsing, scoring, get_text strategies
+- ocr_tesseract_pass_seconds / ocr_tesseract_passes_total{variant, psm}
+- per request: wall time, CPU seconds and the number of Tesseract
+  invocations. CPU is the request thread's time, plus the time of batch
+  threads working for it (charge()), plus the Tesseract subprocesses its
+  passes ran - nearly all of an OCR request's CPU. Tesseract CPU is the
+  RUSAGE_CHILDREN delta across each pass: exact where passes do not
+  overlap in one process (pool and pre-forked workers), shared out
+  approximately between requests running passes at the same time
+- coalescing hit ratio and admission queue depth (callback gauges)
+
+stage() and tesseract_pass() also open a tracing span, so the same
+instrumentation feeds the per-request trace (see tracing.py).
+
+Each process has its own registry. Pool workers ship their samples back
+with every result (drain/merge, see ocr_worker.instrumented); pre-forked
+workers each report their own counts on /metrics.
+"""
+
+import bisect
+import contextvars
+import functools
+import threading
+import time
+
+try:
+    import resource
+except ImportError:  # Windows: no child rusage, Tesseract CPU is not counted
+    resource = None
+from contextlib import contextmanager
+
+import tracing
+
+
+LATENCY_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+PASS_COUNT_BUCKETS = (0, 1, 2, 4, 6, 8, 12, 18, 24, 36)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class Metric:
+    kind = 'untyped'
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, '')) for name in self.labelnames)
+
+    def header(self):
+        return [f'# HELP {self.name} {self.help}', f'# TYPE {self.name} {self.kind}']
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}'
+                for key, value in items]
+
+    def drain(self):
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            data = self._values.get(key)
+            if data is None:
+                data = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            data[0][index] += 1
+            data[1] += value
+            data[2] += 1
+
+    def render(self):
+        with self._lock:
+            items = sorted((key, [list(data[0]), data[1], data[2]]) for key, data in self._values.items())
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(float(bound))}"'
+                lines.append(f'{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}')
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_format_value(round(total, 6))}')
+            lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+    def drain(self):
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values):
+        with self._lock:
+            for key, (counts, total, count) in values.items():
+                data = self._values.get(key)
+                if data is None:
+                    data = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+                for i, bucket_count in enumerate(counts):
+                    data[0][i] += bucket_count
+                data[1] += total
+                data[2] += count
+
+
+class CallbackMetric(Metric):
+    """Values read at scrape time from callbacks returning [(labels dict, value)]"""
+
+    def __init__(self, name, help_text, labelnames=(), kind='gauge'):
+        super().__init__(name, help_text, labelnames)
+        self.kind = kind
+        self.callbacks = []
+
+    def render(self):
+        lines = []
+        for callback in list(self.callbacks):
+            try:
+                samples = callback()
+            except Exception as e:
+                print(f"[metrics] {self.name} callback failed: {e}")
+                continue
+            for labels, value in samples:
+                key = self._key(labels)
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter, name, help_text, labelnames)
+
+    def histogram(self, name, help_text, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram, name, help_text, labelnames, buckets)
+
+    def callback(self, name, help_text, labelnames=(), kind='gauge'):
+        return self._register(CallbackMetric, name, help_text, labelnames, kind)
+
+    def render(self):
+        lines = []
+        for metric in list(self._metrics.values()):
+            samples = metric.render()
+            if samples:
+                lines.extend(metric.header())
+                lines.extend(samples)
+        return '\n'.join(lines) + '\n'
+
+    def drain(self):
+        """Take (and reset) all counter/histogram samples, e.g. to ship from a pool worker"""
+        return {
+            name: metric.drain() for name, metric in list(self._metrics.items())
+            if isinstance(metric, (Counter, Histogram))
+        }
+
+    def merge(self, samples):
+        """Add samples drained from another process"""
+        for name, values in (samples or {}).items():
+            metric = self._metrics.get(name)
+            if metric is not None and values:
+                metric.merge(values)
+
+
+registry = Registry()
+
+STAGE_SECONDS = registry.histogram(
+    'ocr_stage_seconds', 'Time spent in each OCR pipeline stage', ('stage', 'variant'))
+TESSERACT_SECONDS = registry.histogram(
+    'ocr_tesseract_pass_seconds', 'Duration of one Tesseract invocation', ('variant', 'psm'))
+TESSERACT_PASSES = registry.counter(
+    'ocr_tesseract_passes_total', 'Tesseract invocations', ('variant', 'psm'))
+REQUEST_SECONDS = registry.histogram(
+    'ocr_request_seconds', 'Request wall time', ('route',))
+REQUEST_CPU_SECONDS = registry.histogram(
+    'ocr_request_cpu_seconds', 'CPU seconds of the request: its threads plus its Tesseract subprocesses', ('route',))
+REQUEST_TESSERACT_CPU_SECONDS = registry.histogram(
+    'ocr_request_tesseract_cpu_seconds', 'CPU seconds of the Tesseract subprocesses the request ran', ('route',))
+REQUEST_TESSERACT_PASSES = registry.histogram(
+    'ocr_request_tesseract_passes', 'Tesseract invocations per request', ('route',), PASS_COUNT_BUCKETS)
+REQUESTS = registry.counter(
+    'ocr_requests_total', 'Requests served', ('route', 'status'))
+ADMISSION_WAIT_SECONDS = registry.histogram(
+    'ocr_admission_wait_seconds', 'Time spent queued for an admission slot', ('lane',))
+
+
+# ==================== per-request accounting ====================
+_current_request = contextvars.ContextVar('ocr_request', default=None)
+
+
+def children_cpu():
+    """CPU seconds of this process's finished child processes (Tesseract runs)"""
+    if resource is None:
+        return 0.0
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+class RequestScope:
+    """Wall time, CPU time and Tesseract passes of one request"""
+
+    def __init__(self, route):
+        self.route = route
+        self.tesseract_passes = 0
+        # CPU of other threads working for the request, and of its Tesseract runs
+        self.helper_cpu = 0.0
+        self.tesseract_cpu = 0.0
+        self.started = time.perf_counter()
+        self.cpu_started = time.thread_time()
+        self._lock = threading.Lock()
+        self._token = _current_request.set(self)
+
+    def add_cpu(self, helper=0.0, tesseract=0.0):
+        with self._lock:
+            self.helper_cpu += helper
+            self.tesseract_cpu += tesseract
+
+    def finish(self, status=200):
+        thread_cpu = time.thread_time() - self.cpu_started
+        REQUEST_SECONDS.observe(time.perf_counter() - self.started, route=self.route)
+        REQUEST_CPU_SECONDS.observe(thread_cpu + self.helper_cpu + self.tesseract_cpu, route=self.route)
+        REQUEST_TESSERACT_CPU_SECONDS.observe(self.tesseract_cpu, route=self.route)
+        REQUEST_TESSERACT_PASSES.observe(self.tesseract_passes, route=self.route)
+        REQUESTS.inc(route=self.route, status=status)
+        try:
+            _current_request.reset(self._token)
+        except ValueError:
+            _current_request.set(None)  # finished from another context (e.g. a closing stream)
+
+
+@contextmanager
+def request_scope(route):
+    scope = RequestScope(route)
+    status = 500
+    try:
+        yield scope
+        status = 200
+    finally:
+        scope.finish(status)
+
+
+def current_request():
+    """The RequestScope of the request being served in this context, or None"""
+    return _current_request.get()
+
+
+@contextmanager
+def charge(scope):
+    """
+    Count this thread's CPU and Tesseract passes against scope (a request
+    served by another thread, e.g. a batch item on the batch pool)
+    """
+    if scope is None:
+        yield
+        return
+    token = _current_request.set(scope)
+    started = time.thread_time()
+    try:
+        yield
+    finally:
+        scope.add_cpu(helper=time.thread_time() - started)
+        _current_request.reset(token)
+
+
+@contextmanager
+def stage(name, variant=''):
+    """Time one pipeline stage (histogram + trace span)"""
+    started = time.perf_counter()
+    try:
+        with tracing.span(f'{name}.{variant}' if variant else name):
+            yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=name, variant=variant)
+
+
+def timed_stage(name):
+    """Decorator form of stage() for whole functions"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def tesseract_pass(variant, config=''):
+    """Time one Tesseract call and count it against the current request"""
+    psm = config.replace('--psm', '').strip() or 'default'
+    started = time.perf_counter()
+    cpu_started = children_cpu()
+    try:
+        with tracing.span(f'tesseract.{variant}.psm{psm}', variant=variant, psm=psm):
+            yield
+    finally:
+        TESSERACT_SECONDS.observe(time.perf_counter() - started, variant=variant, psm=psm)
+        TESSERACT_PASSES.inc(variant=variant, psm=psm)
+        scope = _current_request.get()
+        if scope is not None:
+            scope.tesseract_passes += 1
+            scope.add_cpu(tesseract=children_cpu() - cpu_started)
+
+
+# ==================== gauges for shared components ====================
+def register_coalescing(flight, source):
+    """Coalescing counters and hit ratio of a SingleFlight"""
+    registry.callback(
+        'ocr_coalescing_executions_total', 'Computations actually run', ('source',), 'counter'
+    ).callbacks.append(lambda: [({'source': source}, flight.executed)])
+    registry.callback(
+        'ocr_coalesced_requests_total', 'Requests served by another request\'s computation', ('source',), 'counter'
+    ).callbacks.append(lambda: [({'source': source}, flight.coalesced)])
+
+    def hit_ratio():
+        total = flight.executed + flight.coalesced
+        return [({'source': source}, flight.coalesced / total if total else 0.0)]
+    registry.callback(
+        'ocr_coalescing_hit_ratio', 'Share of requests answered by an in-flight computation', ('source',)
+    ).callbacks.append(hit_ratio)
+
+
+def register_admission(admission, source):
+    """Queue depth, running count and rejections per lane of an AdmissionController"""
+    def per_lane(attribute):
+        def samples():
+            return [
+                ({'source': source, 'lane': name}, lane_stats[attribute])
+                for name, lane_stats in admission.stats()['lanes'].items()
+            ]
+        return samples
+
+    for name, attribute, help_text, kind in (
+        ('ocr_admission_queue_depth', 'queued', 'Requests waiting for an admission slot', 'gauge'),
+        ('ocr_admission_running', 'running', 'Requests holding an admission slot', 'gauge'),
+        ('ocr_admission_rejected_total', 'rejected', 'Requests rejected with 429 (queue full or estimated wait past the deadline)', 'counter'),
+        ('ocr_admission_timed_out_total', 'timed_out', 'Requests rejected with 429 (wait timeout)', 'counter'),
+    ):
+        registry.callback(name, help_text, ('source', 'lane'), kind).callbacks.append(per_lane(attribute))
+
+
+def instrument_flask(app):
+    """Per-request accounting for every route plus a /metrics endpoint"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_request_metrics():
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        g.metrics_scope = RequestScope(route)
+
+    @app.after_request
+    def _record_status(response):
+        g.metrics_status = response.status_code
+        if response.is_streamed:
+            # The view returns before a streamed body (and its CPU) runs: finish on close
+            scope = g.pop('metrics_scope', None)
+            if scope is not None:
+                response.call_on_close(lambda: scope.finish(response.status_code))
+        return response
+
+    @app.teardown_request
+    def _finish_request_metrics(error=None):
+        scope = g.pop('metrics_scope', None)
+        if scope is not None:
+            scope.finish(500 if error is not None else g.pop('metrics_status', 200))
+
+    def metrics_endpoint():
+        return Response(registry.render(), mimetype=CONTENT_TYPE)
+
+    app.add_url_rule('/metrics', 'metrics', metrics_endpoint, methods=['GET'])
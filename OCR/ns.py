@@ -3,6 +3,7 @@ import numpy as np
 import pytesseract
 import re
 from PIL import Image
+from metrics import tesseract_pass
 
 def get_ns_text(image):
     """Simple OCR without NLTK dependency"""
@@ -17,7 +18,8 @@ def get_ns_text(image):
         _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
         
         # OCR
-        text = pytesseract.image_to_string(thresh, lang='eng')
+        with tesseract_pass('ns'):
+            text = pytesseract.image_to_string(thresh, lang='eng')
         return text.strip()
     except Exception as e:
         print(f"OCR error: {e}")
@@ -0,0 +1,322 @@
+"""
+Nutrient rule table and the single-pass scanner compiled from it
+One declarative table (label spellings, units, per-100 g sanity ranges,
+decimal recovery) shared by every nutrition parser:
+enhanced_ocr_pipeline.nlp_postprocess, simple_api.extract_nutrition and
+parse_with_validation in test_ocr_simple / test_ocr_simple_fixed.
+
+All labels are compiled into one regex, factored as a trie so each text
+position is rejected on its first character, and the text is lowercased
+once - so it is traversed once for every nutrient instead of once (and
+lowercased once) per nutrient. The value after each label is then matched
+in place: an optional bracketed unit ("Protein (g)"), a short separator,
+the number and an optional unit. A number that lies past the next label
+belongs to that label, not this one.
+
+Misspelt labels ('Protien', 'Sodlum', 'Soturated Fat') are not listed:
+the text's words are corrected by fuzzy_index before the labels are
+matched, as table_parser does for its row labels.
+
+Each parser keeps its own keys and output format; NutrientScanner picks
+the nutrients it reports and whether values are normalized (canonical
+unit, decimal recovery, sanity range) or returned as printed.
+"""
+
+import re
+
+from fuzzy_index import food_index
+from keyword_matcher import trie_pattern
+
+
+# canonical unit, accepted units, label spellings (a space matches any run of
+# spaces/colons, so 'total fat' also covers 'totalfat' and 'total: fat'),
+# plausible range per 100 g in the canonical unit, and whether a value above
+# the range is tried /10 and /100 (OCR dropping the decimal point: 5269 -> 52.69)
+NUTRIENT_RULES = {
+    'energy': {
+        'unit': 'kcal',
+        'units': ('kcal', 'kj', 'cal'),
+        'names': ('energy', 'ener', 'calories', 'calorie'),
+        'range': (0, 900),
+        'recover': True,
+    },
+    'protein': {
+        'unit': 'g',
+        'units': ('g', 'mg'),
+        'names': ('protein', 'proteins', 'prt'),
+        'range': (0, 100),
+        'recover': True,
+    },
+    'carbohydrate': {
+        'unit': 'g',
+        'units': ('g', 'mg'),
+        'names': ('carbohydrate', 'carbohydrates', 'total carbohydrate', 'carbs'),
+        'range': (0, 100),
+        'recover': True,
+    },
+    'total_fat': {
+        'unit': 'g',
+        'units': ('g', 'mg'),
+        'names': ('total fat', 'fat total', 'fat', 'fats'),
+        'range': (0, 100),
+        'recover': True,
+    },
+    'saturated_fat': {
+        'unit': 'g',
+        'units': ('g', 'mg'),
+        'names': ('saturated fat', 'saturated fatty acids', 'saturates', 'saturated'),
+        'range': (0, 100),
+        'recover': True,
+    },
+    'trans_fat': {
+        'unit': 'g',
+        'units': ('g', 'mg'),
+        'names': ('trans fat', 'trans fatty acids', 'trans'),
+        'range': (0, 10),
+        'recover': True,
+    },
+    'total_sugar': {
+        'unit': 'g',
+        'units': ('g', 'mg'),
+        'names': ('total sugars', 'total sugar', 'sugars', 'sugar'),
+        'range': (0, 100),
+        'recover': True,
+    },
+    'added_sugar': {
+        'unit': 'g',
+        'units': ('g', 'mg'),
+        'names': ('added sugars', 'added sugar'),
+        'range': (0, 100),
+        'recover': True,
+    },
+    'fiber': {
+        'unit': 'g',
+        'units': ('g', 'mg'),
+        'names': ('dietary fibre', 'dietary fiber', 'fibre', 'fiber', 'fibres', 'fibers'),
+        'range': (0, 50),
+        'recover': True,
+    },
+    'sodium': {
+        'unit': 'mg',
+        'units': ('mg', 'g', 'mcg'),
+        'names': ('sodium',),
+        'range': (0, 40000),
+        'recover': False,
+    },
+    'cholesterol': {
+        'unit': 'mg',
+        'units': ('mg', 'g', 'mcg'),
+        'names': ('cholesterol',),
+        'range': (0, 1500),
+        'recover': True,
+    },
+    'iron': {
+        'unit': 'mg',
+        'units': ('mg', 'g', 'mcg'),
+        'names': ('iron',),
+        'range': (0, 100),
+        'recover': True,
+    },
+    'calcium': {
+        'unit': 'mg',
+        'units': ('mg', 'g', 'mcg'),
+        'names': ('calcium',),
+        'range': (0, 2000),
+        'recover': True,
+    },
+}
+
+# Printed unit spellings (and OCR misreads inside brackets: "(9)") -> unit
+UNIT_ALIASES = {
+    'kcal': 'kcal', 'kcals': 'kcal', 'cal': 'cal', 'kj': 'kj',
+    'g': 'g', 'gm': 'g', 'gms': 'g', '9': 'g',
+    'mg': 'mg', 'mcg': 'mcg', 'µg': 'mcg', 'ug': 'mcg',
+}
+
+# Factor from a unit to each canonical unit ('cal' on labels means kcal)
+UNIT_SCALE = {
+    'kcal': {'kcal': 1, 'cal': 1, 'kj': 1 / 4.184},
+    'g': {'g': 1, 'mg': 0.001},
+    'mg': {'mg': 1, 'g': 1000, 'mcg': 0.001},
+}
+
+RECOVERY_DIVISORS = (10, 100)
+
+# A decimal point (or decimal comma) inside a printed number
+DECIMAL_POINT = re.compile(r'\d[.,]\d')
+
+
+LABEL_SEPARATOR = re.compile(r'[\s:]+')
+
+
+def _compile_labels():
+    """Label regex over lowercased text, plus label without separators -> nutrient"""
+    names = [name for rule in NUTRIENT_RULES.values() for name in rule['names']]
+    nutrients = {
+        name.replace(' ', ''): nutrient for nutrient, rule in NUTRIENT_RULES.items() for name in rule['names']
+    }
+    return re.compile(r'\b' + trie_pattern(names, space=r'[\s:]*') + r'\b'), nutrients
+
+
+LABEL_RE, LABEL_NUTRIENTS = _compile_labels()
+
+VALUE_RE = re.compile(
+    r'(?:\s*\((?P<bracket>[^()\n]{1,12})\))?'      # "Protein (g)", "Energy (kcal)"
+    r'[^\d]{0,12}'                                   # separator: ':', '=', '.....', 'per 100 g' text
+    r'(?P<number>\d[\d,.]{0,8})'
+    r'(?:\s*(?P<unit>kcals?|kj|cal|mcg|µg|mg|gms?|g)(?![a-z]))?'
+)
+
+
+def parse_number(token):
+    """Parse a numeric token returned by OCR, handling commas and common OCR smashes.
+
+    Returns a tuple (value: float, raw_unit: str|None)
+    """
+    if token is None:
+        return None, None
+
+    s = str(token).lower().strip()
+    # remove stray plus/minus
+    s = re.sub(r"[^0-9\.,kgm]", "", s)
+
+    # unit detection
+    unit = None
+    if s.endswith('mg'):
+        unit = 'mg'
+        s = s[:-2]
+    elif s.endswith('g'):
+        unit = 'g'
+        s = s[:-1]
+
+    # Normalize comma as thousand/decimal depending on context
+    # If more than one comma, remove thousands commas
+    if s.count(',') > 1:
+        s = s.replace(',', '')
+    # If there's a comma and no dot, treat comma as decimal
+    if ',' in s and '.' not in s:
+        s = s.replace(',', '.')
+
+    try:
+        val = float(s)
+    except Exception:
+        # fallback: remove non-digits and try
+        digits = re.sub(r'[^0-9.]', '', s)
+        if digits == '':
+            return None, unit
+        try:
+            val = float(digits)
+        except ValueError:
+            return None, unit
+
+    return val, unit
+
+
+def format_amount(value):
+    """12.0 -> '12', 0.50 -> '0.5'"""
+    return f"{value:f}".rstrip('0').rstrip('.')
+
+
+class NutrientHit:
+    """One nutrient found in the text"""
+
+    def __init__(self, nutrient, value, unit, start, end, recovered=False, printed=None, has_decimal=True):
+        self.nutrient = nutrient
+        self.value = value
+        self.unit = unit
+        self.start = start
+        self.end = end
+        # True when the decimal point was put back (5269 -> 52.69): lower confidence
+        self.recovered = recovered
+        # Value as printed (in `unit`, before any decimal recovery), and whether the
+        # printed number had a decimal point - if it did, none can have been lost
+        self.printed = value if printed is None else printed
+        self.has_decimal = has_decimal
+
+    def __repr__(self):
+        return f"NutrientHit({self.nutrient}={format_amount(self.value)} {self.unit or ''})"
+
+
+class NutrientScanner:
+    """
+    Finds the first plausible value of each wanted nutrient in one pass
+
+    nutrients: canonical names to report (default: all of NUTRIENT_RULES).
+    Labels of the other nutrients are still recognised, so 'saturated fat 2 g'
+    is never read as total fat.
+    require_unit: skip values printed without a unit (after the number or in brackets)
+    normalize: convert to the canonical unit, recover dropped decimal points and
+    skip values outside the sanity range; otherwise values are returned as printed
+    correct: correct misspelt words (fuzzy_index) before matching labels
+    """
+
+    def __init__(self, nutrients=None, require_unit=False, normalize=True, correct=True):
+        unknown = set(nutrients or ()) - set(NUTRIENT_RULES)
+        if unknown:
+            raise ValueError(f"Unknown nutrients: {', '.join(sorted(unknown))}")
+        self.nutrients = frozenset(nutrients or NUTRIENT_RULES)
+        self.require_unit = require_unit
+        self.normalize = normalize
+        self.correct = correct
+
+    def scan(self, text):
+        """
+        {nutrient: NutrientHit} for the wanted nutrients found in text (offsets
+        into text.lower(), after correction)
+        """
+        # Misspelt labels are corrected first, so 'Soturated Fat 2 g' is never read as fat
+        return self._scan(food_index().correct_text(text) if self.correct else text.lower())
+
+    def _scan(self, text):
+        found = {}
+        labels = list(LABEL_RE.finditer(text))
+        for i, label in enumerate(labels):
+            nutrient = LABEL_NUTRIENTS[LABEL_SEPARATOR.sub('', label.group())]
+            if nutrient in found or nutrient not in self.nutrients:
+                continue
+            value = VALUE_RE.match(text, label.end())
+            if not value:
+                continue
+            # A number past the next label is that label's value
+            if i + 1 < len(labels) and value.start('number') >= labels[i + 1].start():
+                continue
+            hit = self._hit(nutrient, value)
+            if hit is not None:
+                found[nutrient] = hit
+                if len(found) == len(self.nutrients):
+                    break
+        return found
+
+    def _hit(self, nutrient, match):
+        rule = NUTRIENT_RULES[nutrient]
+        amount, _ = parse_number(match.group('number'))
+        if amount is None:
+            return None
+        has_decimal = bool(DECIMAL_POINT.search(match.group('number')))
+
+        unit = match.group('unit') or match.group('bracket')
+        unit = UNIT_ALIASES.get(unit.strip().lower()) if unit else None
+        if unit is not None and unit not in rule['units']:
+            # A bracket that is not a unit ("(approx)") is no unit; a printed one for
+            # another kind of nutrient ("5 kcal" after protein) is a misread
+            if match.group('unit'):
+                return None
+            unit = None
+        if unit is None and self.require_unit:
+            return None
+
+        if not self.normalize:
+            return NutrientHit(nutrient, amount, unit, match.start(), match.end(), has_decimal=has_decimal)
+
+        value = printed = amount * UNIT_SCALE[rule['unit']].get(unit or rule['unit'], 1)
+        low, high = rule['range']
+        recovered = False
+        if value > high and rule['recover']:
+            for divisor in RECOVERY_DIVISORS:
+                if low <= value / divisor <= high:
+                    value /= divisor
+                    recovered = True
+                    break
+        if not low <= value <= high:
+            return None
+        return NutrientHit(nutrient, value, rule['unit'], match.start(), match.end(), recovered, printed, has_decimal)
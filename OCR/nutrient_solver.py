@@ -0,0 +1,188 @@
+"""
+Cross-nutrient consistency solver for decimal placement
+OCR drops decimal points ("5.2 g" read as "52 g"), and the parsers used to
+guess each nutrient on its own: divide by 10 or 100 when a value is above
+its range, or /100 whenever a proximity-read value reached 100. A protein
+of 52 g passes that test, even when the rest of the panel says 5.2.
+
+solve() takes every nutrient of one label together. Each value printed
+without a decimal point may have lost one, so its candidates are the value
+/1, /10 and /100 that fall in the nutrient's range (nutrient_rules); values
+printed with a decimal point are fixed. Every combination of candidates is
+scored against what a per-100 g panel must satisfy:
+- energy ~ 4 * protein + 4 * carbohydrate + 9 * fat (Atwater factors)
+- protein + carbohydrate + fat <= 100 g
+- saturated + trans fat <= total fat, added <= total sugar <= carbohydrate
+plus a small cost per assumed lost decimal point, so the printed reading
+wins whenever it is consistent, and a smaller one per value outside what
+most packaged foods print (TYPICAL_RANGES), which breaks ties between
+equally many corrections: "Protein 32, Carbohydrate 80" fails the macro
+sum either as 3.2 + 80 or 32 + 8.0, and 32 g of protein is the rarer
+label. When no combination satisfies the checks, or two readings still
+score the same, the label is flagged for a targeted re-OCR of its
+nutrition table.
+"""
+
+from itertools import product
+
+from nutrient_rules import NUTRIENT_RULES, RECOVERY_DIVISORS, UNIT_SCALE, NutrientHit
+
+# kcal per g
+ENERGY_FACTORS = {'protein': 4, 'carbohydrate': 4, 'total_fat': 9}
+# Declared energy may differ from the Atwater estimate by this fraction
+# (rounding, fibre, polyols) and still count as consistent
+ENERGY_TOLERANCE = 0.25
+# Score per unit of relative energy deviation
+ENERGY_WEIGHT = 10.0
+# Grams per 100 g the macros may exceed 100 by (label rounding)
+MACRO_SLACK = 2.0
+# (parts, whole): the parts together may not exceed the whole
+PARTS = (
+    (('saturated_fat', 'trans_fat'), 'total_fat'),
+    (('added_sugar',), 'total_sugar'),
+    (('total_sugar',), 'carbohydrate'),
+)
+PART_SLACK = 0.5
+# Cost of assuming the decimal point was lost, per divisor
+DIVISOR_COST = {1: 0.0, 10: 1.0, 100: 1.5}
+# Per-100 g values most packaged foods stay within; a value outside still
+# passes the checks but costs ATYPICAL_COST, less than one lost decimal point
+TYPICAL_RANGES = {
+    'protein': (0, 30),
+    'total_fat': (0, 60),
+    'saturated_fat': (0, 40),
+    'trans_fat': (0, 2),
+}
+ATYPICAL_COST = 0.5
+# Scores closer than this are a tie
+TIE_TOLERANCE = 1e-6
+# Score of each failed check: any failure outweighs every correction cost
+VIOLATION_COST = 100.0
+
+# Nutrients the checks involve; the others keep the value the parser chose
+SOLVED_NUTRIENTS = frozenset(ENERGY_FACTORS) | {'energy'} | {n for parts, whole in PARTS for n in (*parts, whole)}
+
+
+class Solution:
+    """The most consistent reading of one label's nutrients"""
+
+    def __init__(self, values, divisors, violations, checked, ambiguous=False):
+        # {nutrient: value}, including nutrients the checks do not involve
+        self.values = values
+        # {nutrient: divisor} for the values whose decimal point was put back
+        self.divisors = divisors
+        # Checks the chosen values still fail ('energy', 'macros', 'saturated_fat+trans_fat<=total_fat')
+        self.violations = violations
+        # False when too few nutrients were read for any check to apply
+        self.checked = checked
+        # True when another reading with different values scored the same
+        self.ambiguous = ambiguous
+
+    @property
+    def consistent(self):
+        return not self.violations
+
+    @property
+    def needs_reocr(self):
+        """No reading of the table satisfies the checks, or two do equally: OCR the table region again"""
+        return self.checked and (not self.consistent or self.ambiguous)
+
+
+def candidates(hit):
+    """(value, divisor) readings of a hit, the printed one first"""
+    rule = NUTRIENT_RULES[hit.nutrient]
+    low, high = rule['range']
+    found = [(hit.printed, 1)] if low <= hit.printed <= high else []
+    if not hit.has_decimal and rule['recover']:
+        found += [(hit.printed / d, d) for d in RECOVERY_DIVISORS if low <= hit.printed / d <= high]
+    # Nothing in range: keep what the parser chose
+    return found or [(hit.value, 1)]
+
+
+def cost(nutrient, value, divisor):
+    """Score of reading a nutrient as value, before the checks"""
+    low, high = TYPICAL_RANGES.get(nutrient, (0, float('inf')))
+    return DIVISOR_COST[divisor] + (0.0 if low <= value <= high else ATYPICAL_COST)
+
+
+def check(values):
+    """(failed checks, relative energy deviation) of one combination of values"""
+    violations = []
+    macros = [values[n] for n in ENERGY_FACTORS if n in values]
+    if sum(macros) > 100 + MACRO_SLACK:
+        violations.append('macros')
+
+    for parts, whole in PARTS:
+        present = [values[n] for n in parts if n in values]
+        if present and whole in values and sum(present) > values[whole] + PART_SLACK:
+            violations.append(f"{'+'.join(parts)}<={whole}")
+
+    deviation = 0.0
+    if 'energy' in values and macros:
+        estimate = sum(factor * values[n] for n, factor in ENERGY_FACTORS.items() if n in values)
+        if len(macros) == len(ENERGY_FACTORS):
+            deviation = abs(values['energy'] - estimate) / max(values['energy'], estimate, 1)
+        else:
+            # Missing macros only add energy: the estimate is a lower bound
+            deviation = max(estimate - values['energy'], 0) / max(estimate, 1)
+        if deviation > ENERGY_TOLERANCE:
+            violations.append('energy')
+    return violations, deviation
+
+
+def applies(nutrients):
+    """True if at least one check involves two of nutrients"""
+    macros = sum(n in nutrients for n in ENERGY_FACTORS)
+    if macros >= 2 or (macros and 'energy' in nutrients):
+        return True
+    return any(whole in nutrients and any(p in nutrients for p in parts) for parts, whole in PARTS)
+
+
+def solve(hits):
+    """Solution for {nutrient: nutrient_rules.NutrientHit} (values in canonical units)"""
+    values = {nutrient: hit.value for nutrient, hit in hits.items()}
+    solved = [nutrient for nutrient in hits if nutrient in SOLVED_NUTRIENTS]
+    if not applies(solved):
+        return Solution(values, {}, [], False)
+
+    best = None
+    # Values of every reading that ties with the best so far
+    tied = []
+    for combination in product(*(candidates(hits[n]) for n in solved)):
+        score = sum(cost(n, value, divisor) for n, (value, divisor) in zip(solved, combination))
+        # Checks only add to the score: skip those that cannot win or tie
+        if best is not None and score > best[0] + TIE_TOLERANCE:
+            continue
+        violations, deviation = check(dict(zip(solved, (value for value, _ in combination))))
+        score += VIOLATION_COST * len(violations) + ENERGY_WEIGHT * deviation
+        readings = tuple(value for value, _ in combination)
+        if best is None or score < best[0] - TIE_TOLERANCE:
+            best = (score, combination, violations)
+            tied = [readings]
+        elif score <= best[0] + TIE_TOLERANCE:
+            tied.append(readings)
+
+    _, combination, violations = best
+    divisors = {}
+    for nutrient, (value, divisor) in zip(solved, combination):
+        values[nutrient] = value
+        if divisor != 1:
+            divisors[nutrient] = divisor
+    return Solution(values, divisors, violations, True, ambiguous=len(set(tied)) > 1)
+
+
+def solve_printed(hits):
+    """
+    solve() for hits in their printed units (NutrientScanner(normalize=False)):
+    checked in canonical units, so "1046 kJ" is 250 kcal, and returned as
+    printed, divided only where a decimal point was put back
+    """
+    canonical = {}
+    for nutrient, hit in hits.items():
+        unit = NUTRIENT_RULES[nutrient]['unit']
+        scale = UNIT_SCALE[unit].get(hit.unit or unit, 1)
+        canonical[nutrient] = NutrientHit(nutrient, hit.value * scale, unit, hit.start, hit.end,
+                                          has_decimal=hit.has_decimal)
+    solution = solve(canonical)
+    values = {nutrient: hit.value / solution.divisors.get(nutrient, 1) for nutrient, hit in hits.items()}
+    return Solution(values, solution.divisors, solution.violations, solution.checked, solution.ambiguous)
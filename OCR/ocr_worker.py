@@ -0,0 +1,151 @@
+"""
+OCR work functions executed inside the ASGI server's process pool
+Each worker process imports the OCR stack once and then serves many
+requests. Arguments are raw upload bytes and results are plain dicts, so
+both pickle cheaply between the event loop and the workers.
+"""
+
+
+def init_worker():
+    """
+    Pool initializer: import and warm the OCR stack up front so the first
+    request is not slow. Gemini is left alone - chat runs in the parent.
+    """
+    import api_server
+    import test_ocr_simple
+    api_server.warmup()
+    test_ocr_simple.warmup_ocr()
+
+
+def instrumented(fn, *args):
+    """
+    Run fn(*args) as one traced request and return (result, samples, spans):
+    the worker's counters/histograms since the last task, for the parent to
+    merge into the registry /metrics renders, and this task's trace spans,
+    for the parent to attach to the request's trace
+    """
+    import metrics
+    import tracing
+    trace = tracing.start_trace(fn.__name__)
+    try:
+        with metrics.request_scope(fn.__name__):
+            result = fn(*args)
+    finally:
+        tracing.finish_trace(trace, export=False)
+    return result, metrics.registry.drain(), trace.span_dicts()
+
+
+def profiled(interval, fn, *args):
+    """
+    instrumented(fn, *args) while profiler.sample_call samples this worker:
+    returns its (result, samples, spans) plus the stacks, for the parent's
+    sampler to credit to the request being profiled
+    """
+    import profiler
+    (result, samples, spans), stacks = profiler.sample_call(interval, instrumented, fn, *args)
+    return result, samples, spans, stacks
+
+
+def resolve_profile(name):
+    """The worker's own Profile for a name the parent already validated"""
+    from pipeline_profiles import get_profile
+    return get_profile(name) if name else None
+
+
+# ==================== api_server routes ====================
+# `profile` is a pipeline profile name (see pipeline_profiles.py) or None
+def analyze(img_bytes, profile=None):
+    """/api/ocr/analyze payload"""
+    import api_server
+    return api_server.build_analysis(api_server.decode_image(img_bytes), resolve_profile(profile))
+
+
+def analyze_steps(img_bytes, profile=None):
+    """/api/ocr/analyze-step payload (non-streaming)"""
+    import api_server
+    return api_server.build_step_analysis(api_server.decode_image(img_bytes), resolve_profile(profile))
+
+
+def extract_nutrition(img_bytes, outputs, profile=None):
+    """/api/ocr/extract-nutrition payload for the requested outputs"""
+    import api_server
+    return api_server.extract_nutrition_payload(
+        api_server.decode_image(img_bytes), outputs, resolve_profile(profile)
+    )
+
+
+def extract_ingredients(img_bytes, outputs, profile=None):
+    """/api/ocr/extract-ingredients payload for the requested outputs"""
+    import api_server
+    return api_server.extract_ingredients_payload(
+        api_server.decode_image(img_bytes), outputs, resolve_profile(profile)
+    )
+
+
+# ==================== shared-memory analyze path ====================
+# The parent puts the decoded image in shared memory, one worker builds
+# the preprocessing variants (handed back as shared segments), the
+# variants are OCR'd in parallel and a final task picks the best text
+# (reading the nutrition table from the shared image if it needs to).
+# Only segment handles and text cross the process boundary.
+def preprocess_shared(handle):
+    """
+    Build preprocessing variants from a shared image; returns {method: handle}
+    Each variant is handed off as soon as it is built (iter_preprocessed), so
+    the worker holds one variant at a time, not all six.
+    """
+    import api_server
+    from shm_transport import attach, handoff, release_handoffs
+    
+    shm, img = attach(handle)
+    variants = api_server.ocr.iter_preprocessed(img)
+    handles = {}
+    try:
+        for method, variant in variants:
+            handles[method] = handoff(variant)
+            del variant
+    except Exception:
+        # Nobody will adopt these: unlink before reporting the error
+        release_handoffs(handles.values())
+        raise
+    finally:
+        # The generator holds the image too: let go of it before closing the segment
+        variants.close()
+        del variants, img
+        shm.close()
+    return handles
+
+
+def ocr_variant_shared(method, handle):
+    """Run every PSM pass over one shared variant; returns [(method, config, text)]"""
+    import api_server
+    from shm_transport import attach
+    
+    shm, img = attach(handle)
+    try:
+        return list(api_server.ocr.iter_ocr_passes({method: img}))
+    finally:
+        del img
+        shm.close()
+
+
+def finish_analysis(all_texts, handle):
+    """Select the best pass and build the /api/ocr/analyze payload (handle: the shared decoded image)"""
+    import api_server
+    from shm_transport import attach
+    
+    raw_text = api_server.ocr.select_best_text(all_texts)
+    shm, img = attach(handle)
+    try:
+        structured_data = api_server.ocr.finish(img, raw_text)
+    finally:
+        del img
+        shm.close()
+    return api_server.analysis_from_ocr(structured_data)
+
+
+# ==================== test_ocr_simple routes ====================
+def analyze_generic(img_bytes, profile=None):
+    """/api/analyze/generic (payload, status)"""
+    import test_ocr_simple
+    return test_ocr_simple.analyze_image_bytes(img_bytes, resolve_profile(profile))
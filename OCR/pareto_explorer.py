@@ -0,0 +1,303 @@
+"""
+Pareto explorer for the OCR pass combinations
+Which of the 18 preprocessing variant x PSM passes in extract_raw_text (or
+the cgt/pdf/island/ns paths in OCR.get_text) earn their cost? This runs
+every pass once per labelled image (an image with a golden result, see
+benchmark.py), then scores subsets of passes offline: a subset's output is
+the text the pipeline would pick among just those passes, and its cost is
+the time of those passes plus the preprocessing they need.
+
+Reports the latency/accuracy Pareto frontier and, for the enhanced
+pipeline, writes pipeline_profiles.json with "fast", "balanced" and
+"accurate" pass sets that the servers load.
+
+Usage:
+    python pareto_explorer.py                            # enhanced passes, all labelled images
+    python pareto_explorer.py --max-size 4 --repeat 3
+    python pareto_explorer.py --space get_text           # the OCR.get_text paths
+    python pareto_explorer.py --fast-ratio 0.85 --output pipeline_profiles.json
+
+Subsets of up to --max-size passes are enumerated exhaustively; larger
+ones are reached by greedy forward selection (add the pass with the best
+accuracy gain per millisecond) up to the full set.
+"""
+
+import argparse
+import itertools
+import json
+import os
+import statistics
+import sys
+import time
+
+import benchmark
+
+OCR_DIR = os.path.dirname(os.path.abspath(__file__))
+PROFILES_PATH = os.path.join(OCR_DIR, 'pipeline_profiles.json')
+
+# Profile -> share of the best achievable accuracy it must keep (cheapest such subset wins)
+PROFILE_RATIOS = {'fast': 0.9, 'balanced': 0.97, 'accurate': 1.0}
+
+
+# ==================== measuring ====================
+def timed(fn, repeat):
+    """(median ms, last result) of fn() over `repeat` runs"""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples), result
+
+
+def measure_enhanced(img_bytes, repeat):
+    """
+    Every (variant, PSM) pass over one image
+
+    Returns (base_ms, preprocess_ms, passes): decode + grayscale cost, each
+    variant's own preprocessing cost, and {(method, config): (ms, text)}
+    """
+    import tracing
+    from api_server import decode_image, ocr
+    from enhanced_ocr_pipeline import PREPROCESS_METHODS, PSM_CONFIGS
+    import pytesseract
+
+    decode_ms, img = timed(lambda: decode_image(img_bytes), repeat)
+
+    # Per-variant preprocessing cost from the stage spans of full runs
+    span_runs = []
+    for _ in range(repeat):
+        trace = tracing.start_trace('pareto')
+        preprocessed = ocr.preprocess_for_text_clarity(img)
+        tracing.finish_trace(trace, export=False)
+        span_runs.append({entry['name']: entry['duration_ms'] for entry in trace.summary()})
+    span_ms = {name: statistics.median(run.get(name, 0.0) for run in span_runs) for name in span_runs[0]}
+    base_ms = decode_ms + span_ms.get('preprocess.grayscale', 0.0)
+    preprocess_ms = {method: span_ms.get(f'preprocess.{method}', 0.0) for method in PREPROCESS_METHODS}
+
+    passes = {}
+    for method in PREPROCESS_METHODS:
+        for config in PSM_CONFIGS:
+            ms, text = timed(
+                lambda: pytesseract.image_to_string(preprocessed[method], lang='eng', config=config), repeat
+            )
+            passes[(method, config)] = (ms, text)
+    return base_ms, preprocess_ms, passes
+
+
+def measure_get_text(img_bytes, repeat):
+    """The independent OCR.get_text paths over one image (each does its own preprocessing)"""
+    import cv2
+    import numpy as np
+    from OCR import get_cgt_text, get_island_text, get_pdf_text
+    from ns import get_ns_text
+
+    decode_ms, img = timed(lambda: cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR), repeat)
+    paths = {
+        ('cgt_20', ''): lambda: get_cgt_text(img, 20),
+        ('cgt_100', ''): lambda: get_cgt_text(img, 100),
+        ('pdf', ''): lambda: get_pdf_text(img),
+        ('island', ''): lambda: get_island_text(img),
+        ('ns', ''): lambda: get_ns_text(img),
+    }
+    return decode_ms, {}, {key: timed(fn, repeat) for key, fn in paths.items()}
+
+
+# ==================== scoring ====================
+class Space:
+    """Selection and parsing rules of one pipeline, so subsets pick text the way it does"""
+
+    def __init__(self, name):
+        self.name = name
+        if name == 'enhanced':
+            from api_server import detect_fssai, ocr
+            self.quality = ocr._score_text_quality
+            self.parse = ocr.nlp_postprocess
+            self.fssai = detect_fssai
+            self.measure = measure_enhanced
+        else:
+            from OCR import get_score
+            from test_ocr_simple import detect_fssai, parse_with_validation
+            self.quality = lambda text: get_score(text)[0]
+            self.parse = parse_with_validation
+            self.fssai = detect_fssai
+            self.measure = measure_get_text
+
+    def structured(self, text):
+        result = dict(self.parse(text))
+        result['fssai'] = self.fssai(text)
+        return result
+
+
+class ImageRecord:
+    """One labelled image: costs, each pass's quality score and field counts"""
+
+    def __init__(self, name, space, img_bytes, golden, repeat):
+        self.name = name
+        self.base_ms, self.preprocess_ms, passes = space.measure(img_bytes, repeat)
+        self.cost = {key: ms for key, (ms, _) in passes.items()}
+        # Empty passes are skipped by the pipeline (iter_ocr_passes only yields text)
+        self.quality = {key: space.quality(text) for key, (_, text) in passes.items() if text.strip()}
+        self.counts = {key: benchmark.field_counts(space.structured(text), golden) for key, (_, text) in passes.items()}
+        self.empty_counts = benchmark.field_counts(space.structured(''), golden)
+
+    def chosen(self, subset):
+        """The pass the pipeline would keep from `subset` (first best in pass order)"""
+        best = None
+        for key in subset:
+            if key in self.quality and (best is None or self.quality[key] > self.quality[best]):
+                best = key
+        return best
+
+    def subset_cost(self, subset):
+        methods = {method for method, _ in subset}
+        preprocess = sum(self.preprocess_ms.get(method, 0.0) for method in methods)
+        if 'morphological' in methods and 'otsu' not in methods:
+            preprocess += self.preprocess_ms.get('otsu', 0.0)  # morphological works on the Otsu image
+        return self.base_ms + preprocess + sum(self.cost[key] for key in subset)
+
+
+def evaluate(records, subset):
+    """Mean per-image latency (ms) and overall accuracy of one pass subset"""
+    totals = {}
+    for record in records:
+        key = record.chosen(subset)
+        counts = record.counts[key] if key is not None else record.empty_counts
+        for field, c in counts.items():
+            total = totals.setdefault(field, [0, 0, 0])
+            for i in range(3):
+                total[i] += c[i]
+    fields = {field: benchmark.field_score(field, *c) for field, c in totals.items()}
+    return {
+        'passes': list(subset),
+        'ms': round(statistics.mean(record.subset_cost(subset) for record in records), 1),
+        'accuracy': round(statistics.mean(fields.values()), 4) if fields else 0.0,
+        'fields': fields
+    }
+
+
+def explore(records, all_passes, max_size):
+    """Exhaustive subsets up to max_size, then a greedy path to the full set"""
+    results = {}
+
+    def add(subset):
+        subset = tuple(key for key in all_passes if key in subset)  # canonical pass order
+        if subset and subset not in results:
+            results[subset] = evaluate(records, subset)
+        return results.get(subset)
+
+    for size in range(1, min(max_size, len(all_passes)) + 1):
+        for subset in itertools.combinations(all_passes, size):
+            add(subset)
+
+    current = max((r for r in results.values() if len(r['passes']) == min(max_size, len(all_passes))),
+                  key=lambda r: (r['accuracy'], -r['ms']))
+    chosen = set(map(tuple, current['passes']))
+    while len(chosen) < len(all_passes):
+        candidates = [add(chosen | {key}) for key in all_passes if key not in chosen]
+        best = max(candidates, key=lambda r: ((r['accuracy'] - current['accuracy']) / max(r['ms'] - current['ms'], 1e-3), -r['ms']))
+        chosen = set(map(tuple, best['passes']))
+        current = best
+    return list(results.values())
+
+
+def pareto_frontier(results):
+    """Subsets no other subset beats on both latency and accuracy, cheapest first"""
+    frontier = []
+    for result in sorted(results, key=lambda r: (r['ms'], -r['accuracy'])):
+        if not frontier or result['accuracy'] > frontier[-1]['accuracy']:
+            frontier.append(result)
+    return frontier
+
+
+def pick_profiles(frontier, ratios):
+    best = max(r['accuracy'] for r in frontier)
+    profiles = {}
+    for name, ratio in ratios.items():
+        profile = next(r for r in frontier if r['accuracy'] >= ratio * best - 1e-9)
+        profiles[name] = {
+            'passes': [list(key) for key in profile['passes']],
+            'expected_ms': profile['ms'],
+            'accuracy': profile['accuracy'],
+            'fields': profile['fields']
+        }
+    return profiles
+
+
+# ==================== output ====================
+def label(key):
+    method, config = key
+    return f"{method} {config}".strip()
+
+
+def print_frontier(frontier, total):
+    print("\n" + "=" * 78)
+    print(f"PARETO FRONTIER ({len(frontier)} of {total} subsets evaluated)")
+    print("=" * 78)
+    print(f"{'ms/image':>10}{'accuracy':>10}  passes")
+    print("-" * 78)
+    for result in frontier:
+        print(f"{result['ms']:>10.1f}{result['accuracy']:>10.3f}  " + ', '.join(label(key) for key in result['passes']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Latency/accuracy Pareto frontier of OCR pass combinations')
+    parser.add_argument('images', nargs='*', help='Image names (default: every test image with a golden result)')
+    parser.add_argument('--space', choices=['enhanced', 'get_text'], default='enhanced')
+    parser.add_argument('--repeat', type=int, default=1, help='Timing runs per pass (median)')
+    parser.add_argument('--max-size', type=int, default=3, help='Enumerate all subsets up to this many passes')
+    parser.add_argument('--fast-ratio', type=float, default=PROFILE_RATIOS['fast'])
+    parser.add_argument('--balanced-ratio', type=float, default=PROFILE_RATIOS['balanced'])
+    parser.add_argument('--output', default=PROFILES_PATH, help='Profiles file (enhanced space only)')
+    parser.add_argument('--json', dest='json_path', help='Write every evaluated subset here')
+    args = parser.parse_args()
+
+    images = [path for path in benchmark.list_images(args.images) if benchmark.load_golden(path) is not None]
+    if not images:
+        print("No labelled images (test_images/*_result.json) to explore with")
+        return 1
+
+    space = Space(args.space)
+    records = []
+    for path in images:
+        print(f"Measuring {os.path.basename(path)} ...")
+        with open(path, 'rb') as f:
+            records.append(ImageRecord(os.path.basename(path), space, f.read(), benchmark.load_golden(path), args.repeat))
+
+    all_passes = tuple(records[0].cost)
+    results = explore(records, all_passes, args.max_size)
+    frontier = pareto_frontier(results)
+    print_frontier(frontier, len(results))
+
+    full = evaluate(records, all_passes)
+    print(f"\nAll {len(all_passes)} passes: {full['ms']:.1f} ms/image, accuracy {full['accuracy']:.3f}")
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump({'space': args.space, 'images': [r.name for r in records], 'results': results}, f, indent=2)
+        print(f"All subsets written to {args.json_path}")
+
+    if args.space != 'enhanced':
+        return 0
+
+    ratios = {**PROFILE_RATIOS, 'fast': args.fast_ratio, 'balanced': args.balanced_ratio}
+    profiles = pick_profiles(frontier, ratios)
+    print("\nProfiles:")
+    for name, profile in profiles.items():
+        print(f"  {name:<9}{profile['expected_ms']:>9.1f} ms  accuracy {profile['accuracy']:.3f}  "
+              f"{len(profile['passes'])} passes: " + ', '.join(label(tuple(key)) for key in profile['passes']))
+
+    with open(args.output, 'w') as f:
+        json.dump({
+            'generated_by': 'pareto_explorer.py',
+            'generated_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'images': [r.name for r in records],
+            'full_set': {'expected_ms': full['ms'], 'accuracy': full['accuracy']},
+            'profiles': profiles
+        }, f, indent=2)
+    print(f"Profiles written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
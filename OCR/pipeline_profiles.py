@@ -0,0 +1,214 @@
+"""
+Named OCR pipeline profiles
+One recipe per profile instead of one per server: which preprocessing
+variant x PSM passes to run, how hard to denoise, how large an image to
+OCR and how much time the passes may take.
+
+- fast: two passes on a downscaled image, for live camera previews
+- balanced: the passes the field parsers need (see STAGE_PLANS)
+- accurate: all 18 passes at full resolution - the api_server default recipe
+
+Clients pick one with ?profile=fast (or a 'profile' form field); the
+response then reports the profile and its measured cost. Without the
+parameter every server keeps its own recipe (OCR_DEFAULT_PROFILE changes
+that). pareto_explorer.py writes pipeline_profiles.json, whose pass sets
+(and any denoise / scale_target / budget_ms keys) override the built-ins;
+OCR_PIPELINE_PROFILES points at another file.
+"""
+
+import json
+import os
+import time
+
+from enhanced_ocr_pipeline import PREPROCESS_METHODS, PSM_CONFIGS, STAGE_PLANS
+
+
+PROFILES_PATH = os.getenv(
+    'OCR_PIPELINE_PROFILES', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'pipeline_profiles.json')
+)
+DEFAULT_PROFILE = os.getenv('OCR_DEFAULT_PROFILE', '')
+
+# 'denoised' variant: none, a median blur, or non-local means (slowest)
+DENOISE_TIERS = ('none', 'fast', 'full')
+
+ALL_PASSES = tuple((method, config) for method in PREPROCESS_METHODS for config in PSM_CONFIGS)
+
+
+def _plan_passes():
+    """Union of the per-output STAGE_PLANS pass sets"""
+    passes = set()
+    for methods, configs in STAGE_PLANS.values():
+        passes.update((method, config) for method in methods for config in configs)
+    return passes
+
+
+BUILTIN_PROFILES = {
+    'fast': {
+        'passes': [('contrast_enhanced', '--psm 6'), ('otsu', '--psm 6')],
+        'denoise': 'none',
+        'scale_target': 1600,
+        'budget_ms': 2500,
+    },
+    'balanced': {
+        'passes': sorted(_plan_passes()),
+        'denoise': 'none',
+        'scale_target': 2400,
+        'budget_ms': 8000,
+    },
+    'accurate': {
+        'passes': list(ALL_PASSES),
+        'denoise': 'full',
+        'scale_target': None,
+        'budget_ms': None,
+    },
+}
+
+
+class Profile:
+    """One named recipe; start() begins a measured run of it"""
+
+    def __init__(self, name, passes, denoise='full', scale_target=None, budget_ms=None,
+                 expected_ms=None, accuracy=None):
+        unknown = [tuple(p) for p in passes if tuple(p) not in ALL_PASSES]
+        if unknown:
+            raise ValueError(f"Profile {name}: unknown passes {unknown}")
+        if denoise not in DENOISE_TIERS:
+            raise ValueError(f"Profile {name}: denoise must be one of {', '.join(DENOISE_TIERS)}")
+        if not passes:
+            raise ValueError(f"Profile {name}: no passes")
+
+        wanted = {tuple(p) for p in passes}
+        if denoise == 'none':
+            wanted = {p for p in wanted if p[0] != 'denoised'} or wanted
+        # Pipeline order, so best-text ties resolve the same way as a full run
+        self.passes = tuple(p for p in ALL_PASSES if p in wanted)
+        self.name = name
+        self.denoise = denoise
+        self.scale_target = scale_target
+        self.budget_ms = budget_ms
+        self.expected_ms = expected_ms
+        self.accuracy = accuracy
+
+    @property
+    def methods(self):
+        used = {method for method, _ in self.passes}
+        return tuple(m for m in PREPROCESS_METHODS if m in used)
+
+    def plan(self, outputs=None):
+        """
+        Passes to run for the requested outputs: the profile's passes the
+        outputs' STAGE_PLANS entries use, or all of them if none overlap
+        """
+        if outputs is None or 'raw_text' in outputs:
+            return self.passes
+        needed = set()
+        for output in outputs:
+            methods, configs = STAGE_PLANS[output]
+            needed.update((method, config) for method in methods for config in configs)
+        return tuple(p for p in self.passes if p in needed) or self.passes
+
+    def start(self):
+        return ProfileRun(self)
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'passes': [list(p) for p in self.passes],
+            'denoise': self.denoise,
+            'scale_target': self.scale_target,
+            'budget_ms': self.budget_ms,
+            'expected_ms': self.expected_ms,
+            'accuracy': self.accuracy
+        }
+
+
+class ProfileRun:
+    """Budget and cost accounting for one request run under a profile"""
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.started = time.perf_counter()
+        self.deadline = self.started + profile.budget_ms / 1000 if profile.budget_ms else None
+        self.scale = 1.0
+        self.passes_planned = 0
+        self.passes_run = 0
+        self.budget_exhausted = False
+
+    def scale_image(self, img):
+        """Downscale so the longer side is at most scale_target (never upscales)"""
+        import cv2
+
+        target = self.profile.scale_target
+        height, width = img.shape[:2]
+        if not target or max(height, width) <= target:
+            return img
+        self.scale = target / max(height, width)
+        return cv2.resize(img, (round(width * self.scale), round(height * self.scale)), interpolation=cv2.INTER_AREA)
+
+    def over_budget(self):
+        return self.deadline is not None and time.perf_counter() > self.deadline
+
+    def allow_pass(self):
+        """False once the budget is spent; the first pass always runs"""
+        if self.passes_run and self.over_budget():
+            self.budget_exhausted = True
+            return False
+        self.passes_run += 1
+        return True
+
+    def report(self):
+        return {
+            'name': self.profile.name,
+            'elapsed_ms': round((time.perf_counter() - self.started) * 1000, 1),
+            'passes_run': self.passes_run,
+            'passes_planned': self.passes_planned,
+            'budget_ms': self.profile.budget_ms,
+            'budget_exhausted': self.budget_exhausted,
+            'scale': round(self.scale, 3),
+            'denoise': self.profile.denoise
+        }
+
+
+def load_profiles(path=PROFILES_PATH):
+    """Built-in profiles, overridden/extended by the profiles file when present"""
+    specs = {name: dict(spec) for name, spec in BUILTIN_PROFILES.items()}
+    if path and os.path.exists(path):
+        try:
+            with open(path) as f:
+                overrides = json.load(f).get('profiles', {})
+        except (OSError, ValueError) as e:
+            print(f"[pipeline_profiles] ignoring {path}: {e}")
+            overrides = {}
+        for name, override in overrides.items():
+            spec = specs.setdefault(name, dict(BUILTIN_PROFILES['accurate']))
+            spec.update({
+                key: override[key]
+                for key in ('passes', 'denoise', 'scale_target', 'budget_ms', 'expected_ms', 'accuracy')
+                if key in override
+            })
+
+    profiles = {}
+    for name, spec in specs.items():
+        try:
+            profiles[name] = Profile(name, **spec)
+        except ValueError as e:
+            print(f"[pipeline_profiles] {e}; using the built-in {name} profile")
+            if name in BUILTIN_PROFILES:
+                profiles[name] = Profile(name, **BUILTIN_PROFILES[name])
+    return profiles
+
+
+PROFILES = load_profiles()
+
+
+def get_profile(name):
+    """
+    Profile for a request's 'profile' parameter; None (the server's own recipe)
+    when empty and no OCR_DEFAULT_PROFILE is set. Raises ValueError on unknown names.
+    """
+    name = (name or DEFAULT_PROFILE).strip()
+    if not name:
+        return None
+    if name not in PROFILES:
+        raise ValueError(f"Unknown profile: {name} (valid: {', '.join(PROFILES)})")
+    return PROFILES[name]
@@ -0,0 +1,199 @@
+"""
+Pre-forked, pre-warmed OCR server (Linux)
+The parent imports and warms everything once - OpenCV, the Tesseract
+bindings, the NLTK vocabulary, the OCR pipeline, compiled regexes and
+Gemini model discovery - then binds the listening socket and forks N
+workers that share that memory copy-on-write. A worker is recycled after
+--max-requests requests or when its RSS passes --max-rss-mb, and is
+replaced by a fresh fork of the warm parent, so no restart pays the
+cold-start cost again.
+
+GET /api/ocr/ready reports how many workers are warm (503 until all are).
+
+Usage:
+    python prefork_server.py --app api_server --workers 4
+    python prefork_server.py --app test_ocr_simple --port 5002 --max-requests 500 --max-rss-mb 1500
+"""
+
+import argparse
+import gc
+import importlib
+import multiprocessing
+import os
+import signal
+import socket
+import sys
+import time
+
+# Worker slot states shared with the parent
+STARTING, READY, RECYCLING = 0, 1, 2
+
+
+def rss_mb():
+    """Resident set size of this process in MB"""
+    with open('/proc/self/statm') as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+
+
+def warm_app(module_name):
+    """Import the Flask app module and run its warmup hook"""
+    start = time.perf_counter()
+    module = importlib.import_module(module_name)
+    if hasattr(module, 'warmup'):
+        module.warmup()
+    return module.app, time.perf_counter() - start
+
+
+class PreforkSupervisor:
+    """
+    Forks and supervises worker processes that serve one Flask app
+    """
+    
+    def __init__(self, app, workers, host, port, max_requests, max_rss_mb, warmup_seconds):
+        self.app = app
+        self.workers = workers
+        self.host = host
+        self.port = port
+        self.max_requests = max_requests
+        self.max_rss_mb = max_rss_mb
+        self.warmup_seconds = warmup_seconds
+        
+        ctx = multiprocessing.get_context('fork')
+        self.states = ctx.Array('i', workers)   # per-slot STARTING/READY/RECYCLING
+        self.recycled = ctx.Value('i', 0)
+        self.pids = {}                          # pid -> slot
+        self.stopping = False
+        
+        self.app.add_url_rule('/api/ocr/ready', 'prefork_ready', self.ready_view)
+    
+    # ==================== READINESS ====================
+    def ready_view(self):
+        from flask import jsonify
+        warm = sum(1 for state in self.states if state == READY)
+        body = {
+            'ready': warm == self.workers,
+            'workers': self.workers,
+            'warm_workers': warm,
+            'warmup_seconds': round(self.warmup_seconds, 2),
+            'recycled_workers': self.recycled.value
+        }
+        return jsonify(body), 200 if body['ready'] else 503
+    
+    # ==================== WORKERS ====================
+    def spawn(self, slot, listener):
+        self.states[slot] = STARTING
+        pid = os.fork()
+        if pid:
+            self.pids[pid] = slot
+            return
+        
+        # Child: serve until recycled, then exit so the parent forks a fresh one
+        code = 0
+        try:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            signal.signal(signal.SIGINT, signal.SIG_IGN)
+            self.serve(slot, listener)
+        except Exception as e:
+            print(f"[prefork] worker {os.getpid()} crashed: {e}")
+            code = 1
+        finally:
+            os._exit(code)
+    
+    def serve(self, slot, listener):
+        from werkzeug.serving import make_server
+        
+        server = make_server(self.host, self.port, self.app, fd=listener.fileno())
+        self.states[slot] = READY
+        
+        handled = 0
+        while True:
+            server.handle_request()
+            handled += 1
+            if self.max_requests and handled >= self.max_requests:
+                reason = f'{handled} requests'
+                break
+            if self.max_rss_mb and rss_mb() > self.max_rss_mb:
+                reason = f'RSS {rss_mb():.0f} MB'
+                break
+        
+        self.states[slot] = RECYCLING
+        print(f"[prefork] recycling worker {os.getpid()} after {reason}")
+    
+    # ==================== SUPERVISION ====================
+    def run(self):
+        listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        listener.bind((self.host, self.port))
+        listener.listen(128)
+        listener.set_inheritable(True)
+        
+        # Keep the warmed heap out of the GC's reach so collections in the
+        # workers do not dirty (and copy) the shared pages
+        gc.collect()
+        gc.freeze()
+        
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        
+        for slot in range(self.workers):
+            self.spawn(slot, listener)
+        
+        while self.pids:
+            try:
+                pid, status = os.wait()
+            except ChildProcessError:
+                break
+            except InterruptedError:
+                continue
+            slot = self.pids.pop(pid, None)
+            if slot is None or self.stopping:
+                continue
+            
+            if os.waitstatus_to_exitcode(status) == 0:
+                with self.recycled.get_lock():
+                    self.recycled.value += 1
+            else:
+                print(f"[prefork] worker {pid} exited with status {os.waitstatus_to_exitcode(status)}")
+                time.sleep(1)  # avoid a hot crash loop
+            self.spawn(slot, listener)
+        
+        listener.close()
+    
+    def stop(self, signum=None, frame=None):
+        self.stopping = True
+        for pid in list(self.pids):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def main(argv=None):
+    if not hasattr(os, 'fork'):
+        sys.exit('prefork_server requires a POSIX system (use service_wrapper.py on Windows)')
+    
+    parser = argparse.ArgumentParser(description='Pre-forked, pre-warmed OCR API server')
+    parser.add_argument('--app', default='api_server', help='Flask app module (api_server, test_ocr_simple, simple_api)')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=5000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    parser.add_argument('--max-requests', type=int, default=1000, help='Recycle a worker after this many requests (0 = never)')
+    parser.add_argument('--max-rss-mb', type=float, default=2048, help='Recycle a worker above this RSS (0 = never)')
+    args = parser.parse_args(argv)
+    
+    print("=" * 70)
+    print(f"Pre-forked OCR API Server ({args.app})")
+    print("=" * 70)
+    app, warmup_seconds = warm_app(args.app)
+    print(f"Warmed up in {warmup_seconds:.2f}s, forking {args.workers} workers")
+    print(f"Starting server on http://{args.host}:{args.port}")
+    print(f"Readiness: http://localhost:{args.port}/api/ocr/ready")
+    print("=" * 70)
+    
+    PreforkSupervisor(app, args.workers, args.host, args.port,
+                      args.max_requests, args.max_rss_mb, warmup_seconds).run()
+
+
+if __name__ == '__main__':
+    main()
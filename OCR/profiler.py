@@ -0,0 +1,393 @@
+"""
+On-demand sampling profiler for live OCR traffic
+GET /api/admin/profile?seconds=10 samples the stack of every thread that
+is serving a request (sys._current_frames, default 100 Hz) for the given
+time and returns the aggregated stacks - enough to see *why* a stage is
+slow, e.g. regex backtracking in a parser or allocation churn in a
+preprocessing step. Nothing is sampled while no profile is running.
+
+Query parameters:
+- seconds: how long to sample (max MAX_SECONDS)
+- route: only requests whose URL rule starts with this, e.g. /api/ocr/analyze
+- min_ms: only requests that took at least this long (requests still
+  running when the profile ends count with their time so far)
+- interval_ms: sampling interval
+- format: collapsed (flamegraph.pl / speedscope import) or speedscope (JSON)
+
+The endpoint is disabled unless OCR_ADMIN_TOKEN is set, and then requires
+that token in the X-Admin-Token header. Under asgi_server the OCR runs
+in pool workers, so a profiled request's samples come from the worker that
+ran its OCR (sample_call) rather than from the event loop; under
+prefork_server each worker profiles the requests it serves itself.
+"""
+
+import contextvars
+import hmac
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+
+ADMIN_TOKEN = os.getenv('OCR_ADMIN_TOKEN', '')
+DEFAULT_SECONDS = 10
+MAX_SECONDS = 120
+DEFAULT_INTERVAL_MS = 10
+MIN_INTERVAL_MS = 1
+MAX_DEPTH = 128
+
+
+class ProfileBusy(Exception):
+    """Only one profile runs at a time"""
+
+
+# The ASGI request being profiled, if any (see ASGIMiddleware)
+current_request = contextvars.ContextVar('profiled_request', default=None)
+
+
+def frame_label(frame):
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def collapse(frame):
+    """Root-first tuple of frame labels for one thread's stack"""
+    labels = []
+    while frame is not None and len(labels) < MAX_DEPTH:
+        labels.append(frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return tuple(labels)
+
+
+class ActiveRequest:
+    __slots__ = ('profile', 'route', 'thread', 'started', 'stacks')
+
+    def __init__(self, profile, route):
+        self.profile = profile
+        self.route = route
+        self.thread = threading.get_ident()
+        self.started = time.perf_counter()
+        self.stacks = Counter()
+
+    @property
+    def elapsed_ms(self):
+        return (time.perf_counter() - self.started) * 1000
+
+
+class Profile:
+    """One sampling session; requests are kept or dropped as they finish"""
+
+    def __init__(self, route_prefix='', min_ms=0.0, interval=DEFAULT_INTERVAL_MS / 1000):
+        self.route_prefix = route_prefix
+        self.min_ms = min_ms
+        self.interval = interval
+        self.stacks = {}  # route -> Counter(stack -> samples)
+        self.samples = 0
+        self.requests_seen = 0
+        self.requests_kept = 0
+        self.started = time.time()
+        self.duration = 0.0
+
+    def wants(self, route):
+        return route.startswith(self.route_prefix)
+
+    def keep(self, active):
+        """Merge a finished (or still running) request's samples if it passes the filters"""
+        self.requests_seen += 1
+        if active.elapsed_ms < self.min_ms or not active.stacks:
+            return
+        self.requests_kept += 1
+        self.stacks.setdefault(active.route, Counter()).update(active.stacks)
+
+    def to_collapsed(self):
+        """Brendan Gregg's collapsed format: 'route;frame;frame count' per line"""
+        lines = []
+        for route, stacks in sorted(self.stacks.items()):
+            for stack, count in stacks.most_common():
+                lines.append(';'.join((route,) + stack) + f' {count}')
+        return '\n'.join(lines) + '\n'
+
+    def to_speedscope(self):
+        """speedscope.app file format: one sampled profile per route"""
+        frames = []
+        frame_index = {}
+        profiles = []
+        interval_ms = self.interval * 1000
+        for route, stacks in sorted(self.stacks.items()):
+            samples = []
+            weights = []
+            for stack, count in stacks.most_common():
+                indexes = []
+                for label in stack:
+                    if label not in frame_index:
+                        name, _, location = label.rpartition(' (')
+                        file, _, line = location.rstrip(')').rpartition(':')
+                        frame_index[label] = len(frames)
+                        frames.append({'name': name, 'file': file, 'line': int(line)})
+                    indexes.append(frame_index[label])
+                samples.append(indexes)
+                weights.append(round(count * interval_ms, 3))
+            profiles.append({
+                'type': 'sampled',
+                'name': route,
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': round(sum(weights), 3),
+                'samples': samples,
+                'weights': weights
+            })
+
+        return {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': f"OCR profile {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started))}",
+            'exporter': 'foodconnect-ocr profiler',
+            'activeProfileIndex': 0,
+            'shared': {'frames': frames},
+            'profiles': profiles
+        }
+
+    def summary(self):
+        return {
+            'seconds': round(self.duration, 2),
+            'samples': self.samples,
+            'requests_seen': self.requests_seen,
+            'requests_kept': self.requests_kept,
+            'routes': sorted(self.stacks)
+        }
+
+
+class Sampler:
+    """Tracks which thread serves which request and samples them during a profile"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active = {}  # thread id -> ActiveRequest
+        self._remote = set()  # ActiveRequests sampled in pool workers
+        self._profile = None
+
+    # ---------- request hooks (cheap no-ops unless a profile is running) ----------
+    def request_started(self, route):
+        profile = self._profile
+        if profile is None or not profile.wants(route):
+            return None
+        active = ActiveRequest(profile, route)
+        with self._lock:
+            self._active[active.thread] = active
+        return active
+
+    def remote_request_started(self, route):
+        """Like request_started, for a request whose work is sampled elsewhere (add_samples)"""
+        profile = self._profile
+        if profile is None or not profile.wants(route):
+            return None
+        active = ActiveRequest(profile, route)
+        with self._lock:
+            self._remote.add(active)
+        return active
+
+    def add_samples(self, active, stacks):
+        """Merge stacks sampled in a pool worker (sample_call) into a remote request"""
+        with self._lock:
+            if active in self._remote:
+                active.stacks.update(stacks)
+                active.profile.samples += sum(stacks.values())
+
+    def request_finished(self, active):
+        if active is None:
+            return
+        with self._lock:
+            if active in self._remote:
+                self._remote.discard(active)
+                owned = True
+            else:
+                owned = self._active.get(active.thread) is active
+                if owned:
+                    del self._active[active.thread]
+        if owned:  # otherwise the profile already ended and harvested it
+            active.profile.keep(active)
+
+    # ---------- sampling ----------
+    def run(self, seconds, route_prefix='', min_ms=0.0, interval=DEFAULT_INTERVAL_MS / 1000):
+        """Sample for `seconds` in the calling thread and return the Profile"""
+        profile = Profile(route_prefix, min_ms, interval)
+        with self._lock:
+            if self._profile is not None:
+                raise ProfileBusy('a profile is already running')
+            self._profile = profile
+
+        me = threading.get_ident()
+        started = time.perf_counter()
+        deadline = started + seconds
+        try:
+            while time.perf_counter() < deadline:
+                frames = sys._current_frames()
+                with self._lock:
+                    for ident, active in self._active.items():
+                        frame = frames.get(ident)
+                        if frame is not None and ident != me:
+                            active.stacks[collapse(frame)] += 1
+                            profile.samples += 1
+                del frames
+                time.sleep(interval)
+        finally:
+            with self._lock:
+                self._profile = None
+                unfinished = list(self._active.values()) + list(self._remote)
+                self._active.clear()
+                self._remote.clear()
+            for active in unfinished:
+                profile.keep(active)
+            profile.duration = time.perf_counter() - started
+        return profile
+
+
+sampler = Sampler()
+
+
+def sample_call(interval, fn, *args):
+    """
+    Run fn(*args) while a helper thread samples the calling thread every
+    `interval` seconds; return (result, Counter(stack -> samples)).
+    Used by pool workers, whose stacks the parent's sampler cannot see
+    """
+    target = threading.get_ident()
+    stacks = Counter()
+    done = threading.Event()
+
+    def sample():
+        while not done.wait(interval):
+            frame = sys._current_frames().get(target)
+            if frame is not None:
+                stacks[collapse(frame)] += 1
+            del frame
+
+    helper = threading.Thread(target=sample, name='profile-sampler', daemon=True)
+    helper.start()
+    try:
+        result = fn(*args)
+    finally:
+        done.set()
+        helper.join()
+    return result, stacks
+
+
+def authorized(token):
+    return bool(ADMIN_TOKEN) and hmac.compare_digest(token or '', ADMIN_TOKEN)
+
+
+def profile_params(args):
+    """(seconds, route, min_ms, interval, format) from the query string; ValueError if invalid"""
+    try:
+        seconds = min(float(args.get('seconds', DEFAULT_SECONDS)), MAX_SECONDS)
+        min_ms = float(args.get('min_ms', 0))
+        interval_ms = max(float(args.get('interval_ms', DEFAULT_INTERVAL_MS)), MIN_INTERVAL_MS)
+    except ValueError as e:
+        raise ValueError(f'Invalid parameter: {e}')
+    output = args.get('format', 'collapsed')
+    if output not in ('collapsed', 'speedscope'):
+        raise ValueError(f'Unknown format: {output}')
+    return seconds, args.get('route', ''), min_ms, interval_ms / 1000, output
+
+
+def report(profile):
+    """Log a finished profile and return its X-Profile-* headers"""
+    summary = profile.summary()
+    print(f"[profiler] {summary['samples']} samples from {summary['requests_kept']}/{summary['requests_seen']} requests in {summary['seconds']}s")
+    return {'X-Profile-Samples': str(summary['samples']), 'X-Profile-Requests': str(summary['requests_kept'])}
+
+
+def instrument_flask(app):
+    """Request hooks for the sampler plus the /api/admin/profile endpoint"""
+    from flask import Response, g, jsonify, request
+
+    @app.before_request
+    def _profile_request():
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        g.profiled_request = sampler.request_started(route)
+
+    @app.after_request
+    def _profile_stream(response):
+        # A streamed body runs after teardown; keep sampling it until it closes
+        active = g.get('profiled_request')
+        if active is not None and response.is_streamed:
+            g.pop('profiled_request')
+            response.call_on_close(lambda: sampler.request_finished(active))
+        return response
+
+    @app.teardown_request
+    def _profile_request_done(error=None):
+        sampler.request_finished(g.pop('profiled_request', None))
+
+    def profile_endpoint():
+        if not ADMIN_TOKEN:
+            return jsonify({'error': 'Profiling disabled (set OCR_ADMIN_TOKEN)', 'success': False}), 404
+        if not authorized(request.headers.get('X-Admin-Token')):
+            return jsonify({'error': 'Invalid admin token', 'success': False}), 403
+
+        try:
+            seconds, route, min_ms, interval, output = profile_params(request.args)
+        except ValueError as e:
+            return jsonify({'error': str(e), 'success': False}), 400
+
+        try:
+            profile = sampler.run(seconds, route, min_ms, interval)
+        except ProfileBusy as e:
+            return jsonify({'error': str(e), 'success': False}), 409
+
+        headers = report(profile)
+        if output == 'speedscope':
+            response = jsonify(profile.to_speedscope())
+            response.headers.update(headers)
+            return response
+        return Response(profile.to_collapsed(), mimetype='text/plain', headers=headers)
+
+    app.add_url_rule('/api/admin/profile', 'admin_profile', profile_endpoint, methods=['GET'])
+
+
+class ASGIMiddleware:
+    """Pure ASGI middleware: mark requests for the sampler while a profile is running"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        active = sampler.remote_request_started(scope['path'])
+        if active is None:
+            return await self.app(scope, receive, send)
+        token = current_request.set(active)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_request.reset(token)
+            sampler.request_finished(active)
+
+
+async def asgi_endpoint(request):
+    """Starlette GET /api/admin/profile; samples from a worker thread so the loop keeps serving"""
+    from starlette.concurrency import run_in_threadpool
+    from starlette.responses import JSONResponse, Response
+
+    if not ADMIN_TOKEN:
+        return JSONResponse({'error': 'Profiling disabled (set OCR_ADMIN_TOKEN)', 'success': False}, status_code=404)
+    if not authorized(request.headers.get('X-Admin-Token')):
+        return JSONResponse({'error': 'Invalid admin token', 'success': False}, status_code=403)
+
+    try:
+        seconds, route, min_ms, interval, output = profile_params(request.query_params)
+    except ValueError as e:
+        return JSONResponse({'error': str(e), 'success': False}, status_code=400)
+
+    try:
+        profile = await run_in_threadpool(sampler.run, seconds, route, min_ms, interval)
+    except ProfileBusy as e:
+        return JSONResponse({'error': str(e), 'success': False}, status_code=409)
+
+    headers = report(profile)
+    if output == 'speedscope':
+        return JSONResponse(profile.to_speedscope(), headers=headers)
+    return Response(profile.to_collapsed(), media_type='text/plain', headers=headers)
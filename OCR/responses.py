@@ -0,0 +1,203 @@
+"""
+Response shaping and encoding for the OCR endpoints
+- ?fields=a,b.c keeps only the listed (dotted) paths; a path into a list
+  applies to every element, e.g. fields=ingredientAnalysis.name
+- ?compact=1 switches to a slim schema: no raw OCR text, no repeated
+  nutrient maps, no placeholder fields
+- bodies are serialized with orjson when it is installed (stdlib json
+  otherwise) and gzip/brotli-compressed when the client accepts it
+
+Flask and ASGI servers both call render() and wrap the body/headers in
+their own response class.
+"""
+
+import gzip
+import json
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+# Below this size compression costs more than it saves
+MIN_COMPRESS_BYTES = 1024
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Kept whatever fields= says, so clients can always tell success from failure
+ALWAYS_KEPT = ('success', 'error')
+
+
+def dumps(payload):
+    """Serialize to UTF-8 JSON bytes"""
+    if orjson is not None:
+        try:
+            return orjson.dumps(payload, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+        except TypeError:
+            pass  # a type orjson does not know; the stdlib path stringifies it
+    return json.dumps(payload, default=str).encode('utf-8')
+
+
+def parse_fields(value):
+    """'a,b.c' -> [['a'], ['b', 'c']]"""
+    return [field.strip().split('.') for field in (value or '').split(',') if field.strip()]
+
+
+_MISSING = object()
+
+
+def _pick(value, path):
+    if isinstance(value, list):
+        return [_pick(item, path) for item in value]
+    if not path or not isinstance(value, dict):
+        return value
+    head, rest = path[0], path[1:]
+    if head not in value:
+        return _MISSING
+    picked = _pick(value[head], rest)
+    return _MISSING if picked is _MISSING else {head: picked}
+
+
+def _merge(into, picked):
+    for key, value in picked.items():
+        if isinstance(value, dict) and isinstance(into.get(key), dict):
+            _merge(into[key], value)
+        else:
+            into[key] = value
+    return into
+
+
+def select_fields(payload, fields):
+    """Keep only the given field paths (see parse_fields) of a dict payload"""
+    if not fields or not isinstance(payload, dict):
+        return payload
+
+    selected = {key: payload[key] for key in ALWAYS_KEPT if key in payload}
+    for path in fields:
+        picked = _pick(payload, path)
+        if picked is not _MISSING:
+            _merge(selected, picked)
+    return selected
+
+
+# ==================== compact schemas ====================
+def _present(mapping):
+    return {key: value for key, value in (mapping or {}).items() if value is not None}
+
+
+def compact_generic(payload):
+    """
+    Slim test_ocr_simple analyze payload: one nutrient map (non-null values
+    only), ingredient names instead of placeholder analysis objects, no
+    raw OCR text and no duplicate display map
+    """
+    if not payload.get('success'):
+        return payload
+
+    ocr_data = payload.get('ocrData') or {}
+    compact = {
+        'success': True,
+        'productName': payload.get('productName'),
+        'ingredients': [item['name'] for item in payload.get('ingredientAnalysis', [])],
+        'score': payload.get('nutriScore', {}).get('score'),
+        'grade': payload.get('nutriScore', {}).get('grade'),
+        'per100g': _present(payload.get('nutrition', {}).get('per100g')),
+        'servingSize': ocr_data.get('serving_size'),
+        'fssai': (payload.get('fssai') or {}).get('number'),
+        'allergens': ocr_data.get('allergens', []),
+        'recommendations': payload.get('recommendations', [])
+    }
+    if 'profile' in payload:
+        compact['profile'] = payload['profile']
+    return compact
+
+
+def compact_analysis(payload):
+    """Slim api_server analyze payload: drops raw_text, penalty details and status strings"""
+    if not payload.get('success'):
+        return payload
+
+    safety = payload.get('safety_score') or {}
+    compact = {
+        'success': True,
+        'nutrition_facts': payload.get('nutrition_facts', {}),
+        'serving_size': payload.get('serving_size'),
+        'ingredients': payload.get('ingredients', []),
+        'allergens': payload.get('allergens', []),
+        'fssai': (payload.get('fssai') or {}).get('number'),
+        'score': safety.get('score'),
+        'grade': safety.get('grade')
+    }
+    if 'profile' in payload:
+        compact['profile'] = payload['profile']
+    return compact
+
+
+# ==================== encoding ====================
+def is_truthy(value):
+    return str(value or '').lower() in ('1', 'true', 'yes')
+
+
+def choose_encoding(accept_encoding):
+    """Best supported content-coding from an Accept-Encoding header, or None"""
+    accepted = {}
+    for part in (accept_encoding or '').lower().split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        if params.strip().startswith('q='):
+            try:
+                q = float(params.strip()[2:])
+            except ValueError:
+                q = 0.0
+        if name:
+            accepted[name] = q
+
+    for coding in ('br', 'gzip'):
+        if coding == 'br' and brotli is None:
+            continue
+        if accepted.get(coding, accepted.get('*', 0)) > 0:
+            return coding
+    return None
+
+
+def encode(body, accept_encoding):
+    """Compress body for the client; returns (body, headers)"""
+    headers = {'Vary': 'Accept-Encoding'}
+    if len(body) < MIN_COMPRESS_BYTES:
+        return body, headers
+
+    coding = choose_encoding(accept_encoding)
+    if coding == 'br':
+        body = brotli.compress(body, quality=BROTLI_QUALITY)
+    elif coding == 'gzip':
+        body = gzip.compress(body, compresslevel=GZIP_LEVEL)
+    if coding:
+        headers['Content-Encoding'] = coding
+    return body, headers
+
+
+def render(payload, params, accept_encoding='', compact_schema=None):
+    """
+    Shape, serialize and compress one response
+
+    Args:
+        params: request query/form mapping ('fields', 'compact')
+        accept_encoding: the request's Accept-Encoding header
+        compact_schema: function applied when ?compact=1
+
+    Returns:
+        (body bytes, headers dict)
+    """
+    if compact_schema is not None and is_truthy(params.get('compact')):
+        payload = compact_schema(payload)
+    payload = select_fields(payload, parse_fields(params.get('fields')))
+
+    body, headers = encode(dumps(payload), accept_encoding)
+    headers['Content-Type'] = 'application/json'
+    return body, headers
@@ -4,19 +4,29 @@ Install: python service_wrapper.py install
 Start: python service_wrapper.py start
 Stop: python service_wrapper.py stop
 Remove: python service_wrapper.py remove
+
+On Linux this runs the pre-forked, pre-warmed supervisor instead of a
+crash-restart loop (arguments are passed to prefork_server.py):
+    python service_wrapper.py --workers 4 --max-requests 1000
 """
 
-import win32serviceutil
-import win32service
-import win32event
-import servicemanager
 import socket
 import sys
 import os
 import subprocess
 import time
 
-class OCRAPIService(win32serviceutil.ServiceFramework):
+if sys.platform == 'win32':
+    import win32serviceutil
+    import win32service
+    import win32event
+    import servicemanager
+    ServiceFramework = win32serviceutil.ServiceFramework
+else:
+    ServiceFramework = object
+
+
+class OCRAPIService(ServiceFramework):
     _svc_name_ = "FoodConnectOCRAPI"
     _svc_display_name_ = "FoodConnect OCR API Service"
     _svc_description_ = "OCR API service for FoodConnect food analysis"
@@ -71,4 +81,8 @@ class OCRAPIService(win32serviceutil.ServiceFramework):
                 time.sleep(5)  # Wait before retry
 
 if __name__ == '__main__':
-    win32serviceutil.HandleCommandLine(OCRAPIService)
\ No newline at end of file
+    if sys.platform == 'win32':
+        win32serviceutil.HandleCommandLine(OCRAPIService)
+    else:
+        from prefork_server import main
+        main()
\ No newline at end of file
@@ -0,0 +1,209 @@
+"""
+Shared-memory image transport for OCR worker processes
+Decoded images and preprocessed variants are copied once into
+multiprocessing.shared_memory segments; only a small handle
+(name, shape, dtype) crosses the process boundary, so handoff cost stays
+flat no matter how large the image is.
+
+Lifecycle:
+- the process that *owns* a segment (the one holding it in its
+  SegmentRegistry) is responsible for unlinking it
+- segments created inside a worker are handed to the parent with
+  handoff() and adopted by the parent's registry
+- registry.scope() releases every segment registered during a request,
+  check_leaks() reports segments that outlived their request, and
+  anything still alive at interpreter exit is unlinked and reported
+"""
+
+import atexit
+import contextvars
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+SEGMENT_PREFIX = 'ocrimg_'
+
+
+# Before Python 3.13 every SharedMemory open registers the segment with
+# the resource tracker, which is shared by the parent and its spawned
+# workers. Ownership is tracked by SegmentRegistry instead, so each open
+# is immediately unregistered and unlink re-registers first to keep the
+# tracker balanced.
+_UNTRACKED = {'track': False} if sys.version_info >= (3, 13) else {}
+
+
+def _untrack(shm):
+    if not _UNTRACKED:
+        resource_tracker.unregister(shm._name, 'shared_memory')
+    return shm
+
+
+def _open_segment(name):
+    """Attach to an existing segment without letting the resource tracker claim it"""
+    return _untrack(shared_memory.SharedMemory(name=name, **_UNTRACKED))
+
+
+def _create_segment(nbytes):
+    return _untrack(shared_memory.SharedMemory(
+        create=True, size=max(nbytes, 1), name=SEGMENT_PREFIX + uuid.uuid4().hex[:16], **_UNTRACKED
+    ))
+
+
+def _unlink(shm):
+    if not _UNTRACKED:
+        resource_tracker.register(shm._name, 'shared_memory')
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        if not _UNTRACKED:
+            resource_tracker.unregister(shm._name, 'shared_memory')
+
+
+def attach(handle):
+    """
+    Map a shared array described by handle
+    
+    Returns:
+        (shm, array) - the array is a zero-copy view; drop every reference
+        to it (and to views derived from it) before calling shm.close()
+    """
+    shm = _open_segment(handle['name'])
+    array = np.ndarray(tuple(handle['shape']), dtype=np.dtype(handle['dtype']), buffer=shm.buf)
+    return shm, array
+
+
+def handoff(array):
+    """
+    Copy an array into a new segment whose ownership passes to another
+    process (used by workers to return results). The receiver must
+    adopt() the handle so the segment is unlinked eventually.
+    """
+    array = np.ascontiguousarray(array)
+    shm = _create_segment(array.nbytes)
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+    handle = {'name': shm.name, 'shape': list(array.shape), 'dtype': array.dtype.str}
+    shm.close()
+    return handle
+
+
+def release_handoffs(handles):
+    """Unlink handed-off segments that will never be adopted (error paths)"""
+    for handle in handles:
+        try:
+            shm = _open_segment(handle['name'])
+        except FileNotFoundError:
+            continue
+        shm.close()
+        _unlink(shm)
+
+
+class SegmentRegistry:
+    """
+    Tracks every shared segment owned by this process
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._segments = {}  # name -> {'shm', 'nbytes', 'created', 'label'}
+        self.leaked_total = 0
+        atexit.register(self.release_all, report=True)
+    
+    def share(self, array, label=''):
+        """Copy array into a new owned segment and return its handle"""
+        array = np.ascontiguousarray(array)
+        shm = _create_segment(array.nbytes)
+        np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[...] = array
+        self._track(shm, array.nbytes, label)
+        return {'name': shm.name, 'shape': list(array.shape), 'dtype': array.dtype.str}
+    
+    def adopt(self, handle, label=''):
+        """Take ownership of a segment created elsewhere with handoff()"""
+        shm = _open_segment(handle['name'])
+        nbytes = int(np.prod(handle['shape'])) * np.dtype(handle['dtype']).itemsize
+        self._track(shm, nbytes, label)
+        return handle
+    
+    def _track(self, shm, nbytes, label):
+        with self._lock:
+            self._segments[shm.name] = {
+                'shm': shm,
+                'nbytes': nbytes,
+                'created': time.monotonic(),
+                'label': label
+            }
+        scope = _current_scope.get()
+        if scope is not None:
+            scope.append(shm.name)
+    
+    def release(self, handle_or_name):
+        """Close and unlink one owned segment (no-op if already released)"""
+        name = handle_or_name['name'] if isinstance(handle_or_name, dict) else handle_or_name
+        with self._lock:
+            entry = self._segments.pop(name, None)
+        if entry is None:
+            return False
+        entry['shm'].close()
+        _unlink(entry['shm'])
+        return True
+    
+    @contextmanager
+    def scope(self):
+        """
+        Release every segment shared or adopted inside the block; scopes
+        follow contextvars, so concurrent asyncio requests stay separate
+        """
+        names = []
+        token = _current_scope.set(names)
+        try:
+            yield
+        finally:
+            _current_scope.reset(token)
+            for name in names:
+                self.release(name)
+    
+    def check_leaks(self, max_age=60.0):
+        """Segments alive longer than max_age seconds (likely leaked by a failed request)"""
+        now = time.monotonic()
+        with self._lock:
+            return [
+                {'name': name, 'label': e['label'], 'nbytes': e['nbytes'], 'age': round(now - e['created'], 1)}
+                for name, e in self._segments.items()
+                if now - e['created'] > max_age
+            ]
+    
+    def reap_leaks(self, max_age=60.0):
+        """Release leaked segments and count them; returns the list released"""
+        leaks = self.check_leaks(max_age)
+        for leak in leaks:
+            if self.release(leak['name']):
+                self.leaked_total += 1
+        return leaks
+    
+    def stats(self):
+        with self._lock:
+            return {
+                'live_segments': len(self._segments),
+                'live_bytes': sum(e['nbytes'] for e in self._segments.values()),
+                'leaked_total': self.leaked_total
+            }
+    
+    def release_all(self, report=False):
+        """Unlink everything still owned (called at interpreter exit)"""
+        with self._lock:
+            names = list(self._segments)
+        if report and names:
+            print(f"[shm] releasing {len(names)} shared segment(s) still alive at exit")
+            self.leaked_total += len(names)
+        for name in names:
+            self.release(name)
+
+
+_current_scope = contextvars.ContextVar('shm_scope', default=None)
+
+# Process-wide registry used by the servers
+registry = SegmentRegistry()
@@ -6,6 +6,8 @@ import pytesseract
 import re
 from PIL import Image
 import io
+from nutrient_rules import NutrientScanner
+from keyword_matcher import MATCHER
 
 app = Flask(__name__)
 CORS(app)
@@ -55,13 +57,15 @@ def analyze_generic():
 def parse_food_label(raw_text):
     """Parse food label text and extract structured data"""
     text = raw_text.lower()
+    # One keyword scan serves the ingredient risks, Nutri-Score and recommendations
+    hits = MATCHER.scan(text)
     
     result = {
         'productName': extract_product_name(raw_text),
-        'ingredientAnalysis': extract_ingredients(text),
+        'ingredientAnalysis': extract_ingredients(text, hits),
         'nutrition': extract_nutrition(text),
-        'nutriScore': calculate_nutri_score(text),
-        'recommendations': generate_recommendations(text),
+        'nutriScore': calculate_nutri_score(text, hits),
+        'recommendations': generate_recommendations(text, hits),
         'fssai': detect_fssai(raw_text),
         'summary': 'Food analysis completed successfully'
     }
@@ -76,9 +80,10 @@ def extract_product_name(text):
             return line.strip()
     return 'Food Product'
 
-def extract_ingredients(text):
-    """Extract ingredients from text"""
+def extract_ingredients(text, hits=None):
+    """Extract ingredients from text (hits: MATCHER.scan(text), if already done)"""
     ingredients = []
+    hits = hits or MATCHER.scan(text)
     
     # Look for ingredients section
     ing_match = re.search(r'ingredients?[:\s]*([^.]+)', text)
@@ -87,14 +92,19 @@ def extract_ingredients(text):
         # Split by common separators
         raw_ingredients = re.split(r'[,;]', ing_text)
         
+        start = ing_match.start(1)
         for i, ing in enumerate(raw_ingredients[:10]):  # Limit to 10 ingredients
+            # Where the stripped ingredient sits in text, to look up its keyword hits
+            ing_start = start + len(ing) - len(ing.lstrip())
+            start += len(ing) + 1
             ing = ing.strip()
             if ing and len(ing) > 2:
                 # Simple toxicity scoring
+                keywords = hits.within(ing_start, ing_start + len(ing))
                 toxicity_score = 10
-                if any(word in ing for word in ['artificial', 'preservative', 'color', 'flavor']):
+                if keywords & MATCHER.purposes['additive']:
                     toxicity_score = 70
-                elif any(word in ing for word in ['sugar', 'salt', 'oil']):
+                elif keywords & MATCHER.purposes['staple']:
                     toxicity_score = 40
                 
                 ingredients.append({
@@ -108,6 +118,18 @@ def extract_ingredients(text):
     
     return ingredients
 
+# nutrient_rules name -> per100g key (values in the key's unit)
+NUTRITION_KEYS = {
+    'energy': 'energy_kcal',
+    'protein': 'protein_g',
+    'carbohydrate': 'carbohydrate_g',
+    'total_fat': 'total_fat_g',
+    'total_sugar': 'sugar_g',
+    'sodium': 'sodium_mg',
+    'fiber': 'fiber_g'
+}
+NUTRITION_SCANNER = NutrientScanner(NUTRITION_KEYS, require_unit=True)
+
 def extract_nutrition(text):
     """Extract nutrition information"""
     nutrition = {
@@ -118,21 +140,11 @@ def extract_nutrition(text):
         'per100g': {}
     }
     
-    # Extract nutritional values
-    patterns = {
-        'energy_kcal': r'energy[:\s]*([0-9.]+)\s*k?cal',
-        'protein_g': r'protein[:\s]*([0-9.]+)\s*g',
-        'carbohydrate_g': r'carbohydrate[:\s]*([0-9.]+)\s*g',
-        'total_fat_g': r'(?:total\s+)?fat[:\s]*([0-9.]+)\s*g',
-        'sugar_g': r'sugar[:\s]*([0-9.]+)\s*g',
-        'sodium_mg': r'sodium[:\s]*([0-9.]+)\s*mg',
-        'fiber_g': r'fi[bv]re[:\s]*([0-9.]+)\s*g'
-    }
-    
-    for key, pattern in patterns.items():
-        match = re.search(pattern, text)
-        if match:
-            nutrition['per100g'][key] = float(match.group(1))
+    # Extract nutritional values (one pass over the text for all nutrients)
+    hits = NUTRITION_SCANNER.scan(text)
+    for nutrient, key in NUTRITION_KEYS.items():
+        if nutrient in hits:
+            nutrition['per100g'][key] = round(hits[nutrient].value, 2)
     
     # Calculate health score based on nutrition
     if nutrition['per100g']:
@@ -149,18 +161,19 @@ def extract_nutrition(text):
     
     return nutrition
 
-def calculate_nutri_score(text):
+def calculate_nutri_score(text, hits=None):
     """Calculate Nutri-Score"""
     # Simple scoring based on keywords
+    found = (hits or MATCHER.scan(text)).found('nutri_score')
     score = 0
     
-    if 'sugar' in text:
+    if 'sugar' in found:
         score += 5
-    if 'fat' in text:
+    if 'fat' in found:
         score += 3
-    if 'protein' in text:
+    if 'protein' in found:
         score -= 2
-    if 'fiber' in text or 'fibre' in text:
+    if 'fiber' in found or 'fibre' in found:
         score -= 1
     
     # Convert to grade
@@ -186,18 +199,19 @@ def calculate_nutri_score(text):
         'color': color
     }
 
-def generate_recommendations(text):
+def generate_recommendations(text, hits=None):
     """Generate health recommendations"""
     recommendations = []
+    found = (hits or MATCHER.scan(text)).found()
     
-    if 'sugar' in text:
+    if 'sugar' in found:
         recommendations.append({
             'type': 'warning',
             'message': 'This product contains sugar. Consider limiting intake if you have diabetes.',
             'priority': 'medium'
         })
     
-    if 'artificial' in text or 'preservative' in text:
+    if 'artificial' in found or 'preservative' in found:
         recommendations.append({
             'type': 'caution',
             'message': 'Contains artificial ingredients or preservatives. Choose natural alternatives when possible.',
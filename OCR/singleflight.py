@@ -0,0 +1,80 @@
+"""
+Single-flight request coalescing
+Concurrent requests for the same work (same route, same image bytes)
+attach to one in-flight computation and all receive its result, instead
+of each running the full OCR pipeline. Nothing is cached: once the
+computation finishes, the next request starts a new one.
+
+The result object is shared by every caller - treat it as read-only.
+"""
+
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+
+
+def content_key(route, data, *params):
+    """Coalescing key: route + extra parameters + SHA-256 of the uploaded bytes"""
+    digest = hashlib.sha256(data).hexdigest()
+    return ':'.join([route, *map(str, params), digest])
+
+
+class SingleFlight:
+    """
+    Deduplicates concurrent calls that share a key
+    - do() for thread-based servers (Flask)
+    - do_async() for asyncio servers (ASGI)
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._async_calls = {}
+        self.executed = 0
+        self.coalesced = 0
+    
+    def do(self, key, fn, *args):
+        """Run fn(*args) unless an identical call is already running; wait for its result"""
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = self._calls[key] = Future()
+                self.executed += 1
+            else:
+                self.coalesced += 1
+        
+        if not leader:
+            return future.result()
+        
+        try:
+            result = fn(*args)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                del self._calls[key]
+    
+    async def do_async(self, key, coro_fn, *args):
+        """Await coro_fn(*args) unless an identical call is already running on this loop"""
+        task = self._async_calls.get(key)
+        if task is None:
+            self.executed += 1
+            task = self._async_calls[key] = asyncio.ensure_future(coro_fn(*args))
+            task.add_done_callback(lambda _: self._async_calls.pop(key, None))
+        else:
+            self.coalesced += 1
+        # shield: one caller disconnecting must not cancel the others' work
+        return await asyncio.shield(task)
+    
+    def stats(self):
+        return {
+            'executed': self.executed,
+            'coalesced': self.coalesced,
+            'in_flight': len(self._calls) + len(self._async_calls)
+        }
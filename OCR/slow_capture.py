@@ -0,0 +1,370 @@
+"""
+Slow-request capture and replay
+Opt-in: with OCR_SLOW_CAPTURE_MS set, every OCR request slower than that
+many milliseconds is written to a bounded local store so it can be replayed
+later against the current pipeline.
+
+Each capture is a directory named after the image's SHA-256 and the route
+(e.g. 3f2a9c0e1b7d4a55-analyze) holding the image (the original bytes, or
+a PNG downscaled to OCR_SLOW_CAPTURE_MAX_SIDE pixels when set) and
+meta.json: route, request parameters, latency, stage timings from the
+request's trace and the OCR variant the pipeline chose. The same image
+slow again on the same route only updates its meta.json. Once the store
+holds OCR_SLOW_CAPTURE_MAX entries the oldest is evicted. Writes happen on
+a background thread, so capturing never delays the response.
+
+Replay (runs the current code in-process, no server needed):
+    python slow_capture.py list
+    python slow_capture.py replay                 # every capture
+    python slow_capture.py replay 3f2a9c --runs 3 --json replay.json
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import queue
+import shutil
+import statistics
+import sys
+import threading
+import time
+
+import tracing
+
+
+THRESHOLD_MS = float(os.getenv('OCR_SLOW_CAPTURE_MS', 0))
+CAPTURE_DIR = os.getenv('OCR_SLOW_CAPTURE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'slow_requests'))
+MAX_ENTRIES = int(os.getenv('OCR_SLOW_CAPTURE_MAX', 200))
+MAX_SIDE = int(os.getenv('OCR_SLOW_CAPTURE_MAX_SIDE', 0))  # 0 keeps the original image
+QUEUE_SIZE = 32
+HISTORY = 20
+
+# Routes whose single 'image' upload can be replayed through ocr_worker
+REPLAYABLE = (
+    '/api/ocr/analyze',
+    '/api/ocr/analyze-step',
+    '/api/ocr/extract-nutrition',
+    '/api/ocr/extract-ingredients',
+    '/api/analyze/generic',
+    '/api/generic/analyze',
+)
+
+
+def image_hash(img_bytes):
+    return hashlib.sha256(img_bytes).hexdigest()
+
+
+def stored_image(img_bytes):
+    """(bytes, extension, shape info) to store: the original or a downscaled PNG"""
+    import cv2
+    import numpy as np
+
+    img = cv2.imdecode(np.frombuffer(img_bytes, np.uint8), cv2.IMREAD_COLOR)
+    if img is None:
+        return img_bytes, 'bin', {}
+    height, width = img.shape[:2]
+    info = {'original_shape': [height, width], 'downscaled': False}
+    if not MAX_SIDE or max(height, width) <= MAX_SIDE:
+        return img_bytes, 'img', info
+
+    scale = MAX_SIDE / max(height, width)
+    small = cv2.resize(img, (round(width * scale), round(height * scale)), interpolation=cv2.INTER_AREA)
+    ok, encoded = cv2.imencode('.png', small)
+    if not ok:
+        return img_bytes, 'img', info
+    info.update({'stored_shape': list(small.shape[:2]), 'downscaled': True})
+    return encoded.tobytes(), 'png', info
+
+
+class SlowCaptureStore:
+    """Bounded on-disk store of slow requests, one directory per (image, route)"""
+
+    def __init__(self, directory=CAPTURE_DIR, max_entries=MAX_ENTRIES):
+        self.directory = directory
+        self.max_entries = max_entries
+        self.captured = 0
+        self.dropped = 0
+        self._queue = queue.Queue(QUEUE_SIZE)
+        self._writer = None
+        self._lock = threading.Lock()
+
+    # ---------- capture ----------
+    def observe(self, route, img_bytes, params, elapsed_ms, status=200, trace=None):
+        """Queue a capture if the request was slow enough; cheap otherwise"""
+        if not THRESHOLD_MS or elapsed_ms < THRESHOLD_MS or not img_bytes:
+            return False
+        record = {
+            'route': route,
+            'params': {key: value for key, value in params.items() if isinstance(value, str)},
+            'elapsed_ms': round(elapsed_ms, 1),
+            'status': status,
+            'captured_at': time.time(),
+            'stages': trace.summary() if trace else [],
+            'ocr_variant': trace.find_attribute('ocr_variant') if trace else None,
+            'replayable': route in REPLAYABLE
+        }
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((img_bytes, record))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def _ensure_writer(self):
+        if self._writer is None:
+            with self._lock:
+                if self._writer is None:
+                    self._writer = threading.Thread(target=self._write_loop, name='slow-capture', daemon=True)
+                    self._writer.start()
+
+    def _write_loop(self):
+        while True:
+            img_bytes, record = self._queue.get()
+            try:
+                self.write(img_bytes, record)
+            except Exception as e:
+                print(f"[slow_capture] write failed: {e}")
+
+    def write(self, img_bytes, record):
+        digest = image_hash(img_bytes)
+        entry_dir = os.path.join(self.directory, f"{digest[:16]}-{record['route'].rstrip('/').rsplit('/', 1)[-1]}")
+        meta_path = os.path.join(entry_dir, 'meta.json')
+
+        if os.path.exists(meta_path):
+            meta = self.load(entry_dir)
+            meta['hits'] = meta.get('hits', 1) + 1
+        else:
+            os.makedirs(entry_dir, exist_ok=True)
+            data, ext, image_info = stored_image(img_bytes)
+            image_file = f'image.{ext}'
+            with open(os.path.join(entry_dir, image_file), 'wb') as f:
+                f.write(data)
+            meta = {'sha256': digest, 'image': {'file': image_file, 'bytes': len(img_bytes), **image_info}, 'hits': 1}
+
+        # Latest request wins; earlier latencies are kept as history
+        meta['history'] = (meta.get('history', []) + [
+            {'route': record['route'], 'elapsed_ms': record['elapsed_ms'], 'captured_at': record['captured_at']}
+        ])[-HISTORY:]
+        meta.update(record)
+        tmp_path = meta_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(meta, f, indent=2, default=str)
+        os.replace(tmp_path, meta_path)
+        self.captured += 1
+        print(f"[slow_capture] {record['route']} {record['elapsed_ms']}ms -> {entry_dir}")
+        self.evict()
+
+    def evict(self):
+        entries = self.entries()
+        for entry_dir, meta in entries[:max(0, len(entries) - self.max_entries)]:
+            shutil.rmtree(entry_dir, ignore_errors=True)
+
+    # ---------- reading ----------
+    @staticmethod
+    def load(entry_dir):
+        with open(os.path.join(entry_dir, 'meta.json')) as f:
+            return json.load(f)
+
+    def entries(self):
+        """[(entry_dir, meta)] oldest capture first"""
+        if not os.path.isdir(self.directory):
+            return []
+        entries = []
+        for name in os.listdir(self.directory):
+            entry_dir = os.path.join(self.directory, name)
+            try:
+                entries.append((entry_dir, self.load(entry_dir)))
+            except (OSError, ValueError):
+                continue
+        return sorted(entries, key=lambda entry: entry[1].get('captured_at', 0))
+
+    def stats(self):
+        return {
+            'enabled': bool(THRESHOLD_MS),
+            'threshold_ms': THRESHOLD_MS,
+            'directory': self.directory,
+            'captured': self.captured,
+            'dropped': self.dropped,
+            'pending': self._queue.qsize()
+        }
+
+
+store = SlowCaptureStore()
+
+
+# ==================== server integration ====================
+def instrument_flask(app):
+    """Time every request and capture slow 'image' uploads"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_capture_clock():
+        g.capture_started = time.perf_counter()
+
+    @app.after_request
+    def _capture_slow_request(response):
+        started = g.pop('capture_started', None)
+        upload = request.files.get('image') if request.files else None
+        if started is None or upload is None or response.is_streamed:
+            return response
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        if THRESHOLD_MS and elapsed_ms >= THRESHOLD_MS:
+            upload.stream.seek(0)
+            route = request.url_rule.rule if request.url_rule else request.path
+            store.observe(route, upload.read(), request.values, elapsed_ms,
+                          response.status_code, tracing.current_trace())
+        return response
+
+
+class ASGIMiddleware:
+    """
+    Time every HTTP request and capture slow ones. Endpoints opt in by
+    leaving the upload in request.state.capture_image (and the parameters
+    in request.state.capture_params), see asgi_server.read_image.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not THRESHOLD_MS:
+            return await self.app(scope, receive, send)
+
+        started = time.perf_counter()
+        status = {}
+
+        async def send_with_status(message):
+            if message['type'] == 'http.response.start':
+                status['code'] = message['status']
+            await send(message)
+
+        await self.app(scope, receive, send_with_status)
+        state = scope.get('state') or {}
+        if 'capture_image' in state:
+            store.observe(scope['path'], state['capture_image'], state.get('capture_params', {}),
+                          (time.perf_counter() - started) * 1000, status.get('code', 200),
+                          tracing.current_trace())
+
+
+# ==================== replay ====================
+def replay_function(route, params):
+    """The ocr_worker call that reproduces a captured route (and its pipeline profile)"""
+    import ocr_worker
+    from enhanced_ocr_pipeline import INGREDIENT_OUTPUTS, NUTRITION_OUTPUTS, parse_outputs
+
+    profile = (params.get('profile') or None,)
+    if route == '/api/ocr/analyze':
+        return ocr_worker.analyze, profile
+    if route == '/api/ocr/analyze-step':
+        return ocr_worker.analyze_steps, profile
+    if route == '/api/ocr/extract-nutrition':
+        return ocr_worker.extract_nutrition, (parse_outputs(params.get('outputs'), NUTRITION_OUTPUTS),) + profile
+    if route == '/api/ocr/extract-ingredients':
+        return ocr_worker.extract_ingredients, (parse_outputs(params.get('outputs'), INGREDIENT_OUTPUTS),) + profile
+    if route in ('/api/analyze/generic', '/api/generic/analyze'):
+        return ocr_worker.analyze_generic, profile
+    return None, ()
+
+
+def replay_entry(entry_dir, meta, runs=1, threshold_ms=THRESHOLD_MS):
+    """Run one capture through the current pipeline; returns a report dict"""
+    report = {
+        'id': os.path.basename(entry_dir),
+        'route': meta['route'],
+        'captured_ms': meta['elapsed_ms'],
+        'captured_variant': meta.get('ocr_variant'),
+        'downscaled': meta['image'].get('downscaled', False)
+    }
+    fn, extra_args = replay_function(meta['route'], meta.get('params', {}))
+    if fn is None:
+        report['error'] = 'route not replayable'
+        return report
+
+    with open(os.path.join(entry_dir, meta['image']['file']), 'rb') as f:
+        img_bytes = f.read()
+
+    timings = []
+    trace = None
+    for _ in range(runs):
+        trace = tracing.start_trace(f"replay {meta['route']}")
+        started = time.perf_counter()
+        try:
+            fn(img_bytes, *extra_args)
+        except Exception as e:
+            report['error'] = str(e)
+            return report
+        finally:
+            tracing.finish_trace(trace, export=False)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    replay_ms = statistics.median(timings)
+    report.update({
+        'replay_ms': round(replay_ms, 1),
+        'speedup': round(meta['elapsed_ms'] / replay_ms, 2) if replay_ms else None,
+        'fixed': replay_ms < threshold_ms if threshold_ms else None,
+        'replay_variant': trace.find_attribute('ocr_variant'),
+        'stages': trace.summary()
+    })
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='List or replay captured slow OCR requests')
+    parser.add_argument('command', choices=['list', 'replay'])
+    parser.add_argument('ids', nargs='*', help='Capture ids (directory name prefixes); default all')
+    parser.add_argument('--dir', default=CAPTURE_DIR, help='Capture directory')
+    parser.add_argument('--route', help='Only captures of this route')
+    parser.add_argument('--runs', type=int, default=1, help='Replays per capture (median is reported)')
+    parser.add_argument('--threshold-ms', type=float, default=THRESHOLD_MS,
+                        help='Latency a replay must beat to count as fixed (default OCR_SLOW_CAPTURE_MS)')
+    parser.add_argument('--json', dest='json_path', help='Write the replay report to this file')
+    args = parser.parse_args()
+
+    entries = [
+        (entry_dir, meta) for entry_dir, meta in SlowCaptureStore(args.dir).entries()
+        if (not args.ids or any(os.path.basename(entry_dir).startswith(i) for i in args.ids))
+        and (not args.route or meta.get('route') == args.route)
+    ]
+    if not entries:
+        print(f"No captures in {args.dir}")
+        return 1
+
+    if args.command == 'list':
+        for entry_dir, meta in entries:
+            captured = time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(meta.get('captured_at', 0)))
+            print(f"{os.path.basename(entry_dir):<36}{captured}  {meta['route']:<30}"
+                  f"{meta['elapsed_ms']:>9.1f} ms  hits={meta.get('hits', 1)}  variant={meta.get('ocr_variant')}")
+        return 0
+
+    # Warm both pipelines first so the first replay is not charged for imports
+    import api_server
+    import test_ocr_simple
+    api_server.warmup()
+    test_ocr_simple.warmup_ocr()
+
+    reports = []
+    print(f"{'id':<36}{'captured':>11}{'replay':>11}{'speedup':>9}  variant")
+    for entry_dir, meta in entries:
+        report = replay_entry(entry_dir, meta, args.runs, args.threshold_ms)
+        reports.append(report)
+        if 'error' in report:
+            print(f"{report['id']:<36}  error: {report['error']}")
+            continue
+        variant = report['replay_variant']
+        if variant != report['captured_variant']:
+            variant = f"{report['captured_variant']} -> {variant}"
+        print(f"{report['id']:<36}{report['captured_ms']:>9.1f}ms"
+              f"{report['replay_ms']:>9.1f}ms{report['speedup']:>8.2f}x  {variant}"
+              + ('  (downscaled image)' if report['downscaled'] else ''))
+
+    if args.json_path:
+        with open(args.json_path, 'w') as f:
+            json.dump(reports, f, indent=2)
+        print(f"Report written to {args.json_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
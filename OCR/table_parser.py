@@ -0,0 +1,242 @@
+"""
+Nutrition table parser over Tesseract word boxes
+The text parsers see a nutrition table after image_to_string has flattened
+it into lines, so a row reads "Protein 5.2 g 1.6 g 3%" and the per-100 g,
+per-serving and %RDA columns can only be told apart by guessing - which is
+where the decimal-recovery fixes and the extra OCR passes come in.
+
+read_table() works from image_to_data's word boxes instead:
+1. words are grouped into rows by their vertical centres
+2. each row is split into cells at gaps wider than a word space, and the
+   leading non-numeric cells become the row label
+3. the value cells of the nutrient rows are grouped into columns by
+   overlapping x-ranges
+4. the per-100 g column is the one under a "per 100 g" header (else the
+   leftmost column that is not a percentage column)
+5. each nutrient row's cell in that column is read with the label through
+   nutrient_rules, so units, ranges and label spellings stay in one table
+"""
+
+import re
+from statistics import median
+
+from fuzzy_index import food_index
+from nutrient_rules import LABEL_RE, NutrientScanner
+
+# image_to_data confidence below which a box is noise (-1: not a word)
+MIN_CONFIDENCE = 30
+# Words in one row: vertical centres within this many median word heights
+ROW_TOLERANCE = 0.5
+# A new cell starts at a horizontal gap of more than this many median word heights
+CELL_GAP = 1.0
+
+# Value cell: a number with an optional unit or percent sign ("12.5 g", "<0.1g", "3%")
+VALUE_CELL_RE = re.compile(r'^[<~]?\d[\d,.]*\s*(?:kcals?|kj|cal|mcg|µg|ug|mg|gms?|g|ml|%)?$', re.IGNORECASE)
+# Column headers; '1006' and '100 9' are common misreads of '100g'
+PER_100_RE = re.compile(r'per\s*100|100\s*(?:gms?|ml|[g96])\b', re.IGNORECASE)
+SERVING_RE = re.compile(r'serv|portion|per\s*pack', re.IGNORECASE)
+
+
+class Word:
+    """One image_to_data box"""
+
+    def __init__(self, text, left, top, width, height, conf):
+        self.text = text
+        self.left = left
+        self.top = top
+        self.width = width
+        self.height = height
+        self.conf = conf
+
+    @property
+    def right(self):
+        return self.left + self.width
+
+    @property
+    def center_x(self):
+        return self.left + self.width / 2
+
+    @property
+    def center_y(self):
+        return self.top + self.height / 2
+
+
+class Cell:
+    """Adjacent words of one row"""
+
+    def __init__(self, words):
+        self.words = words
+        self.text = ' '.join(w.text for w in words)
+        self.left = words[0].left
+        self.right = max(w.right for w in words)
+
+    @property
+    def center_x(self):
+        return (self.left + self.right) / 2
+
+    def is_value(self):
+        return bool(VALUE_CELL_RE.match(self.text))
+
+
+class Row:
+    """One table row: label text and the value cells to its right"""
+
+    def __init__(self, cells):
+        self.cells = cells
+        label = []
+        self.values = []
+        for cell in cells:
+            if not self.values and not cell.is_value():
+                label.append(cell.text)
+            elif cell.is_value():
+                self.values.append(cell)
+        self.label = ' '.join(label)
+        # Misspelt label words corrected ('Soturated Fat'), for matching only
+        self.key = food_index().correct_text(self.label, min_length=5)
+        self.is_nutrient = bool(LABEL_RE.search(self.key))
+
+    def value_in(self, column):
+        """The value cell overlapping column (left, right), if any"""
+        for cell in self.values:
+            if cell.left <= column[1] and cell.right >= column[0]:
+                return cell
+        return None
+
+
+class NutritionTable:
+    """What read_table() found: rows, value columns and the per-100 g values"""
+
+    def __init__(self, rows, columns, per_100g, basis, values, header=None):
+        self.rows = rows
+        # Row holding the "per 100 g" header, if one was found
+        self.header = header
+        # (left, right) per value column, left to right
+        self.columns = columns
+        # Index into columns, or None when no value column was found
+        self.per_100g = per_100g
+        # How the per-100 g column was chosen: 'header', 'first column' or None
+        self.basis = basis
+        # {nutrient: nutrient_rules.NutrientHit}
+        self.values = values
+
+    def region(self, margin=0.5):
+        """
+        (left, top, right, bottom) around the header and nutrient rows, padded
+        by `margin` median word heights; None if no nutrient row was found
+        """
+        words = [word for row in self.rows if row.is_nutrient for cell in row.cells for word in cell.words]
+        if not words:
+            return None
+        words += [word for cell in (self.header.cells if self.header else ()) for word in cell.words]
+        pad = int(median(w.height for w in words) * margin)
+        return (
+            max(min(w.left for w in words) - pad, 0),
+            max(min(w.top for w in words) - pad, 0),
+            max(w.right for w in words) + pad,
+            max(w.top + w.height for w in words) + pad
+        )
+
+
+def words_from_data(data, min_confidence=MIN_CONFIDENCE):
+    """Word boxes from pytesseract.image_to_data(..., output_type=Output.DICT)"""
+    words = []
+    for i, text in enumerate(data['text']):
+        text = (text or '').strip()
+        try:
+            conf = float(data['conf'][i])
+        except (TypeError, ValueError):
+            conf = -1
+        if not text or conf < min_confidence:
+            continue
+        words.append(Word(text, int(data['left'][i]), int(data['top'][i]),
+                          int(data['width'][i]), int(data['height'][i]), conf))
+    return words
+
+
+def group_rows(words, tolerance):
+    """Words grouped into rows (top to bottom), each sorted left to right"""
+    rows = []
+    for word in sorted(words, key=lambda w: w.center_y):
+        row = rows[-1] if rows else None
+        if row and abs(word.center_y - sum(w.center_y for w in row) / len(row)) <= tolerance:
+            row.append(word)
+        else:
+            rows.append([word])
+    return [sorted(row, key=lambda w: w.left) for row in rows]
+
+
+def split_cells(words, gap):
+    """A row's words split into cells at gaps wider than `gap` and where a label runs into a number"""
+    cells = []
+    current = []
+    for word in words:
+        if current and (word.left - current[-1].right > gap or _starts_value(current, word)):
+            cells.append(Cell(current))
+            current = []
+        current.append(word)
+    if current:
+        cells.append(Cell(current))
+    return cells
+
+
+def _starts_value(current, word):
+    """True if word is the first number after label words ("Protein 5.2 g" set tight)"""
+    return word.text[0].isdigit() and not any(w.text[0].isdigit() for w in current)
+
+
+def find_columns(rows):
+    """(left, right) of each value column: the nutrient rows' value cells merged by overlapping x-range"""
+    spans = sorted((cell.left, cell.right) for row in rows if row.is_nutrient for cell in row.values)
+    columns = []
+    for left, right in spans:
+        if columns and left <= columns[-1][1]:
+            columns[-1] = (columns[-1][0], max(columns[-1][1], right))
+        else:
+            columns.append((left, right))
+    return columns
+
+
+def find_per_100g(rows, columns):
+    """(column index, basis, header row) of the per-100 g column, or (None, None, None)"""
+    if not columns:
+        return None, None, None
+    for row in rows:
+        if row.is_nutrient:
+            continue
+        for cell in row.cells:
+            if PER_100_RE.search(cell.text) and not SERVING_RE.search(cell.text):
+                nearest = min(range(len(columns)), key=lambda i: abs(sum(columns[i]) / 2 - cell.center_x))
+                return nearest, 'header', row
+    # No header: the leftmost column that is not mostly percentages (%RDA)
+    for i, column in enumerate(columns):
+        cells = [row.value_in(column) for row in rows if row.is_nutrient]
+        cells = [cell for cell in cells if cell is not None]
+        if sum(cell.text.endswith('%') for cell in cells) * 2 < len(cells):
+            return i, 'first column', None
+    return None, None, None
+
+
+def read_table(data, scanner=None):
+    """
+    NutritionTable from image_to_data output; values are read from the
+    per-100 g column with `scanner` (default: every nutrient, normalized)
+    """
+    scanner = scanner or NutrientScanner()
+    words = words_from_data(data)
+    if not words:
+        return NutritionTable([], [], None, None, {})
+
+    height = median(w.height for w in words)
+    rows = [Row(split_cells(row, height * CELL_GAP)) for row in group_rows(words, height * ROW_TOLERANCE)]
+    columns = find_columns(rows)
+    per_100g, basis, header = find_per_100g(rows, columns)
+
+    values = {}
+    if per_100g is not None:
+        for row in rows:
+            cell = row.value_in(columns[per_100g]) if row.is_nutrient else None
+            if cell is None:
+                continue
+            for nutrient, hit in scanner.scan(f"{row.key} {cell.text}").items():
+                values.setdefault(nutrient, hit)
+    return NutritionTable(rows, columns, per_100g, basis, values, header)
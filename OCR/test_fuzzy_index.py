@@ -0,0 +1,80 @@
+"""
+Regression tests for fuzzy_index: OCR misreads are fixed, real ingredients never rewritten
+Run: python -m pytest test_fuzzy_index.py
+"""
+
+import pytest
+
+import test_ocr_simple
+from fuzzy_index import food_index
+from nutrient_rules import NutrientScanner
+
+
+@pytest.fixture
+def without_nltk(monkeypatch):
+    """nltk is not in requirements.txt: the food lexicon alone must protect real words"""
+    monkeypatch.setattr(test_ocr_simple, 'english_vocab', lambda: frozenset())
+
+
+def test_ingredient_list_is_not_rewritten(without_nltk):
+    result = test_ocr_simple.parse_with_validation(
+        "Ingredients: Wheat flour, Sucrose, Cocoa butter, Kidney Bean, Pea protein, Beet sugar, Soy lecithin"
+    )
+    assert result['ingredients'] == [
+        'Wheat Flour', 'Sucrose', 'Cocoa Butter', 'Kidney Bean', 'Pea Protein', 'Beet Sugar', 'Soy Lecithin'
+    ]
+
+
+@pytest.mark.parametrize('word', [
+    'sucrose', 'wafer', 'bay', 'bean', 'pea', 'beet', 'soy', 'kidney', 'beans', 'wafers',
+    # English words outside the lexicon, a cheap OCR edit or two from a food word
+    'contact', 'service', 'servant', 'better', 'while', 'lived'
+])
+def test_real_words_are_kept(word):
+    assert food_index().correct(word) == word
+
+
+@pytest.mark.parametrize('word', ['wafer', 'bay', 'bean', 'pea', 'beet', 'soy'])
+def test_standalone_ingredient_is_kept(without_nltk, word):
+    assert test_ocr_simple.normalize_ingredient(word) == word
+
+
+@pytest.mark.parametrize('misread, word', [
+    ('soturated', 'saturated'),
+    ('satruated', 'saturated'),
+    ('sodlum', 'sodium'),
+    ('sod1um', 'sodium'),
+    ('enerqy', 'energy'),
+    ('protien', 'protein'),
+    ('cholestrol', 'cholesterol'),
+    ('vegetanle', 'vegetable'),
+    ('emulsifer', 'emulsifier'),
+    ('lodised', 'iodised'),
+    ('oill', 'oil'),
+    # two edits
+    ('lodized', 'iodised'),
+    ('carbohvdrate', 'carbohydrate'),
+    ('hydrogenatd', 'hydrogenated'),
+])
+def test_misreads_are_corrected(misread, word):
+    assert food_index().correct(misread) == word
+
+
+@pytest.mark.parametrize('misread', [
+    'pamolien',  # two full edits in eight letters
+    'oi',        # too short for any edit
+])
+def test_large_errors_are_kept(misread):
+    assert food_index().correct(misread) == misread
+
+
+def test_ambiguous_misread_is_kept():
+    # 'flavor' and 'flavour' are both one edit away
+    assert food_index().correct('flavur') == 'flavur'
+
+
+def test_misspelt_labels_are_scanned():
+    hits = NutrientScanner().scan('Protien 5 g Sodlum 120 mg Soturated Fat 2 g Carbohvdrate 60 g')
+    assert {n: hit.value for n, hit in hits.items()} == {
+        'protein': 5, 'sodium': 120, 'saturated_fat': 2, 'carbohydrate': 60
+    }
@@ -0,0 +1,93 @@
+"""
+Regression tests for nutrient_solver: decimal points placed across a whole label
+Run: python -m pytest test_nutrient_solver.py
+"""
+
+import glob
+import json
+import os
+
+import pytest
+
+import test_ocr_simple
+import test_ocr_simple_fixed
+from enhanced_ocr_pipeline import FoodPackageOCR
+from nutrient_rules import NUTRIENT_RULES, NutrientHit
+from nutrient_solver import solve
+
+GOLDEN = sorted(glob.glob(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'test_images', '*_result.json')))
+
+
+def printed(**values):
+    """{nutrient: NutrientHit} for values printed without a decimal point"""
+    return {
+        nutrient: NutrientHit(nutrient, value, NUTRIENT_RULES[nutrient]['unit'], 0, 0, has_decimal=False)
+        for nutrient, value in values.items()
+    }
+
+
+@pytest.mark.parametrize('path', GOLDEN, ids=os.path.basename)
+def test_golden_nutrition_facts(path):
+    with open(path, encoding='utf-8') as f:
+        golden = json.load(f)
+    result = test_ocr_simple_fixed.parse_with_validation(golden['raw_text'])
+    assert result['nutrition_facts'] == golden['nutrition_facts']
+
+
+def test_typical_range_breaks_tie():
+    # test-22: 32 + 80 > 100 g; 3.2 g protein is likelier than 8.0 g carbohydrate
+    solution = solve(printed(protein=32, carbohydrate=80))
+    assert solution.values == {'protein': 3.2, 'carbohydrate': 80}
+    assert solution.divisors == {'protein': 10}
+    assert not solution.ambiguous
+    assert not solution.needs_reocr
+
+
+def test_remaining_tie_needs_reocr():
+    # 60 + 50 > 100 g: 6.0 g carbohydrate and 5.0 g fat are equally likely
+    solution = solve(printed(carbohydrate=60, total_fat=50))
+    assert solution.consistent
+    assert solution.ambiguous
+    assert solution.needs_reocr
+
+
+def test_consistent_label_is_kept():
+    solution = solve(printed(energy=380, protein=10, carbohydrate=60, total_fat=11))
+    assert solution.values == {'energy': 380, 'protein': 10, 'carbohydrate': 60, 'total_fat': 11}
+    assert not solution.divisors
+    assert not solution.needs_reocr
+
+
+@pytest.mark.parametrize('text, facts', [
+    # kJ is checked as 250 kcal but reported as printed
+    ('Energy 1046 kJ\nProtein 6 g\nCarbohydrate 30 g\nTotal Fat 10 g',
+     {'energy': '1046 kj', 'protein': '6', 'carbohydrate': '30', 'fat': '10'}),
+    ('Energy 250 kcal\nProtein 6000 mg\nCarbohydrate 30 g\nTotal Fat 10 g\nSodium 400 mg',
+     {'energy': '250 kcal', 'protein': '6000', 'carbohydrate': '30', 'fat': '10', 'sodium': '400 mg'}),
+    # A lost decimal point is put back in the printed unit
+    ('Protein 32 g\nCarbohydrate 80 g', {'protein': '3.2', 'carbohydrate': '80'}),
+])
+def test_pipeline_units(text, facts):
+    assert FoodPackageOCR().nlp_postprocess(text)['nutrition_facts'] == facts
+
+
+class TablePipeline:
+    """FoodPackageOCR stand-in whose nutrition table reads `values`"""
+
+    def __init__(self, values):
+        self.values = values
+
+    def read_solved_table(self, img, scanner):
+        return None, solve(self.values)
+
+
+def test_generic_route_rereads_table(monkeypatch):
+    result = test_ocr_simple.parse_with_validation('Energy 500.0 kcal Protein 1.5 g Carbohydrate 2.5 g Total Fat 3.5 g')
+    assert result['needs_reocr']
+    table = TablePipeline(printed(energy=250, protein=6, carbohydrate=30, total_fat=10))
+    monkeypatch.setattr(test_ocr_simple, 'profile_pipeline', lambda: table)
+    monkeypatch.setattr(test_ocr_simple, 'tesseract', lambda: None)
+    test_ocr_simple.reread_table(None, result)
+    assert not result['needs_reocr']
+    assert result['nutrition_facts']['protein_g'] == 6
+    assert result['nutrition_facts']['carbohydrate_g'] == 30
@@ -2,111 +2,150 @@
 OCR Test with Sanity Validation and Decimal Recovery
 """
 
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response
 from flask_cors import CORS
 import sys
 import os
-import cv2
 import json
-import pytesseract
+import logging
 import re
-import numpy as np
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
-# Configure Gemini AI
-try:
-    import google.generativeai as genai
-    gemini_api_key = os.getenv('GEMINI_API_KEY')
-    if gemini_api_key:
-        genai.configure(api_key=gemini_api_key)
-        
-        # List available models and pick the first one that supports generateContent
-        try:
-            models = genai.list_models()
-            available_model = None
-            for m in models:
-                if 'generateContent' in m.supported_generation_methods:
-                    available_model = m.name
-                    break
-            
-            if available_model:
-                model = genai.GenerativeModel(available_model)
-                print(f"Gemini AI configured with model: {available_model}")
-            else:
-                # Fallback to common model names
-                try:
-                    model = genai.GenerativeModel('gemini-1.5-pro')
-                    print("Using gemini-1.5-pro")
-                except:
-                    try:
-                        model = genai.GenerativeModel('gemini-pro')
-                        print("Using gemini-pro")
-                    except:
-                        model = None
-                        print("No compatible Gemini model found")
-        except Exception as e:
-            print(f"Error listing models: {e}")
-            model = None
-    else:
-        model = None
-        print("No Gemini API key found")
-except ImportError:
-    model = None
-    print("Google Generative AI not installed")
+TESSERACT_CMD = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 
-def fix_decimal(value):
-    """
-    Fix OCR decimal issues like 5269 -> 52.69
-    """
-    if value >= 100:
-        return value / 100
-    return value
+# Gemini model for /api/chat: discovered on first use (or by warmup), not at
+# import - listing models is a network round trip every restart used to pay
+_gemini_lock = threading.Lock()
+_gemini_model = None
+_gemini_discovered = False
 
 
-def parse_number(token):
-    """Parse a numeric token returned by OCR, handling commas and common OCR smashes.
+def discover_gemini_model():
+    """Configure Gemini and pick a model that supports generateContent (None if unavailable)"""
+    try:
+        import google.generativeai as genai
+    except ImportError:
+        print("Google Generative AI not installed")
+        return None
 
-    Returns a tuple (value: float, raw_unit: str|None)
-    """
-    if token is None:
-        return None, None
-
-    s = str(token).lower().strip()
-    # remove stray plus/minus
-    s = re.sub(r"[^0-9\.,kgm]", "", s)
-
-    # unit detection
-    unit = None
-    if s.endswith('mg'):
-        unit = 'mg'
-        s = s[:-2]
-    elif s.endswith('g'):
-        unit = 'g'
-        s = s[:-1]
-
-    # Normalize comma as thousand/decimal depending on context
-    # If more than one comma, remove thousands commas
-    if s.count(',') > 1:
-        s = s.replace(',', '')
-    # If there's a comma and no dot, treat comma as decimal
-    if ',' in s and '.' not in s:
-        s = s.replace(',', '.')
+    gemini_api_key = os.getenv('GEMINI_API_KEY')
+    if not gemini_api_key:
+        print("No Gemini API key found")
+        return None
+    genai.configure(api_key=gemini_api_key)
 
+    # List available models and pick the first one that supports generateContent
     try:
-        val = float(s)
-    except Exception:
-        # fallback: remove non-digits and try
-        digits = re.sub(r'[^0-9.]', '', s)
-        if digits == '':
-            return None, unit
-        val = float(digits)
-
-    return val, unit
-pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
-from OCR import get_text
+        models = genai.list_models()
+        available_model = None
+        for m in models:
+            if 'generateContent' in m.supported_generation_methods:
+                available_model = m.name
+                break
+
+        if available_model:
+            print(f"Gemini AI configured with model: {available_model}")
+            return genai.GenerativeModel(available_model)
+        # Fallback to common model names
+        try:
+            model = genai.GenerativeModel('gemini-1.5-pro')
+            print("Using gemini-1.5-pro")
+            return model
+        except:
+            try:
+                model = genai.GenerativeModel('gemini-pro')
+                print("Using gemini-pro")
+                return model
+            except:
+                print("No compatible Gemini model found")
+                return None
+    except Exception as e:
+        print(f"Error listing models: {e}")
+        return None
+
+
+def gemini_model():
+    """The Gemini model, discovered once per process on first call"""
+    global _gemini_model, _gemini_discovered
+    if not _gemini_discovered:
+        with _gemini_lock:
+            if not _gemini_discovered:
+                _gemini_model = discover_gemini_model()
+                _gemini_discovered = True
+    return _gemini_model
+
+
+def tesseract():
+    """pytesseract, imported on first use and pointed at the Tesseract install"""
+    import pytesseract
+    pytesseract.pytesseract.tesseract_cmd = TESSERACT_CMD
+    return pytesseract
+
+
+from singleflight import SingleFlight, content_key
+from admission import AdmissionController, AdmissionRejected, ROUTE_LANES, rejection_body
+from responses import compact_generic, render
+from nutrient_rules import DECIMAL_POINT, NutrientHit, NutrientScanner, parse_number
+from nutrient_solver import solve
+from token_index import PhraseTable, TokenIndex
+from fuzzy_index import food_index
+from vocab import english_vocab
+import metrics
+import tracing
+import profiler
+import slow_capture
+from metrics import stage, tesseract_pass
+
+logger = logging.getLogger(__name__)
+
+# nutrient_rules name -> nutrition_facts key (values in the key's unit)
+NUTRITION_KEYS = {
+    'energy': 'energy_kcal',
+    'protein': 'protein_g',
+    'carbohydrate': 'carbohydrate_g',
+    'total_fat': 'total_fat_g',
+    'saturated_fat': 'saturated_fat_g',
+    'trans_fat': 'trans_fat_g',
+    'sodium': 'sodium_mg',
+    'added_sugar': 'added_sugar_g',
+    'total_sugar': 'total_sugar_g'
+}
+NUTRITION_SCANNER = NutrientScanner(NUTRITION_KEYS)
+NUTRIENTS_BY_KEY = {key: nutrient for nutrient, key in NUTRITION_KEYS.items()}
+
+# Second pass: label spellings matched anywhere in the 40 chars before a number, in text
+# whose misspelt words ('soturated') the food index has already corrected; what is left
+# here are truncations and OCR garbage too far from any word to correct
+PROXIMITY_LABELS = PhraseTable({
+    'total_fat_g': ['total f', 'totalf', 'total fat', 'total: f', 'total:fat', 'total:f', 'total f:'],
+    'saturated_fat_g': ['saturated'],
+    'trans_fat_g': ['trans fat', 'transf', 'trans fat o', 'transfat'],
+    'sodium_mg': ['sodium', 'sec', 'sot', 'sod', 'na', 'salt'],
+    'added_sugar_g': ['added sugar', 'added sas', 'assad sas', 'added sac'],
+    'total_sugar_g': ['total sugar', 'total s', 'total: sugar']
+})
+SODIUM_WORDS = re.compile(r'sodium|sec|salt|\bna\b|sod', re.IGNORECASE)
+SODIUM_CANDIDATES = re.compile(r'([0-9]{2,4})\s*(mg|m)?', re.IGNORECASE)
+
+# Identical concurrent uploads (double-submits, viral products) share one OCR run
+flight = SingleFlight()
+# Bounded queue + concurrency limit in front of the camera-scan OCR
+admission = AdmissionController()
+# Preprocessing + passes for requests that pick a pipeline profile (?profile=fast)
+_profile_ocr = None
+
+
+def profile_pipeline():
+    """FoodPackageOCR for profile requests, created (with the OCR stack) on first use"""
+    global _profile_ocr
+    if _profile_ocr is None:
+        from enhanced_ocr_pipeline import FoodPackageOCR
+        _profile_ocr = FoodPackageOCR()
+    return _profile_ocr
 
 def choose_best_text(texts):
     """Choose best OCR text based on content quality"""
@@ -121,31 +160,29 @@ def choose_best_text(texts):
     return max(scores, key=lambda x: x[0])[1]
     
 def normalize_ingredient(text):
-    text = text.lower().strip()
-
-    fixes = {
-        'vegetanle': 'vegetable',
-        'vegetable oill': 'vegetable oil',
-        'oi': 'oil',
-        'oill': 'oil',
-        'palmolein oi': 'palmolein oil',
-
-        # 🔴 CRITICAL FIX FOR SALT
-        'lodised': 'iodised',
-        'lodized': 'iodised',
-        'iodized': 'iodised',
-        'iodise': 'iodised',
-        'iodise salt': 'iodised salt',
-        'lodised salt': 'iodised salt',
-        'lodized salt': 'iodised salt',
-    }
+    # OCR misreads ('lodised', 'oill', 'vegetanle') -> the nearest food word within
+    # two edits; English words outside the food vocabulary are left alone
+    return food_index().correct_text(text.strip(), keep=english_vocab()).strip()
 
-    # Apply replacements with word boundaries and longest-first to avoid overlapping replacements
-    for wrong in sorted(fixes.keys(), key=lambda x: -len(x)):
-        correct = fixes[wrong]
-        text = re.sub(r"\b" + re.escape(wrong) + r"\b", correct, text)
 
-    return text.strip()
+def reread_table(img, result):
+    """
+    The text's nutrient values fail the solver's checks (needs_reocr): read the
+    nutrition table from word boxes, as FoodPackageOCR.finish does, and keep its
+    values if they pass
+    """
+    from enhanced_ocr_pipeline import TABLE_PARSER
+
+    if not TABLE_PARSER:
+        return
+    tesseract()
+    _, solution = profile_pipeline().read_solved_table(img, NUTRITION_SCANNER)
+    if solution is None or solution.needs_reocr:
+        return
+    for nutrient, key in NUTRITION_KEYS.items():
+        if nutrient in solution.values:
+            result['nutrition_facts'][key] = round(solution.values[nutrient], 2)
+    result['needs_reocr'] = False
 
 
 def capitalize_ingredient(text):
@@ -167,99 +204,40 @@ def parse_with_validation(raw_text):
     
     text = raw_text.lower()
     
-    # Improved nutrition extraction: patterns include unit tokens and capture numeric token
-    nutrition_patterns = {
-        'energy_kcal': r'(?:energy|ener)\b[^\d\n]{0,12}([0-9][0-9,\.]{0,6})\s*(kcal|cal)?',
-        'protein_g': r'(?:protein|prt)\b[^\d\n]{0,12}([0-9][0-9,\.]{0,6})\s*(g)?',
-        'carbohydrate_g': r'carbohydrate\b[^\d\n]{0,12}([0-9][0-9,\.]{0,6})\s*(g)?',
-        'total_fat_g': r'(?:total\s+fat|totalfat|fat\s*total)\b[^\d\n]{0,12}([0-9][0-9,\.]{0,6})\s*(g)?',
-        'saturated_fat_g': r'saturated\b[^a-z]{0,5}fat\b[^\d\n]{0,12}([0-9][0-9,\.]{0,6})\s*(g)?',
-        'trans_fat_g': r'trans\b[^a-z]{0,5}fat\b[^\d\n]{0,12}([0-9][0-9,\.]{0,6})\s*(g)?',
-        'sodium_mg': r'sodium\b[^\d\n]{0,12}([0-9][0-9,\.]{0,8})\s*(mg|g)?',
-        'added_sugar_g': r'added\s*sugar[s]?\b[^\d\n]{0,12}([0-9][0-9,\.]{0,6})\s*(g)?',
-        'total_sugar_g': r'total\s*sugar[s]?\b[^\d\n]{0,12}([0-9][0-9,\.]{0,6})\s*(g)?'
-    }
+    # Nutrition extraction: one pass for all nutrients, with unit conversion
+    # and sanity ranges from the nutrient_rules table
+    hits = NUTRITION_SCANNER.scan(text)
 
-    for key, pattern in nutrition_patterns.items():
-        match = re.search(pattern, text, flags=re.IGNORECASE)
-        if not match:
-            continue
-
-        num_token = match.group(1)
-        unit_token = None
-        if match.lastindex and match.lastindex >= 2:
-            unit_token = match.group(2)
-
-        val, detected_unit = parse_number(num_token)
-        unit = (unit_token or detected_unit or '').lower()
-
-        if val is None:
-            continue
-
-        # Normalize units: convert g -> keep as g, convert g to mg for sodium if needed
-        if key == 'sodium_mg':
-            if unit == 'g':
-                val = val * 1000
-            # if no unit and val < 2000 assume mg (common on labels)
-            elif unit == '' and val > 0 and val < 2000:
-                pass
-            # don't apply fix_decimal to sodium
-        else:
-            # apply decimal recovery for gram values when OCR squashes decimals
-            if unit in ('g', '') and val >= 100:
-                val = val / 100.0
-
-        # Sanity checks
-        if key == 'trans_fat_g' and val > 10:
-            continue
-        if key == 'added_sugar_g' and val > 100:
-            continue
-        if key == 'protein_g' and val > 500:
-            continue
-
-        result['nutrition_facts'][key] = round(val, 2)
+    # One index of numbers and label positions serves both proximity passes below,
+    # over the text with misspelt words (5+ letters) corrected
+    index = TokenIndex(food_index().correct_text(text, keep=english_vocab(), min_length=5), PROXIMITY_LABELS)
 
     # Secondary pass: proximity-based assignment for OCR-mangled labels
-    if result['nutrition_facts']:
-        # collect numeric tokens with spans
-        numeric_re = re.finditer(r'([0-9][0-9,\.]{0,8})\s*(mg|g|kcal|cal)?', text, flags=re.IGNORECASE)
-        nums = []
-        for m in numeric_re:
-            nums.append((m.start(), m.end(), m.group(1), (m.group(2) or '').lower()))
-
-        synonyms = {
-            'total_fat_g': ['total f', 'totalf', 'total fat', 'total: f', 'total:fat', 'total:f', 'total f:'],
-            'saturated_fat_g': ['saturated', 'soturated', 'soturated fat', 'soturated', 'satruated'],
-            'trans_fat_g': ['trans fat', 'transf', 'trans fat o', 'transfat'],
-            'sodium_mg': ['sodium', 'sec', 'sot', 'sod', 'na', 'salt'],
-            'added_sugar_g': ['added sugar', 'added sas', 'assad sas', 'added sac'],
-            'total_sugar_g': ['total sugar', 'total s', 'total: sugar']
-        }
-
-        for key, keysyn in synonyms.items():
-            if key in result['nutrition_facts']:
+    if hits:
+        for key in PROXIMITY_LABELS.keys:
+            if NUTRIENTS_BY_KEY[key] in hits:
                 continue
-            # look for any numeric token with a synonym within 40 chars before it
-            assigned = None
-            for (spos, epos, token, unit) in nums:
-                window_start = max(0, spos - 40)
-                context = text[window_start:spos]
-                for syn in keysyn:
-                    if syn in context:
-                        val, detected_unit = parse_number(token)
-                        if val is None:
-                            continue
-                        # convert units where necessary
-                        if key == 'sodium_mg' and (detected_unit == 'g' or unit == 'g'):
-                            val = val * 1000
-                        elif key.endswith('_g') and (detected_unit in ('', 'g') or unit in ('', 'g')):
-                            if val >= 100:
-                                val = val / 100.0
-                        result['nutrition_facts'][key] = round(val, 2)
-                        assigned = True
-                        break
-                if assigned:
-                    break
+            # the first numeric token with a synonym within 40 chars before it
+            for (spos, epos, token, unit) in index.numbers_after(key, window=40):
+                val, detected_unit = parse_number(token)
+                if val is None:
+                    continue
+                # convert units where necessary
+                if key == 'sodium_mg' and (detected_unit == 'g' or unit == 'g'):
+                    val = val * 1000
+                nutrient = NUTRIENTS_BY_KEY[key]
+                hits[nutrient] = NutrientHit(nutrient, val, unit or detected_unit, spos, epos,
+                                             has_decimal=bool(DECIMAL_POINT.search(token)))
+                break
+
+    # Decimal points placed across all nutrients at once (energy vs macros,
+    # saturated <= total fat, ...) instead of per-nutrient guesses
+    solution = solve(hits)
+    for nutrient, key in NUTRITION_KEYS.items():
+        if nutrient in solution.values:
+            result['nutrition_facts'][key] = round(solution.values[nutrient], 2)
+    # No placement fits: the table needs a closer OCR, not more whole-image passes
+    result['needs_reocr'] = solution.needs_reocr
 
     
     # FIXED: Hard stop ingredients extraction
@@ -347,29 +325,21 @@ def parse_with_validation(raw_text):
     if 'sugar_g' not in nf:
         nf['sugar_g'] = nf.get('added_sugar_g') if nf.get('added_sugar_g') is not None else nf.get('total_sugar_g')
 
-    # Fix likely OCR-mangled trans fat like `19` that should be 0.19
-    if 'trans_fat_g' in nf and nf['trans_fat_g'] is not None:
-        tf = nf['trans_fat_g']
-        if tf > 5 and tf < 100:
-            nf['trans_fat_g'] = round(tf / 100.0, 2)
-
     # If sodium looks implausibly large (>1500 mg), try to find a closer mg token near sodium/sec/salt
     if 'sodium_mg' in nf and nf['sodium_mg'] is not None and nf['sodium_mg'] > 1500:
         # search for numeric mg tokens and choose the one closest to sodium-like words
-        sodium_keywords = [m.start() for m in re.finditer(r'sodium|sec|salt|\bna\b|sod', text, flags=re.IGNORECASE)]
         best_candidate = None
         best_dist = None
-        for m in re.finditer(r'([0-9]{2,4})\s*(mg|m)?', text, flags=re.IGNORECASE):
+        for m in SODIUM_CANDIDATES.finditer(index.text):
             try:
                 val = int(re.sub(r'[^0-9]', '', m.group(1)))
             except Exception:
                 continue
             if not (50 <= val <= 2000):
                 continue
-            span_start = m.start()
-            if not sodium_keywords:
+            dist = index.distance(m.start(), SODIUM_WORDS)
+            if dist is None:
                 continue
-            dist = min(abs(span_start - k) for k in sodium_keywords)
             if dist <= 60 and (best_dist is None or dist < best_dist):
                 best_dist = dist
                 best_candidate = val
@@ -383,6 +353,54 @@ def parse_with_validation(raw_text):
 app = Flask(__name__)
 CORS(app)
 
+# Prometheus /metrics: per-route request time/CPU/Tesseract passes, stage histograms
+metrics.instrument_flask(app)
+metrics.register_coalescing(flight, 'test_ocr_simple')
+metrics.register_admission(admission, 'test_ocr_simple')
+# Per-request spans: Server-Timing header, optional OTLP export (OCR_TRACE_EXPORT)
+tracing.instrument_flask(app)
+# Admin-only sampling profiler: GET /api/admin/profile (needs OCR_ADMIN_TOKEN)
+profiler.instrument_flask(app)
+# Opt-in capture of slow requests for replay (OCR_SLOW_CAPTURE_MS)
+slow_capture.instrument_flask(app)
+
+
+def warmup_ocr():
+    """
+    Import the OCR stack and exercise parsing and preprocessing once
+    (compiled regexes, OpenCV, the NLTK vocabulary, the food word index, the
+    Tesseract version probe)
+    """
+    import cv2
+    import numpy as np
+    from OCR import get_text  # noqa: F401
+    from pipeline_profiles import get_profile  # noqa: F401
+    from vocab import english_vocab
+
+    result = parse_with_validation('Energy 0 kcal\nTotal Fat 0 g\nIngredients: water, lodised salt')
+    result['fssai'] = detect_fssai('')
+    result['safety_score'] = calculate_safety_score(result)
+    generate_recommendations(result)
+    gray = cv2.cvtColor(np.full((64, 64, 3), 255, dtype=np.uint8), cv2.COLOR_BGR2GRAY)
+    cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    english_vocab()
+    profile_pipeline()
+    try:
+        tesseract().get_tesseract_version()
+    except Exception as e:
+        print(f"Tesseract warmup skipped: {e}")
+
+
+def warmup():
+    """
+    Everything the import no longer does up front: the OCR stack and Gemini
+    discovery. prefork_server runs it before forking, so workers start warm;
+    run directly, the server does it on a background thread after binding.
+    """
+    warmup_ocr()
+    gemini_model()
+
+
 @app.route('/api/analyze/generic', methods=['POST'])
 @app.route('/api/generic/analyze', methods=['POST'])
 def analyze():
@@ -390,31 +408,102 @@ def analyze():
         if 'image' not in request.files:
             return jsonify({'error': 'No image provided'}), 400
 
-        file = request.files['image']
-        img_bytes = file.read()
-        nparr = np.frombuffer(img_bytes, np.uint8)
-        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+        img_bytes = request.files['image'].read()
+        from pipeline_profiles import get_profile
+        try:
+            profile = get_profile(request.values.get('profile'))
+        except ValueError as e:
+            return jsonify({'error': str(e), 'success': False}), 400
+
+        key = content_key('generic', img_bytes, *([profile.name] if profile else []))
+        payload, status = flight.do(key, admitted_analysis, img_bytes, profile)
+        # ?fields=a,b.c / ?compact=1, orjson-encoded, gzip/brotli when accepted
+        body, headers = render(
+            payload, request.values, request.headers.get('Accept-Encoding', ''), compact_generic
+        )
+        return Response(body, status=status, headers=headers)
+    except AdmissionRejected as e:
+        response = jsonify(rejection_body(e))
+        response.headers['Retry-After'] = str(e.retry_after)
+        return response, 429
+    except Exception as e:
+        import traceback
+        tb = traceback.format_exc()
+        print('[OCR ERROR]', tb)
+        return jsonify({'success': False, 'error': str(e), 'traceback': tb}), 500
 
-        if img is None:
-            return jsonify({'error': 'Could not read image'}), 400
 
-        # OCR extraction
+# Names of the OCR passes in analyze_image_bytes, in order
+GENERIC_PASSES = ('gray', 'otsu', 'get_text', 'gray --psm 6', 'gray --psm 11')
+
+
+def ocr_pass(variant, image, config=''):
+    """One Tesseract pass, timed and counted for /metrics"""
+    with tesseract_pass(variant, config):
+        return tesseract().image_to_string(image, lang='eng', config=config)
+
+
+def admitted_analysis(img_bytes, profile=None):
+    with admission.admit(ROUTE_LANES['generic']):
+        return analyze_image_bytes(img_bytes, profile)
+
+
+def generic_raw_text(img):
+    """The default recipe: five passes, every text over 50 chars merged"""
+    import cv2
+    from OCR import get_text
+
+    with stage('preprocess', 'grayscale'):
         gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    with stage('preprocess', 'otsu'):
         _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
 
-        texts = [
-            pytesseract.image_to_string(gray, lang='eng'),
-            pytesseract.image_to_string(thresh, lang='eng'),
-            get_text(img),
-            pytesseract.image_to_string(gray, lang='eng', config='--psm 6'),
-            pytesseract.image_to_string(gray, lang='eng', config='--psm 11')
-        ]
+    texts = [
+        ocr_pass('gray', gray),
+        ocr_pass('otsu', thresh),
+        get_text(img),
+        ocr_pass('gray', gray, '--psm 6'),
+        ocr_pass('gray', gray, '--psm 11')
+    ]
 
-        raw_text = "\n".join(set(t for t in texts if len(t) > 50))
+    raw_text = "\n".join(set(t for t in texts if len(t) > 50))
+    # Which passes contributed to the merged text (slow-request captures, traces)
+    tracing.annotate(ocr_variant='+'.join(
+        name for name, t in zip(GENERIC_PASSES, texts) if len(t) > 50
+    ))
+    return raw_text
 
-        # debug: small log
-        print(f"[OCR] raw_text length: {len(raw_text)}")
 
+def analyze_image_bytes(img_bytes, profile=None):
+    """
+    Run OCR + parsing on uploaded image bytes, returning (payload, status)
+
+    A pipeline profile (see pipeline_profiles.py) replaces the default
+    passes with its own; its measured cost is returned under 'profile'.
+    """
+    import cv2
+    import numpy as np
+
+    with stage('decode'):
+        nparr = np.frombuffer(img_bytes, np.uint8)
+        img = cv2.imdecode(nparr, cv2.IMREAD_COLOR)
+
+    if img is None:
+        return {'error': 'Could not read image'}, 400
+
+    # OCR extraction
+    run = None
+    if profile is not None:
+        pipeline = profile_pipeline()
+        tesseract()
+        run, preprocessed, passes = pipeline.start_profile(img, profile, streaming=pipeline.streaming)
+        raw_text = pipeline.extract_raw_text(preprocessed, passes=passes, run=run)
+    else:
+        raw_text = generic_raw_text(img)
+
+    logger.debug("raw_text length: %d", len(raw_text))
+
+    with stage('parse'):
         result = parse_with_validation(raw_text)
 
         # Ensure salt/iodised salt is present in ingredientAnalysis (extra safety fallback)
@@ -427,71 +516,74 @@ def analyze():
                     if candidate not in result['ingredients']:
                         result['ingredients'].append(candidate)
 
+    # No decimal placement of the text's values fits: read the table instead
+    if result['needs_reocr']:
+        reread_table(img, result)
+
+    with stage('scoring'):
         # Add FSSAI detection
         result['fssai'] = detect_fssai(raw_text)
 
         # Add safety score
         result['safety_score'] = calculate_safety_score(result)
+        recommendations = generate_recommendations(result)
+
+    # Format for frontend
+    formatted_result = {
+        'success': True,
+        'productName': 'Food Product',
+        'ingredientAnalysis': [{
+            'ingredient': ing,
+            'name': ing,
+            'category': 'ingredient',
+            'risk': 'low',
+            'description': '',
+            'toxicity_score': 20
+        } for ing in result.get('ingredients', [])],
+        'nutriScore': {
+            'grade': 'B',
+            'score': result['safety_score'],
+            'color': 'green'
+        },
+        'nutrition': {
+            'healthScore': result['safety_score'],
+            'safetyLevel': 'Safe',
+            'totalIngredients': len(result.get('ingredients', [])),
+            'toxicIngredients': 0,
+            'per100g': {
+                'energy_kcal': result['nutrition_facts'].get('energy_kcal'),
+                'protein_g': result['nutrition_facts'].get('protein_g'),
+                'carbohydrate_g': result['nutrition_facts'].get('carbohydrate_g'),
+                'total_sugar_g': result['nutrition_facts'].get('total_sugar_g'),
+                'added_sugar_g': result['nutrition_facts'].get('added_sugar_g'),
+                'sugar_g': result['nutrition_facts'].get('sugar_g'),
+                'total_fat_g': result['nutrition_facts'].get('total_fat_g'),
+                'saturated_fat_g': result['nutrition_facts'].get('saturated_fat_g'),
+                'trans_fat_g': result['nutrition_facts'].get('trans_fat_g'),
+                'sodium_mg': result['nutrition_facts'].get('sodium_mg')
+            }
+        },
+        # Friendly display map with exact keys the frontend expects
+        'per100g_display': {
+            'Energy (kcal)': result['nutrition_facts'].get('energy_kcal'),
+            'Protein (g)': result['nutrition_facts'].get('protein_g'),
+            'Carbohydrate (g)': result['nutrition_facts'].get('carbohydrate_g'),
+            'Total Sugars (g)': result['nutrition_facts'].get('total_sugar_g'),
+            'Added Sugars (g)': result['nutrition_facts'].get('added_sugar_g'),
+            'Total Fat (g)': result['nutrition_facts'].get('total_fat_g'),
+            'Saturated Fat (g)': result['nutrition_facts'].get('saturated_fat_g'),
+            'Trans Fat (g)': result['nutrition_facts'].get('trans_fat_g'),
+            'Sodium (mg)': result['nutrition_facts'].get('sodium_mg')
+        },
+        'recommendations': recommendations,
+        'fssai': result['fssai'],
+        'summary': 'Analysis complete',
+        'ocrData': result
+    }
+    if run is not None:
+        formatted_result['profile'] = run.report()
 
-        # Format for frontend
-        formatted_result = {
-            'success': True,
-            'productName': 'Food Product',
-            'ingredientAnalysis': [{
-                'ingredient': ing,
-                'name': ing,
-                'category': 'ingredient',
-                'risk': 'low',
-                'description': '',
-                'toxicity_score': 20
-            } for ing in result.get('ingredients', [])],
-            'nutriScore': {
-                'grade': 'B',
-                'score': result['safety_score'],
-                'color': 'green'
-            },
-            'nutrition': {
-                'healthScore': result['safety_score'],
-                'safetyLevel': 'Safe',
-                'totalIngredients': len(result.get('ingredients', [])),
-                'toxicIngredients': 0,
-                'per100g': {
-                    'energy_kcal': result['nutrition_facts'].get('energy_kcal'),
-                    'protein_g': result['nutrition_facts'].get('protein_g'),
-                    'carbohydrate_g': result['nutrition_facts'].get('carbohydrate_g'),
-                    'total_sugar_g': result['nutrition_facts'].get('total_sugar_g'),
-                    'added_sugar_g': result['nutrition_facts'].get('added_sugar_g'),
-                    'sugar_g': result['nutrition_facts'].get('sugar_g'),
-                    'total_fat_g': result['nutrition_facts'].get('total_fat_g'),
-                    'saturated_fat_g': result['nutrition_facts'].get('saturated_fat_g'),
-                    'trans_fat_g': result['nutrition_facts'].get('trans_fat_g'),
-                    'sodium_mg': result['nutrition_facts'].get('sodium_mg')
-                }
-            },
-            # Friendly display map with exact keys the frontend expects
-            'per100g_display': {
-                'Energy (kcal)': result['nutrition_facts'].get('energy_kcal'),
-                'Protein (g)': result['nutrition_facts'].get('protein_g'),
-                'Carbohydrate (g)': result['nutrition_facts'].get('carbohydrate_g'),
-                'Total Sugars (g)': result['nutrition_facts'].get('total_sugar_g'),
-                'Added Sugars (g)': result['nutrition_facts'].get('added_sugar_g'),
-                'Total Fat (g)': result['nutrition_facts'].get('total_fat_g'),
-                'Saturated Fat (g)': result['nutrition_facts'].get('saturated_fat_g'),
-                'Trans Fat (g)': result['nutrition_facts'].get('trans_fat_g'),
-                'Sodium (mg)': result['nutrition_facts'].get('sodium_mg')
-            },
-            'recommendations': generate_recommendations(result),
-            'fssai': result['fssai'],
-            'summary': 'Analysis complete',
-            'ocrData': result
-        }
-
-        return jsonify(formatted_result)
-    except Exception as e:
-        import traceback
-        tb = traceback.format_exc()
-        print('[OCR ERROR]', tb)
-        return jsonify({'success': False, 'error': str(e), 'traceback': tb}), 500
+    return formatted_result, 200
 def detect_fssai(raw_text):
     text = raw_text.lower()
     compact = re.sub(r'[^a-z0-9]', '', text)
@@ -597,148 +689,157 @@ def generate_recommendations(result):
     return recs
 
 
+@app.route('/api/ocr/stats', methods=['GET'])
+def ocr_stats():
+    """Request coalescing counters, admission queue depth and wait times"""
+    return jsonify({'coalescing': flight.stats(), 'admission': admission.stats()})
+
+
 @app.route('/api/barcode/scan', methods=['POST'])
 def scan_barcode():
     try:
         data = request.get_json()
-        barcode = data.get('barcode', '')
+        return jsonify(lookup_barcode(data.get('barcode', '')))
         
-        # Hardcoded Budhani Wafers data matching the screenshots
-        if barcode == '8906159840004' or 'budhani' in barcode.lower():
-            product_data = {
-                'name': 'Wafers',
-                'brand': 'Budhani',
-                'barcode': '8906159840004',
-                'image': '/api/placeholder/150/200',
-                'ingredients': ['potatoes', 'edible pamolien oil', 'edible peanut oil', 'lodised salt'],
-                'nutrition_per_100g': {
-                    'energy_kcal': 520,
-                    'protein_g': 7.1,
-                    'carbohydrate_g': 52.0,
-                    'total_fat_g': 32.0,
-                    'saturated_fat_g': 8.7,
-                    'trans_fat_g': 0.0,
-                    'sodium_mg': 0.61,
-                    'sugar_g': 3.0,
-                    'fiber_g': 0.43,
-                    'salt_g': 0.0
-                },
-                'analysis': {
-                    'positives': [
-                        {
-                            'name': 'Protein',
-                            'value': '7.1 g',
-                            'description': 'Protein powerhouse!',
-                            'icon': '🥩',
-                            'color': 'green',
-                            'scale_position': 6.8,
-                            'scale_max': 14
-                        },
-                        {
-                            'name': 'Salt',
-                            'value': '0 g',
-                            'description': 'Low salt',
-                            'icon': '🧂',
-                            'color': 'green',
-                            'scale_position': 0.46,
-                            'scale_max': 2.3
-                        },
-                        {
-                            'name': 'Sodium',
-                            'value': '0.61 mg',
-                            'description': 'Heart-healthy, low sodium',
-                            'icon': '🧂',
-                            'color': 'green',
-                            'scale_position': 180,
-                            'scale_max': 900
-                        },
-                        {
-                            'name': 'Sugar',
-                            'value': '3 g',
-                            'description': 'Sweet, not sugary.',
-                            'icon': '🍯',
-                            'color': 'green'
-                        },
-                        {
-                            'name': 'No additives',
-                            'value': '✓',
-                            'description': 'No hazardous substances',
-                            'icon': '⚗️',
-                            'color': 'green'
-                        },
-                        {
-                            'name': 'Fiber',
-                            'value': '0.43 g',
-                            'description': 'Some fiber',
-                            'icon': '🌾',
-                            'color': 'green'
-                        }
-                    ],
-                    'negatives': [
-                        {
-                            'name': 'Saturated fat',
-                            'value': '8.7 g',
-                            'description': 'Fatty Overload, use with caution!',
-                            'icon': '🫒',
-                            'color': 'red',
-                            'scale_position': 7,
-                            'scale_max': 10
-                        }
-                    ]
-                }
-            }
-            
-            # Calculate personalized score (base 84 as shown in screenshot)
-            base_score = 84
-            alerts = []
-            
-            # Mock user profile check
-            user_profile = {
-                'allergies': [],  # No allergies for this demo
-                'conditions': [],
-                'goals': ['maintenance']
-            }
-            
-            return jsonify({
-                'success': True,
-                'barcode': barcode,
-                'product': product_data,
-                'personalizedScore': base_score,
-                'scoreColor': 'green',
-                'scoreLabel': 'Good',
-                'alerts': alerts,
-                'formatted_result': {
-                    'productName': f"{product_data['brand']} {product_data['name']}",
-                    'ingredientAnalysis': [{
-                        'ingredient': ing,
-                        'name': ing,
-                        'category': 'ingredient',
-                        'risk': 'low',
-                        'description': '',
-                        'toxicity_score': 20
-                    } for ing in product_data['ingredients']],
-                    'nutrition': {
-                        'healthScore': base_score,
-                        'safetyLevel': 'Good',
-                        'per100g': product_data['nutrition_per_100g'],
-                        'analysis': product_data['analysis']
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+def lookup_barcode(barcode):
+    """Look up a scanned barcode and build the product response payload"""
+    # Hardcoded Budhani Wafers data matching the screenshots
+    if barcode == '8906159840004' or 'budhani' in barcode.lower():
+        product_data = {
+            'name': 'Wafers',
+            'brand': 'Budhani',
+            'barcode': '8906159840004',
+            'image': '/api/placeholder/150/200',
+            'ingredients': ['potatoes', 'edible pamolien oil', 'edible peanut oil', 'lodised salt'],
+            'nutrition_per_100g': {
+                'energy_kcal': 520,
+                'protein_g': 7.1,
+                'carbohydrate_g': 52.0,
+                'total_fat_g': 32.0,
+                'saturated_fat_g': 8.7,
+                'trans_fat_g': 0.0,
+                'sodium_mg': 0.61,
+                'sugar_g': 3.0,
+                'fiber_g': 0.43,
+                'salt_g': 0.0
+            },
+            'analysis': {
+                'positives': [
+                    {
+                        'name': 'Protein',
+                        'value': '7.1 g',
+                        'description': 'Protein powerhouse!',
+                        'icon': '🥩',
+                        'color': 'green',
+                        'scale_position': 6.8,
+                        'scale_max': 14
                     },
-                    'recommendations': [
-                        'Good protein content for snacking',
-                        'Low sodium - heart friendly',
-                        'Watch saturated fat intake - consume in moderation'
-                    ]
-                }
-            })
+                    {
+                        'name': 'Salt',
+                        'value': '0 g',
+                        'description': 'Low salt',
+                        'icon': '🧂',
+                        'color': 'green',
+                        'scale_position': 0.46,
+                        'scale_max': 2.3
+                    },
+                    {
+                        'name': 'Sodium',
+                        'value': '0.61 mg',
+                        'description': 'Heart-healthy, low sodium',
+                        'icon': '🧂',
+                        'color': 'green',
+                        'scale_position': 180,
+                        'scale_max': 900
+                    },
+                    {
+                        'name': 'Sugar',
+                        'value': '3 g',
+                        'description': 'Sweet, not sugary.',
+                        'icon': '🍯',
+                        'color': 'green'
+                    },
+                    {
+                        'name': 'No additives',
+                        'value': '✓',
+                        'description': 'No hazardous substances',
+                        'icon': '⚗️',
+                        'color': 'green'
+                    },
+                    {
+                        'name': 'Fiber',
+                        'value': '0.43 g',
+                        'description': 'Some fiber',
+                        'icon': '🌾',
+                        'color': 'green'
+                    }
+                ],
+                'negatives': [
+                    {
+                        'name': 'Saturated fat',
+                        'value': '8.7 g',
+                        'description': 'Fatty Overload, use with caution!',
+                        'icon': '🫒',
+                        'color': 'red',
+                        'scale_position': 7,
+                        'scale_max': 10
+                    }
+                ]
+            }
+        }
         
-        # Default response for other barcodes
-        return jsonify({
-            'success': False,
-            'error': 'Product not found. Please scan the Budhani Wafers barcode (8906159840004)'
-        })
+        # Calculate personalized score (base 84 as shown in screenshot)
+        base_score = 84
+        alerts = []
         
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+        # Mock user profile check
+        user_profile = {
+            'allergies': [],  # No allergies for this demo
+            'conditions': [],
+            'goals': ['maintenance']
+        }
+        
+        return {
+            'success': True,
+            'barcode': barcode,
+            'product': product_data,
+            'personalizedScore': base_score,
+            'scoreColor': 'green',
+            'scoreLabel': 'Good',
+            'alerts': alerts,
+            'formatted_result': {
+                'productName': f"{product_data['brand']} {product_data['name']}",
+                'ingredientAnalysis': [{
+                    'ingredient': ing,
+                    'name': ing,
+                    'category': 'ingredient',
+                    'risk': 'low',
+                    'description': '',
+                    'toxicity_score': 20
+                } for ing in product_data['ingredients']],
+                'nutrition': {
+                    'healthScore': base_score,
+                    'safetyLevel': 'Good',
+                    'per100g': product_data['nutrition_per_100g'],
+                    'analysis': product_data['analysis']
+                },
+                'recommendations': [
+                    'Good protein content for snacking',
+                    'Low sodium - heart friendly',
+                    'Watch saturated fat intake - consume in moderation'
+                ]
+            }
+        }
+    
+    # Default response for other barcodes
+    return {
+        'success': False,
+        'error': 'Product not found. Please scan the Budhani Wafers barcode (8906159840004)'
+    }
 
 
 @app.route('/api/blinkit/alternatives', methods=['POST'])
@@ -746,37 +847,42 @@ def get_alternatives():
     try:
         data = request.get_json()
         
-        # Mock alternatives (replace with Blinkit API)
-        alternatives = [
-            {
-                'id': '1',
-                'name': 'Healthy Alternative 1',
-                'brand': 'Health Brand',
-                'price': 120,
-                'originalPrice': 150,
-                'image': '/api/placeholder/64/64',
-                'score': 85,
-                'deliveryTime': '12 mins',
-                'blinkitUrl': 'https://blinkit.com/product/1'
-            },
-            {
-                'id': '2',
-                'name': 'Organic Option',
-                'brand': 'Organic Co',
-                'price': 180,
-                'image': '/api/placeholder/64/64',
-                'score': 92,
-                'deliveryTime': '15 mins',
-                'blinkitUrl': 'https://blinkit.com/product/2'
-            }
-        ]
-        
-        return jsonify({'alternatives': alternatives})
+        return jsonify({'alternatives': get_alternative_products()})
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 
+def get_alternative_products():
+    """Healthier alternatives shown next to an analysed product"""
+    # Mock alternatives (replace with Blinkit API)
+    alternatives = [
+        {
+            'id': '1',
+            'name': 'Healthy Alternative 1',
+            'brand': 'Health Brand',
+            'price': 120,
+            'originalPrice': 150,
+            'image': '/api/placeholder/64/64',
+            'score': 85,
+            'deliveryTime': '12 mins',
+            'blinkitUrl': 'https://blinkit.com/product/1'
+        },
+        {
+            'id': '2',
+            'name': 'Organic Option',
+            'brand': 'Organic Co',
+            'price': 180,
+            'image': '/api/placeholder/64/64',
+            'score': 92,
+            'deliveryTime': '15 mins',
+            'blinkitUrl': 'https://blinkit.com/product/2'
+        }
+    ]
+
+    return alternatives
+
+
 @app.route('/api/analytics/affiliate-click', methods=['POST'])
 def track_affiliate_click():
     try:
@@ -790,11 +896,17 @@ def track_affiliate_click():
 
 @app.route('/api/chat', methods=['POST'])
 def chat():
+    payload, status = chat_reply(request.get_json())
+    return jsonify(payload), status
+
+
+def chat_reply(data):
+    """Answer a user question about an analysed product, returning (payload, status)"""
     try:
+        model = gemini_model()
         if not model:
-            return jsonify({'response': 'AI chat is not available. Please check the Gemini API configuration.'})
+            return {'response': 'AI chat is not available. Please check the Gemini API configuration.'}, 200
             
-        data = request.get_json()
         user_message = data.get('message', '')
         food_data = data.get('foodData', {})
         
@@ -818,19 +930,21 @@ Provide a helpful, concise answer (max 150 words)."""
         
         response = model.generate_content(context)
         
-        return jsonify({
+        return {
             'response': response.text,
             'success': True
-        })
+        }, 200
         
     except Exception as e:
         print(f"Chat error: {str(e)}")
-        return jsonify({
+        return {
             'response': f'Sorry, I encountered an error: {str(e)}. Please try again.',
             'success': False
-        }), 500
+        }, 500
 
 
 if __name__ == '__main__':
     print('Starting OCR API on http://localhost:5002')
+    # Health checks answer right away; the first OCR/chat request finds the stack warm
+    threading.Thread(target=warmup, name='warmup', daemon=True).start()
     app.run(debug=True, host='0.0.0.0', port=5002)
\ No newline at end of file
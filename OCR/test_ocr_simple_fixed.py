@@ -14,6 +14,23 @@ import numpy as np
 
 pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
 from OCR import get_text
+from nutrient_rules import NutrientScanner, format_amount
+from nutrient_solver import solve
+from keyword_matcher import MATCHER
+
+# nutrient_rules name -> nutrition_facts key
+NUTRITION_KEYS = {
+    'protein': 'protein',
+    'carbohydrate': 'carbohydrate',
+    'total_fat': 'total_fat',
+    'fiber': 'dietary_fiber',
+    'total_sugar': 'sugar',
+    'cholesterol': 'cholesterol',
+    'sodium': 'sodium',
+    'iron': 'iron',
+    'calcium': 'calcium'
+}
+NUTRITION_SCANNER = NutrientScanner(NUTRITION_KEYS)
 
 def parse_with_validation(raw_text):
     """Parse with sanity checks and decimal recovery"""
@@ -48,50 +65,18 @@ def parse_with_validation(raw_text):
     text = '\n'.join(cleaned).lower()
     orig_text = raw_text.lower()
     
-    # Sanity ranges per 100g
-    ranges = {
-        'protein': (0, 30, 'g'),
-        'carbohydrate': (0, 100, 'g'),
-        'total_fat': (0, 100, 'g'),
-        'dietary_fiber': (0, 15, 'g'),
-        'sugar': (0, 100, 'g'),
-        'cholesterol': (0, 300, 'mg'),
-        'sodium': (0, 5000, 'mg'),
-        'iron': (0, 20, 'mg'),
-        'calcium': (0, 150, 'mg')
-    }
-    
-    def fix_decimal(val, nutrient):
-        """Fix missing decimals using sanity ranges"""
-        try:
-            v = float(val)
-            min_v, max_v, unit = ranges.get(nutrient, (0, 1000, 'g'))
-            
-            if v > max_v and min_v <= v/10 <= max_v:
-                return str(v/10), unit, 'low_confidence'
-            elif v > max_v and min_v <= v/100 <= max_v:
-                return str(v/100), unit, 'low_confidence'
-            
-            return val, unit, 'high_confidence'
-        except:
-            return val, 'g', 'low_confidence'
-    
-    # Position-aware extraction - FIXED patterns
-    patterns = [
-        (r'protein\s*\([^)]*\)\s*([0-9.]+)', 'protein'),
-        (r'carbohydrate\s*\([^)]*\)\s*([0-9.]+)', 'carbohydrate'),
-        (r'(?:dietary\s+)?(?:fibre|fiber)\s*\([^)]*\)\s*([0-9.]+)', 'dietary_fiber'),
-        (r'cholesterol\s*\([^)]*\)\s*([0-9.]+)', 'cholesterol'),
-        (r'iron\s*\([^)]*\)\s*([0-9.]+)', 'iron'),
-        (r'calcium\s*\([^)]*\)\s*([0-9.]+)', 'calcium'),
-    ]
-    
-    for pattern, nutrient in patterns:
-        match = re.search(pattern, orig_text)
-        if match:
-            value, unit, conf = fix_decimal(match.group(1), nutrient)
-            marker = ' (!)' if conf == 'low_confidence' else ''
-            result['nutrition_facts'][nutrient] = f"{value} {unit}{marker}"
+    # Position-aware extraction with sanity ranges (nutrient_rules), decimal points
+    # placed across all nutrients at once (nutrient_solver); values that are not
+    # what was printed are flagged (!)
+    hits = NUTRITION_SCANNER.scan(raw_text)
+    solution = solve(hits)
+    for nutrient, key in NUTRITION_KEYS.items():
+        if nutrient in hits:
+            hit = hits[nutrient]
+            value = solution.values[nutrient]
+            marker = ' (!)' if value != hit.printed else ''
+            result['nutrition_facts'][key] = f"{format_amount(round(value, 2))} {hit.unit}{marker}"
+    result['needs_reocr'] = solution.needs_reocr
     
     # FIXED: Simple ingredient extraction
     ing_match = re.search(r'ingredients?\s*[:=]?\s*([^\n]+)', text)
@@ -105,10 +90,8 @@ def parse_with_validation(raw_text):
         
         result['ingredients'] = [ing_text.strip()] if ing_text.strip() else []
     
-    # Allergens
-    for allergen in ['milk', 'egg', 'peanut', 'soy', 'wheat', 'fish', 'shellfish', 'sesame', 'gluten']:
-        if re.search(rf'\b{allergen}s?\b', text):
-            result['allergens'].append(allergen)
+    # Allergens (whole words, plural allowed) in one pass
+    result['allergens'] = MATCHER.whole_words(text, 'allergen')
     
     # Extract serving size
     serving_patterns = [
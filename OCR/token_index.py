@@ -0,0 +1,111 @@
+"""
+Token-position index for proximity-based nutrient assignment
+parse_with_validation's second pass asks, per nutrient, "which is the first
+number with one of this nutrient's label spellings in the 40 characters
+before it?", and its sodium fix asks "which mg-sized number is closest to a
+sodium-like word?". Answered naively that is numbers x spellings x window
+substring checks per nutrient, which grows quadratically when several OCR
+passes are joined into one text.
+
+TokenIndex scans a text once for its numeric tokens and once for every
+label spelling of a PhraseTable, then answers both questions by sweeping
+the sorted positions (and bisecting for nearest-keyword distances).
+Answers are the same as the substring checks': a spelling counts anywhere,
+also inside a longer word, as long as it lies wholly inside the window.
+"""
+
+import re
+from bisect import bisect_left
+
+# Numeric token and the unit printed right after it
+NUMBER_RE = re.compile(r'([0-9][0-9,\.]{0,8})\s*(mg|g|kcal|cal)?', re.IGNORECASE)
+
+
+class PhraseTable:
+    """
+    Label spellings per key, compiled into one pattern that finds every
+    (possibly overlapping) occurrence of every spelling in a single scan
+    """
+
+    def __init__(self, phrases):
+        self.keys = tuple(phrases)
+        # Zero-width match wherever some spelling starts; per key, the shortest
+        # spelling starting there (listed first) - it ends soonest, so it is the
+        # one that fits a window if any does
+        groups = ''.join(
+            f'(?=(?P<k{i}>' + '|'.join(re.escape(p) for p in sorted(set(phrases[key]), key=len)) + '))?'
+            for i, key in enumerate(self.keys)
+        )
+        anchor = '|'.join(re.escape(p) for spellings in phrases.values() for p in spellings)
+        self.pattern = re.compile(f'(?=(?:{anchor})){groups}')
+
+    def occurrences(self, text):
+        """{key: [(end, start), ...] sorted by end} for every spelling occurrence in text"""
+        found = {key: [] for key in self.keys}
+        for match in self.pattern.finditer(text):
+            for i, key in enumerate(self.keys):
+                start, end = match.span(f'k{i}')
+                if start >= 0:
+                    found[key].append((end, start))
+        for spans in found.values():
+            spans.sort()
+        return found
+
+
+class TokenIndex:
+    """Numeric tokens and label positions of one text, each scanned on first use"""
+
+    def __init__(self, text, phrases=None):
+        self.text = text
+        self.phrases = phrases
+        self._numbers = None
+        self._labels = None
+        self._positions = {}
+
+    @property
+    def numbers(self):
+        """(start, end, token, unit) in text order"""
+        if self._numbers is None:
+            self._numbers = [
+                (m.start(), m.end(), m.group(1), (m.group(2) or '').lower()) for m in NUMBER_RE.finditer(self.text)
+            ]
+        return self._numbers
+
+    @property
+    def labels(self):
+        if self._labels is None:
+            self._labels = self.phrases.occurrences(self.text) if self.phrases is not None else {}
+        return self._labels
+
+    def numbers_after(self, key, window=40):
+        """
+        Numbers (start, end, token, unit), in text order, with one of key's
+        spellings wholly inside the `window` characters before them
+        """
+        spans = self.labels.get(key)
+        if not spans:
+            return
+        i = 0
+        latest_start = -1
+        for number in self.numbers:
+            start = number[0]
+            # Spellings ending before this number; the latest-starting one decides
+            while i < len(spans) and spans[i][0] <= start:
+                latest_start = max(latest_start, spans[i][1])
+                i += 1
+            if latest_start >= 0 and latest_start >= start - window:
+                yield number
+
+    def positions(self, pattern):
+        """Start offsets of pattern's (non-overlapping) matches, cached per pattern"""
+        if pattern not in self._positions:
+            self._positions[pattern] = [m.start() for m in pattern.finditer(self.text)]
+        return self._positions[pattern]
+
+    def distance(self, pos, pattern):
+        """Distance from pos to the nearest match of pattern (None if it never matches)"""
+        starts = self.positions(pattern)
+        if not starts:
+            return None
+        i = bisect_left(starts, pos)
+        return min(abs(pos - starts[j]) for j in (i - 1, i) if 0 <= j < len(starts))
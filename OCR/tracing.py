@@ -0,0 +1,294 @@
+"""
+Lightweight per-request tracing for the OCR pipeline
+Every request gets a trace; metrics.stage() / metrics.tesseract_pass()
+open child spans, so each preprocessing variant, Tesseract pass, parser
+and scoring step shows up with its own timing. Outside a request (no
+active trace) span() returns a shared no-op object.
+
+- Server-Timing header: time per stage (decode, preprocess, tesseract,
+  parse, ...) plus the request total
+- summary(): per-span breakdown used by /api/ocr/analyze-step
+- OCR_TRACE_EXPORT=/path/traces.jsonl appends every finished trace as
+  one OTLP/JSON line (ExportTraceServiceRequest), readable by the
+  OpenTelemetry collector's file receiver or plain jq
+"""
+
+import contextvars
+import json
+import os
+import threading
+import time
+
+
+EXPORT_PATH = os.getenv('OCR_TRACE_EXPORT', '')
+SERVICE_NAME = os.getenv('OCR_SERVICE_NAME', 'foodconnect-ocr')
+
+_current_trace = contextvars.ContextVar('ocr_trace', default=None)
+_current_span = contextvars.ContextVar('ocr_span', default=None)
+_export_lock = threading.Lock()
+
+
+class Span:
+    __slots__ = ('trace', 'name', 'span_id', 'parent_id', 'start_ns', 'end_ns', 'attributes', '_token')
+
+    def __init__(self, trace, name, attributes=None, parent_id=None):
+        self.trace = trace
+        self.name = name
+        self.span_id = os.urandom(8).hex()
+        self.parent_id = parent_id
+        self.start_ns = 0
+        self.end_ns = 0
+        self.attributes = attributes or {}
+        self._token = None
+
+    def __enter__(self):
+        parent = _current_span.get()
+        if self.parent_id is None and parent is not None:
+            self.parent_id = parent.span_id
+        self._token = _current_span.set(self)
+        self.start_ns = time.time_ns()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.end_ns = time.time_ns()
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            pass  # closed from another context, e.g. a stream finishing in a new thread
+        self.trace.spans.append(self)
+        return False
+
+    @property
+    def duration_ms(self):
+        end = self.end_ns or time.time_ns()
+        return (end - self.start_ns) / 1e6
+
+    def to_dict(self):
+        return {
+            'name': self.name,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'start_ns': self.start_ns,
+            'end_ns': self.end_ns,
+            'attributes': self.attributes
+        }
+
+
+class _NullSpan:
+    """Returned when no trace is active; costs one contextvar lookup"""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+
+NULL_SPAN = _NullSpan()
+
+
+class Trace:
+    def __init__(self, name, attributes=None):
+        self.trace_id = os.urandom(16).hex()
+        self.spans = []
+        self.root = Span(self, name, attributes)
+        self._token = None
+
+    def summary(self):
+        """Per-span-name totals in start order: [{name, duration_ms, count}]"""
+        totals = {}
+        for span in sorted(self.spans, key=lambda s: s.start_ns):
+            if span is self.root:
+                continue
+            entry = totals.setdefault(span.name, {'name': span.name, 'duration_ms': 0.0, 'count': 0})
+            entry['duration_ms'] += span.duration_ms
+            entry['count'] += 1
+        for entry in totals.values():
+            entry['duration_ms'] = round(entry['duration_ms'], 2)
+        return list(totals.values())
+
+    def server_timing(self):
+        """Server-Timing header value: one metric per stage (first name component) plus total"""
+        stages = {}
+        for entry in self.summary():
+            name = entry['name'].split('.', 1)[0]
+            total, count = stages.get(name, (0.0, 0))
+            stages[name] = (total + entry['duration_ms'], count + entry['count'])
+        parts = [
+            f'{name};dur={total:.1f}' + (f';desc="{count} spans"' if count > 1 else '')
+            for name, (total, count) in stages.items()
+        ]
+        parts.append(f'total;dur={self.root.duration_ms:.1f}')
+        return ', '.join(parts)
+
+    def adopt(self, span_dicts, parent_id=None):
+        """Attach spans recorded in another process (see span_dicts()) under parent_id"""
+        known = {s['span_id'] for s in span_dicts}
+        for data in span_dicts:
+            span = Span(self, data['name'], data['attributes'], data['parent_id'])
+            span.span_id = data['span_id']
+            if span.parent_id not in known:
+                span.parent_id = parent_id
+            span.start_ns = data['start_ns']
+            span.end_ns = data['end_ns']
+            self.spans.append(span)
+
+    def span_dicts(self):
+        return [span.to_dict() for span in self.spans]
+
+    def find_attribute(self, key):
+        """First value of an attribute set anywhere in the trace (see annotate())"""
+        for span in [self.root] + self.spans:
+            if key in span.attributes:
+                return span.attributes[key]
+        return None
+
+
+def span(name, **attributes):
+    """Child span of the current one; a no-op outside a trace"""
+    trace = _current_trace.get()
+    if trace is None:
+        return NULL_SPAN
+    return Span(trace, name, attributes)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def annotate(**attributes):
+    """Record facts about the request (e.g. the OCR variant chosen) on the trace's root span"""
+    trace = _current_trace.get()
+    if trace is not None:
+        trace.root.attributes.update(attributes)
+
+
+def start_trace(name, **attributes):
+    """Begin a trace (and its root span) in the current context"""
+    trace = Trace(name, attributes)
+    trace._token = _current_trace.set(trace)
+    trace.root.__enter__()
+    return trace
+
+
+def finish_trace(trace, export=True):
+    """Close the root span, leave the trace's context and export it if configured"""
+    if trace.root.end_ns:
+        return
+    trace.root.__exit__(None, None, None)
+    try:
+        _current_trace.reset(trace._token)
+    except ValueError:
+        _current_trace.set(None)
+    if export and EXPORT_PATH:
+        export_otlp(trace, EXPORT_PATH)
+
+
+def adopt(span_dicts):
+    """Attach spans shipped back from a pool worker to the active trace, if any"""
+    trace = _current_trace.get()
+    if trace is not None and span_dicts:
+        parent = _current_span.get()
+        trace.adopt(span_dicts, parent.span_id if parent else trace.root.span_id)
+
+
+# ==================== OTLP/JSON export ====================
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {'boolValue': value}
+    if isinstance(value, int):
+        return {'intValue': str(value)}
+    if isinstance(value, float):
+        return {'doubleValue': value}
+    return {'stringValue': str(value)}
+
+
+def to_otlp(trace):
+    spans = []
+    for span in trace.spans:
+        otlp_span = {
+            'traceId': trace.trace_id,
+            'spanId': span.span_id,
+            'name': span.name,
+            'kind': 2 if span is trace.root else 1,  # SERVER / INTERNAL
+            'startTimeUnixNano': str(span.start_ns),
+            'endTimeUnixNano': str(span.end_ns),
+            'attributes': [{'key': k, 'value': _otlp_value(v)} for k, v in span.attributes.items()]
+        }
+        if span.parent_id:
+            otlp_span['parentSpanId'] = span.parent_id
+        spans.append(otlp_span)
+
+    return {'resourceSpans': [{
+        'resource': {'attributes': [
+            {'key': 'service.name', 'value': {'stringValue': SERVICE_NAME}},
+            {'key': 'process.pid', 'value': {'intValue': str(os.getpid())}}
+        ]},
+        'scopeSpans': [{'scope': {'name': 'ocr.tracing'}, 'spans': spans}]
+    }]}
+
+
+def export_otlp(trace, path):
+    line = json.dumps(to_otlp(trace), separators=(',', ':'))
+    try:
+        with _export_lock, open(path, 'a') as f:
+            f.write(line + '\n')
+    except OSError as e:
+        print(f"[tracing] export to {path} failed: {e}")
+
+
+# ==================== server integration ====================
+def instrument_flask(app):
+    """Trace every request and add a Server-Timing header"""
+    from flask import g, request
+
+    @app.before_request
+    def _start_trace():
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        g.trace = start_trace(route, **{'http.method': request.method, 'http.route': route})
+
+    @app.after_request
+    def _server_timing(response):
+        trace = g.get('trace')
+        if trace is None:
+            return response
+        # Headers go out before a streamed body runs, so they only cover the
+        # work done so far; the trace itself stays open until the stream closes
+        response.headers['Server-Timing'] = trace.server_timing()
+        if response.is_streamed:
+            g.pop('trace')
+            response.call_on_close(lambda: finish_trace(trace))
+        return response
+
+    @app.teardown_request
+    def _finish_trace(error=None):
+        trace = g.pop('trace', None)
+        if trace is not None:
+            finish_trace(trace)
+
+
+class ASGIMiddleware:
+    """Pure ASGI middleware: trace each HTTP request and add Server-Timing"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            return await self.app(scope, receive, send)
+
+        trace = start_trace(scope['path'], **{'http.method': scope['method'], 'http.route': scope['path']})
+
+        async def send_with_timing(message):
+            if message['type'] == 'http.response.start':
+                headers = list(message.get('headers', []))
+                headers.append((b'server-timing', trace.server_timing().encode('latin-1')))
+                message = {**message, 'headers': headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            finish_trace(trace)
@@ -0,0 +1,28 @@
+"""
+English word list for scoring OCR text
+Loaded from the NLTK 'words' corpus on first use instead of at import:
+importing NLTK and reading the corpus takes about a second, which every
+process start used to pay before it could answer a health check. OCR.py
+and enhanced_ocr_pipeline.py share the one copy.
+"""
+
+import threading
+
+_lock = threading.Lock()
+_vocab = None
+
+
+def english_vocab():
+    """Lower-cased English words; empty if NLTK or its corpus is unavailable"""
+    global _vocab
+    if _vocab is None:
+        with _lock:
+            if _vocab is None:
+                try:
+                    from nltk.corpus import words
+                    # Run nltk.download('words') once if the corpus is missing
+                    _vocab = frozenset(w.lower() for w in words.words())
+                except Exception as e:
+                    print(f"English vocabulary unavailable: {e}")
+                    _vocab = frozenset()
+    return _vocab